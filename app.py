@@ -1,35 +1,112 @@
-from flask import Flask, render_template, request, jsonify, send_file, session
-import face_recognition
-import numpy as np
-import cv2
+from flask import Flask, Response, g, render_template, request, jsonify, send_file, session
 import os
 from flask_cors import CORS
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
 import datetime
 import json
-from fpdf import FPDF
-import sqlite3
 import base64
+import sqlite3
 from werkzeug.security import generate_password_hash, check_password_hash
 import secrets
 import threading
 import time
+import atexit
 import logging
 from collections import defaultdict
 import matplotlib.pyplot as plt
 import matplotlib
 matplotlib.use('Agg')  # Use non-GUI backend
 import io
+import contextlib
+import functools
+from services.gallery import FaceGallery
+from services.matching import create_matcher
+from services.tracking import FaceTracker
+from services.frame_gate import FrameGate
+from services.stream_pacing import StreamPacer
+from services.risk_scheduler import RiskScheduler
+from services.inference_scheduler import MicroBatcher
+from services.frame_pipeline import FrameContext, batch_face_encodings, decode_frame, detection_scale_for
+from services.metrics import stage_metrics
+from services.slow_frames import SlowFrameRecorder
+from services.analysis import (model_registry, match_faces, verify_frame, analyze_attention_frame,
+                               analyze_frame, configure_object_detection, configure_gaze, configure_quality,
+                               FRAME_ANALYSES)
+from services.worker_pool import VisionWorkerPool, PoolSaturated, TaskTimeout
+from services.violation_writer import ViolationWriter
+from services.evidence_store import EvidenceStore, EvidenceEncoder
+from services.migrations import migrate
+from services.violation_log import ViolationLog
+from services.reports import ReportCache, ReportJobs, render_log_report
+from services.export import EXPORT_FORMATS, ExportFilters, stream_export
 
 app = Flask(__name__)
 CORS(app)
+sock = Sock(app)
 app.secret_key = secrets.token_hex(16)
 
 KNOWN_FACES_DIR = 'models/known_faces'
-REPORTS_FILE = 'reports/violations.json'
+REPORTS_FILE = 'reports/violations.jsonl'
+LEGACY_REPORTS_FILE = 'reports/violations.json'
 PDF_REPORT_PATH = 'reports/violation_report.pdf'
+SESSION_REPORTS_DIR = 'reports/sessions'
+EXAM_REPORTS_DIR = 'reports/exams'
 DATABASE_PATH = 'reports/proctoring.db'
-known_face_encodings = []
-known_face_names = []
+EVIDENCE_DIR = 'reports/evidence'
+SLOW_FRAMES_DIR = 'reports/slow_frames'
+CONFIG_PATH = 'config.json'
+GALLERY_CACHE_DIR = 'models/gallery_cache'
+
+def load_config():
+    """Read config.json, returning an empty config when it is missing"""
+    try:
+        with open(CONFIG_PATH, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+config = load_config()
+face_config = config.get('face_recognition', {})
+
+# Loaded from GALLERY_CACHE_DIR by startup()
+gallery = FaceGallery()
+matcher = create_matcher(gallery, face_config.get('matcher'))
+# Detect faces on a downscaled frame; encodings still use full resolution
+detection_scale = face_config.get('detection_scale') or detection_scale_for(face_config.get('min_face_size'))
+model_registry.config_path = CONFIG_PATH
+model_registry.configure(config.get('models'))
+configure_object_detection(config.get('object_detection'))
+configure_gaze(config.get('gaze'))
+configure_quality(config.get('image_quality'))
+# Per-stage latency histograms, served at /metrics
+stage_metrics.configure(config.get('metrics'))
+
+# Opt-in: frames slower than a threshold are kept with their timings and a profile
+slow_config = config.get('slow_capture', {})
+slow_frames = (SlowFrameRecorder.from_config(SLOW_FRAMES_DIR, slow_config)
+               if slow_config.get('enabled', False) else None)
+
+tracking_config = config.get('tracking', {})
+face_tracker = FaceTracker.from_config(tracking_config) if tracking_config.get('enabled', True) else None
+
+batching_config = config.get('inference', {}).get('batching', {})
+
+# Frames that barely differ from the session's last analysed one reuse its result
+gate_config = config.get('frame_gate', {})
+frame_gate = FrameGate.from_config(gate_config) if gate_config.get('enabled', True) else None
+
+# Optional process pool for frame analysis, started from __main__
+workers_config = config.get('workers', {})
+worker_pool = None
+
+# Streaming clients are told how fast and how large to send frames based on load
+stream_pacer = StreamPacer.from_config(config.get('streaming'), config.get('monitoring'))
+
+# Sessions with recent violations are analysed more often, calm ones less,
+# within a global CPU budget
+adaptive_config = config.get('adaptive_rate', {})
+risk_scheduler = RiskScheduler.from_config(adaptive_config) if adaptive_config.get('enabled', True) else None
 
 # Initialize database
 def init_db():
@@ -62,122 +139,70 @@ def init_db():
     ''')
     
     conn.commit()
+    migrate(conn, evidence_store=evidence_store)
     conn.close()
 
-# Initialize database on startup
-init_db()
+# Violation images are stored on disk by content hash, rows keep the reference
+evidence_store = EvidenceStore(EVIDENCE_DIR)
+# Uploaded JPEGs are kept as-is; larger frames are shrunk on the writer thread
+evidence_encoder = EvidenceEncoder.from_config(config.get('recording'))
+
+# Violations are queued and committed in batches by one writer thread
+writer_config = config.get('database', {}).get('violation_writer', {})
+violation_writer = (ViolationWriter.from_config(DATABASE_PATH, writer_config, evidence_store, app.logger)
+                    if writer_config.get('enabled', True) else None)
+
+# Client-reported violations are also appended to a rotating JSON Lines log
+violation_log = ViolationLog.from_config(REPORTS_FILE, config.get('violation_log'))
+
+# Session reports are cached until the session's next violation; exam-wide
+# jobs render in the background, on a process pool started from __main__
+report_cache = ReportCache(DATABASE_PATH, SESSION_REPORTS_DIR)
+report_jobs = ReportJobs.from_config(report_cache, config.get('reports'))
+
+export_chunk_size = config.get('export', {}).get('chunk_size', 1000)
 
 # Load known face encodings
 def load_known_faces():
-    global known_face_encodings, known_face_names
-    known_face_encodings = []
-    known_face_names = []
-    
+    """Sync the gallery with KNOWN_FACES_DIR, encoding only new or changed images"""
     if not os.path.exists(KNOWN_FACES_DIR):
         os.makedirs(KNOWN_FACES_DIR)
         return
-        
-    for filename in os.listdir(KNOWN_FACES_DIR):
-        if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-            try:
-                img_path = os.path.join(KNOWN_FACES_DIR, filename)
-                img = face_recognition.load_image_file(img_path)
-                encodings = face_recognition.face_encodings(img)
-                
-                if encodings:
-                    known_face_encodings.append(encodings[0])
-                    known_face_names.append(os.path.splitext(filename)[0])
-                else:
-                    print(f"No face found in {filename}")
-            except Exception as e:
-                print(f"Error processing {filename}: {e}")
 
-# Enhanced object detection function
-def detect_suspicious_objects(img):
-    """Detect phones, books, and other potentially suspicious objects"""
-    suspicious_objects = []
-    
-    # Convert to grayscale for object detection
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    
-    # Load cascade classifiers for objects
-    try:
-        # Phone detection (simplified - you'd need a trained model for better accuracy)
-        phone_cascade = cv2.CascadeClassifier('models/phone_cascade.xml')
-        if os.path.exists('models/phone_cascade.xml'):
-            phones = phone_cascade.detectMultiScale(gray, 1.1, 4)
-            if len(phones) > 0:
-                suspicious_objects.append(f"Phone detected ({len(phones)} instances)")
-    except:
-        pass
-    
-    # Simple edge detection to identify rectangular objects (books, papers)
-    edges = cv2.Canny(gray, 50, 150)
-    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    
-    book_like_objects = 0
-    for contour in contours:
-        area = cv2.contourArea(contour)
-        if area > 5000:  # Filter small objects
-            # Check if the contour is rectangular
-            epsilon = 0.02 * cv2.arcLength(contour, True)
-            approx = cv2.approxPolyDP(contour, epsilon, True)
-            if len(approx) == 4:
-                book_like_objects += 1
-    
-    if book_like_objects > 2:  # More than 2 rectangular objects might indicate books/papers
-        suspicious_objects.append(f"Rectangular objects detected ({book_like_objects} instances)")
-    
-    return suspicious_objects
+    summary = gallery.sync(KNOWN_FACES_DIR)
+    print(f"Face gallery synced: {summary}")
 
-# Enhanced attention analysis
-def analyze_gaze_direction(img):
-    """Analyze if the person is looking at the screen"""
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    
-    # Load face and eye cascade classifiers
-    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
-    eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
-    
-    faces = face_cascade.detectMultiScale(gray, 1.1, 5)
-    
-    if len(faces) == 0:
-        return {"status": "no_face", "details": "No face detected for gaze analysis"}
-    
-    attention_score = 0
-    gaze_details = []
-    
-    for (x, y, w, h) in faces:
-        roi_gray = gray[y:y+h, x:x+w]
-        eyes = eye_cascade.detectMultiScale(roi_gray, 1.1, 5)
-        
-        if len(eyes) >= 2:
-            attention_score += 50  # Base score for detecting both eyes
-            
-            # Analyze eye positions (simplified)
-            eye_positions = [(ex + ew//2, ey + eh//2) for (ex, ey, ew, eh) in eyes[:2]]
-            
-            # Check if eyes are looking forward (very basic check)
-            if len(eye_positions) == 2:
-                eye_distance = abs(eye_positions[0][0] - eye_positions[1][0])
-                if 30 < eye_distance < 80:  # Eyes are properly spaced
-                    attention_score += 30
-                    gaze_details.append("Eyes properly positioned")
-        elif len(eyes) == 1:
-            attention_score += 20
-            gaze_details.append("Only one eye visible")
-        else:
-            gaze_details.append("Eyes not clearly visible")
-    
-    if attention_score >= 70:
-        return {"status": "focused", "score": attention_score, "details": gaze_details}
-    elif attention_score >= 40:
-        return {"status": "partially_focused", "score": attention_score, "details": gaze_details}
-    else:
-        return {"status": "distracted", "score": attention_score, "details": gaze_details}
+def startup():
+    """Set up the serving process: database, client log, face gallery and detectors"""
+    init_db()
+    if violation_writer:
+        atexit.register(violation_writer.close)
+    violation_log.import_legacy(LEGACY_REPORTS_FILE)
+    atexit.register(violation_log.close)
+
+    gallery.cache_dir = GALLERY_CACHE_DIR
+    gallery.load()
+    load_known_faces()
+    matcher.warm_up()
+    model_registry.warm_up()
+
+# Spawned pool workers (Windows) re-import this module as __mp_main__; they
+# bring their own detectors and read the gallery from shared memory
+if __name__ != '__mp_main__':
+    startup()
 
-# Load faces on startup
-load_known_faces()
+@app.before_request
+def start_request_timer():
+    if stage_metrics.enabled:
+        g.request_started = time.perf_counter()
+
+@app.after_request
+def observe_request_latency(response):
+    """Request latency per route; the frame stream is timed per frame instead"""
+    started = g.pop('request_started', None)
+    if started is not None and request.url_rule is not None and request.endpoint != 'frame_stream':
+        stage_metrics.observe_request(request.url_rule.rule, time.perf_counter() - started)
+    return response
 
 @app.route('/')
 def index():
@@ -219,154 +244,345 @@ def end_session():
     conn.commit()
     conn.close()
     
+    if face_tracker:
+        face_tracker.drop(session_id)
+    if frame_gate:
+        frame_gate.drop(session_id)
+    if risk_scheduler:
+        risk_scheduler.drop(session_id)
+    if violation_writer:
+        violation_writer.flush()
     session.clear()
     return jsonify({"status": "success"})
 
+def encode_and_match_batch(items):
+    """Scheduler batch: encode the queued (rgb, location, student) faces in one call, then match together"""
+    with stage_metrics.timer('encoding'):
+        encodings = batch_face_encodings([(rgb, location) for rgb, location, _ in items])
+    matches = match_faces(matcher, encodings, [student_name for _, _, student_name in items],
+                          face_config.get('tolerance', 0.6))
+    return list(zip(encodings, matches))
+
+inference_batcher = (MicroBatcher.from_config(encode_and_match_batch, batching_config)
+                     if batching_config.get('enabled', False) else None)
+
+def worker_pool_load():
+    stats = worker_pool.stats() if worker_pool else None
+    return stats['pending'] / stats['max_pending'] if stats else 0.0
+
+def inference_queue_load():
+    return inference_batcher.stats()['queue_depth'] / inference_batcher.max_batch_size if inference_batcher else 0.0
+
+stream_pacer.add_source('workers', worker_pool_load)
+stream_pacer.add_source('inference', inference_queue_load)
+
+def identify_face(frame, location, student_name=None):
+    """Encode the face at ``location`` and match it, batched with other requests when enabled"""
+    if inference_batcher:
+        encoding, match = inference_batcher.run((frame.rgb, location, student_name))
+        frame.provide('face_encodings', [encoding])
+        return match
+    return match_faces(matcher, [frame.face_encodings[0]], [student_name],
+                       face_config.get('tolerance', 0.6))[0]
+
+def worker_settings():
+    """Settings each pool worker is initialised with"""
+    return {
+        'config_path': CONFIG_PATH,
+        'models': config.get('models'),
+        'matcher': face_config.get('matcher'),
+        'tolerance': face_config.get('tolerance', 0.6),
+        'detection_scale': detection_scale,
+        'tracking': tracking_config,
+        'object_detection': config.get('object_detection'),
+        'gaze': config.get('gaze'),
+        'image_quality': config.get('image_quality'),
+        'metrics': config.get('metrics'),
+    }
+
+def pool_busy_response(e):
+    """503 when the pool is saturated, 504 when a frame timed out"""
+    if isinstance(e, PoolSaturated):
+        response = jsonify({"status": "busy", "message": "Server busy, retry shortly"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+    response = jsonify({"status": "error", "message": str(e)})
+    response.status_code = 504
+    return response
+
+def gated(kind, image_bytes):
+    """Gate key, thumbnail and any reusable result for this session's frame"""
+    session_id = session.get('session_id')
+    if not frame_gate or not session_id:
+        return None, None, None
+    key = (session_id, kind)
+    thumbnail = frame_gate.thumbnail(image_bytes)
+    cached = frame_gate.lookup(key, thumbnail)
+    return key, thumbnail, dict(cached, cached=True) if cached is not None else None
+
+def log_verification_violations(result, evidence=None):
+    """Record the violations of a /verify-face result"""
+    status = result["status"]
+    if status == "no_face":
+        log_violation_db("no_face", "No face detected", 3, evidence)
+    elif status == "multiple_faces":
+        log_violation_db("multiple_faces", f"Multiple faces detected: {result['face_count']}", 4, evidence)
+    elif status == "unverified":
+        log_violation_db("unverified", "Face did not match any registered user", 4, evidence)
+    else:
+        # Log suspicious objects if detected
+        for obj in result["analysis"]["suspicious_objects"]:
+            log_violation_db("suspicious_object", obj, 3)
+
+def log_attention_violations(result):
+    """Record the violations of an /analyze-attention result"""
+    score = result["analysis"]["attention_score"]
+    if result["status"] == "attention_warning":
+        log_violation_db("partial_attention", f"Partial attention detected - Score: {score}", 2)
+    elif result["status"] == "distracted":
+        log_violation_db("distracted", f"Student appears distracted - Score: {score}", 3)
+
+def capture_slow_frames(fn):
+    """Record the uploaded frame of slow requests to a frame endpoint when slow capture is on"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not slow_frames:
+            return fn(*args, **kwargs)
+        with slow_frames.watch(request.path, session_id=session.get('session_id'),
+                               analyses=request.form.get('analyses')) as capture:
+            response = fn(*args, **kwargs)
+            file = request.files.get('image')
+            if file:
+                file.stream.seek(0)
+                capture.frame = file.read()
+            return response
+    return wrapper
+
 @app.route('/verify-face', methods=['POST'])
+@capture_slow_frames
 def verify_face():
     try:
         file = request.files['image']
-        npimg = np.frombuffer(file.read(), np.uint8)
-        img = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
+        image_bytes = file.read()
+        session_id = session.get('session_id')
+        track = face_tracker.get(session_id) if face_tracker and session_id else None
+
+        # Nothing changed since the last analysed frame: reuse its result, whose
+        # violations were logged when it was analysed
+        gate_key, thumbnail, result = gated('verify', image_bytes)
+        if result is not None:
+            return jsonify(result)
+        if worker_pool:
+            try:
+                outcome = worker_pool.verify(image_bytes, session.get('student_name'), track)
+            except (PoolSaturated, TaskTimeout) as e:
+                return pool_busy_response(e)
+            result = outcome['result']
+            if track:
+                face_tracker.adopt(session_id, outcome['track'], outcome.get('tracking'))
+            if result["status"] == "error":
+                return jsonify(result)
+        else:
+            img = decode_frame(image_bytes)
+            if img is None:
+                return jsonify({"status": "error", "message": "Invalid image"})
+
+            frame = FrameContext(img, detection_scale=detection_scale)
+            result = verify_frame(frame, identify_face, face_tracker, track, session.get('student_name'))
+
+        if gate_key:
+            frame_gate.store(gate_key, thumbnail, result)
+
+        evidence = evidence_encoder.prepare(image_bytes) if result["status"] != "verified" else None
+        log_verification_violations(result, evidence)
+        return jsonify(result)
 
-        if img is None:
-            return jsonify({"status": "error", "message": "Invalid image"})
-
-        rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        face_locations = face_recognition.face_locations(rgb_img)
-        faces = face_recognition.face_encodings(rgb_img, face_locations)
-
-        # Enhanced analysis
-        analysis_results = {
-            "face_count": len(faces),
-            "suspicious_objects": detect_suspicious_objects(img),
-            "gaze_analysis": analyze_gaze_direction(img) if len(faces) == 1 else None,
-            "image_quality": assess_image_quality(img)
-        }
-
-        if not faces:
-            log_violation_db("no_face", "No face detected", 3, 
-                           base64.b64encode(cv2.imencode('.jpg', img)[1]).decode())
-            return jsonify({"status": "no_face", "face_count": 0, "analysis": analysis_results})
-
-        # Check for multiple faces
-        if len(faces) > 1:
-            log_violation_db("multiple_faces", f"Multiple faces detected: {len(faces)}", 4, 
-                           base64.b64encode(cv2.imencode('.jpg', img)[1]).decode())
-            return jsonify({"status": "multiple_faces", "face_count": len(faces), "analysis": analysis_results})
-
-        # Verify the single face
-        if known_face_encodings:
-            face_distances = face_recognition.face_distance(known_face_encodings, faces[0])
-            best_match_index = np.argmin(face_distances)
-            
-            if face_distances[best_match_index] < 0.6:  # Threshold for face recognition
-                confidence = (1 - face_distances[best_match_index]) * 100
-                
-                # Log suspicious objects if detected
-                if analysis_results["suspicious_objects"]:
-                    for obj in analysis_results["suspicious_objects"]:
-                        log_violation_db("suspicious_object", obj, 3)
-                
-                return jsonify({
-                    "status": "verified", 
-                    "name": known_face_names[best_match_index],
-                    "confidence": round(confidence, 2),
-                    "face_count": 1,
-                    "analysis": analysis_results
-                })
-        
-        log_violation_db("unverified", "Face did not match any registered user", 4,
-                        base64.b64encode(cv2.imencode('.jpg', img)[1]).decode())
-        return jsonify({"status": "unverified", "face_count": 1, "analysis": analysis_results})
-        
     except Exception as e:
         print(f"Error in face verification: {e}")
         return jsonify({"status": "error", "message": str(e)})
 
-def assess_image_quality(img):
-    """Assess the quality of the captured image"""
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    
-    # Calculate brightness
-    brightness = np.mean(gray)
-    
-    # Calculate sharpness using Laplacian variance
-    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
-    
-    quality_score = 0
-    issues = []
-    
-    if brightness < 50:
-        issues.append("Image too dark")
-    elif brightness > 200:
-        issues.append("Image too bright")
-    else:
-        quality_score += 30
-    
-    if sharpness < 100:
-        issues.append("Image blurry")
-    else:
-        quality_score += 40
-    
-    # Check image size
-    height, width = gray.shape
-    if width < 640 or height < 480:
-        issues.append("Image resolution too low")
-    else:
-        quality_score += 30
-    
-    return {
-        "score": quality_score,
-        "brightness": round(brightness, 1),
-        "sharpness": round(sharpness, 1),
-        "issues": issues
-    }
-
 @app.route('/analyze-attention', methods=['POST'])
+@capture_slow_frames
 def analyze_attention():
     try:
         file = request.files['image']
-        npimg = np.frombuffer(file.read(), np.uint8)
-        img = cv2.imdecode(npimg, cv2.IMREAD_COLOR)
-        
-        if img is None:
-            return jsonify({"status": "error", "message": "Invalid image"})
+        image_bytes = file.read()
 
-        # Use enhanced gaze analysis
-        gaze_result = analyze_gaze_direction(img)
-        
-        # Traditional eye detection as fallback
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        eye_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_eye.xml')
-        eyes = eye_cascade.detectMultiScale(gray, 1.3, 5)
-        
-        combined_analysis = {
-            "eyes_detected": len(eyes),
-            "gaze_analysis": gaze_result,
-            "attention_score": gaze_result.get("score", 0)
-        }
-        
-        # Determine overall attention status
-        if gaze_result["status"] == "focused":
-            status = "attentive"
-        elif gaze_result["status"] == "partially_focused":
-            status = "attention_warning"
-            log_violation_db("partial_attention", f"Partial attention detected - Score: {gaze_result.get('score', 0)}", 2)
+        gate_key, thumbnail, result = gated('attention', image_bytes)
+        if result is not None:
+            return jsonify(result)
+        if worker_pool:
+            try:
+                result = worker_pool.attention(image_bytes)['result']
+            except (PoolSaturated, TaskTimeout) as e:
+                return pool_busy_response(e)
         else:
-            status = "distracted"
-            log_violation_db("distracted", f"Student appears distracted - Score: {gaze_result.get('score', 0)}", 3)
-        
-        return jsonify({
-            "status": status, 
-            "analysis": combined_analysis,
-            "details": gaze_result.get("details", [])
-        })
-        
+            img = decode_frame(image_bytes)
+            if img is None:
+                return jsonify({"status": "error", "message": "Invalid image"})
+            result = analyze_attention_frame(FrameContext(img, detection_scale=detection_scale))
+
+        if result["status"] == "error":
+            return jsonify(result)
+        if gate_key:
+            frame_gate.store(gate_key, thumbnail, result)
+
+        log_attention_violations(result)
+        return jsonify(result)
+
     except Exception as e:
         print(f"Error in attention analysis: {e}")
         return jsonify({"status": "error", "message": str(e)})
 
+def run_frame_analysis(image_bytes, analyses):
+    """Analyse one frame for the current session and log its violations.
+
+    Shared by /analyze-frame and the frame stream; raises PoolSaturated or
+    TaskTimeout when the worker pool can't take the frame.
+    """
+    session_id = session.get('session_id')
+    track = face_tracker.get(session_id) if face_tracker and 'verify' in analyses and session_id else None
+
+    gate_key, thumbnail, cached = gated('frame:' + '+'.join(analyses), image_bytes)
+    if cached is not None:
+        # Its violations were logged when the frame was analysed
+        results = {name: dict(result, cached=True) for name, result in cached['results'].items()}
+        return {"status": "success", "results": results}
+    if worker_pool:
+        outcome = worker_pool.analyze(image_bytes, analyses, session.get('student_name'), track)
+        if 'result' in outcome:
+            return outcome['result']
+        results = outcome['results']
+        if track:
+            face_tracker.adopt(session_id, outcome['track'], outcome.get('tracking'))
+    else:
+        img = decode_frame(image_bytes)
+        if img is None:
+            return {"status": "error", "message": "Invalid image"}
+
+        frame = FrameContext(img, detection_scale=detection_scale)
+        results = analyze_frame(frame, analyses, identify_face, face_tracker, track, session.get('student_name'))
+
+    if gate_key:
+        frame_gate.store(gate_key, thumbnail, {'results': results})
+
+    if 'verify' in results:
+        evidence = evidence_encoder.prepare(image_bytes) if results['verify']["status"] != "verified" else None
+        log_verification_violations(results['verify'], evidence)
+    if 'attention' in results:
+        log_attention_violations(results['attention'])
+
+    return {"status": "success", "results": results}
+
+def paced_analysis(image_bytes, analyses):
+    """Run a frame through ``run_frame_analysis`` and feed its latency to the pacer"""
+    started = time.perf_counter()
+    try:
+        payload = run_frame_analysis(image_bytes, analyses)
+    except (PoolSaturated, TaskTimeout):
+        stream_pacer.record((time.perf_counter() - started) * 1000, busy=True)
+        raise
+    elapsed = time.perf_counter() - started
+    stream_pacer.record(elapsed * 1000)
+    session_id = session.get('session_id')
+    if risk_scheduler and session_id and payload.get('status') != 'error':
+        risk_scheduler.record_frame(session_id, elapsed)
+    return payload
+
+def session_pacing():
+    """Pacing for the current session: risk-weighted intervals, then load pressure"""
+    session_id = session.get('session_id')
+    if not risk_scheduler or not session_id:
+        return stream_pacer.pacing()
+    frame_interval, verify_interval = risk_scheduler.intervals(
+        session_id, stream_pacer.frame_interval, stream_pacer.verify_interval)
+    return dict(stream_pacer.pacing(frame_interval=frame_interval, verify_interval=verify_interval),
+                risk=round(risk_scheduler.risk(session_id), 3))
+
+@app.route('/analyze-frame', methods=['POST'])
+@capture_slow_frames
+def analyze_frame_endpoint():
+    """Run several analyses on one uploaded frame.
+
+    ``analyses`` lists what to run (``verify``, ``attention``; both by
+    default). The frame is decoded once and gaze is scored once. The
+    response carries the ``pacing`` the client should use for its next frame.
+    """
+    try:
+        file = request.files['image']
+        image_bytes = file.read()
+        requested = request.form.get('analyses') or ','.join(FRAME_ANALYSES)
+        names = {name.strip() for name in requested.split(',') if name.strip()}
+        unknown = sorted(names - set(FRAME_ANALYSES))
+        if unknown or not names:
+            message = f"analyses must name one or more of {', '.join(FRAME_ANALYSES)}"
+            if unknown:
+                message += f"; unknown: {', '.join(unknown)}"
+            return jsonify({"status": "error", "message": message}), 400
+        analyses = [name for name in FRAME_ANALYSES if name in names]
+
+        try:
+            payload = paced_analysis(image_bytes, analyses)
+        except (PoolSaturated, TaskTimeout) as e:
+            return pool_busy_response(e)
+        return jsonify(dict(payload, pacing=session_pacing()))
+
+    except Exception as e:
+        print(f"Error in frame analysis: {e}")
+        return jsonify({"status": "error", "message": str(e)})
+
+@sock.route('/ws/frames')
+def frame_stream(ws):
+    """Persistent frame channel for one proctoring session.
+
+    The client sends each frame as a binary JPEG message and waits for the
+    reply before sending the next. Every reply carries ``pacing``: when to
+    send the next frame and at what width and JPEG quality. The server picks
+    the analyses itself, verifying the face once per ``verify_interval_ms``.
+    """
+    if not session.get('session_id'):
+        ws.send(json.dumps({"type": "error", "message": "No active session"}))
+        return
+
+    stream_pacer.opened()
+    last_verify = 0.0
+    try:
+        ws.send(json.dumps({"type": "pacing", "pacing": session_pacing()}))
+        while True:
+            message = ws.receive()
+            if not isinstance(message, (bytes, bytearray)):
+                continue  # only frames are expected; ignore keep-alive text
+
+            pacing = session_pacing()
+            analyses = ['attention']
+            now = time.monotonic()
+            if (now - last_verify) * 1000 >= pacing['verify_interval_ms']:
+                analyses.insert(0, 'verify')
+
+            started = time.perf_counter()
+            watch = (slow_frames.watch('/ws/frames', frame=message, session_id=session.get('session_id'),
+                                       analyses=','.join(analyses))
+                     if slow_frames else contextlib.nullcontext())
+            try:
+                with watch:
+                    payload = paced_analysis(message, analyses)
+                stage_metrics.observe_request('/ws/frames', time.perf_counter() - started)
+            except (PoolSaturated, TaskTimeout) as e:
+                ws.send(json.dumps({"type": "busy", "message": str(e), "pacing": session_pacing()}))
+                continue
+            except Exception as e:
+                print(f"Error in frame stream: {e}")
+                payload = {"status": "error", "message": str(e)}
+
+            if 'verify' in payload.get('results', {}):
+                last_verify = now
+            ws.send(json.dumps(dict(payload, type="result", pacing=session_pacing())))
+    except ConnectionClosed:
+        pass
+    finally:
+        stream_pacer.closed()
+
 @app.route('/log-violation', methods=['POST'])
 def log_violation_endpoint():
     data = request.get_json()
@@ -411,127 +627,94 @@ def dashboard():
 
 @app.route('/download-report')
 def download_report():
-    create_pdf_report()
-    return send_file(PDF_REPORT_PATH, as_attachment=True)
+    if violation_writer:
+        violation_writer.flush()
+    return send_file(os.path.abspath(create_pdf_report()), as_attachment=True,
+                     download_name='violation_report.pdf')
+
+@app.route('/api/session/<session_id>/report')
+def get_session_report(session_id):
+    """Download the cached PDF report of any session"""
+    if violation_writer:
+        violation_writer.flush()
+    path = report_cache.get(session_id)
+    if not path:
+        return jsonify({'error': 'Session not found'}), 404
+    return send_file(os.path.abspath(path), as_attachment=True,
+                     download_name=f'session_{session_id}.pdf')
+
+def report_job_response(job):
+    """Job status with download links instead of server paths"""
+    reports = {session_id: f'/api/session/{session_id}/report' for session_id in job['reports']}
+    archive_url = f"/api/report-jobs/{job['job_id']}/download" if job['status'] != 'running' else None
+    return dict(job, reports=reports, archive_url=archive_url)
+
+@app.route('/api/exams/<exam_name>/reports', methods=['POST'])
+def generate_exam_reports(exam_name):
+    """Start rendering the report of every session of an exam in the background"""
+    if violation_writer:
+        violation_writer.flush()
+    job = report_jobs.submit(exam_name)
+    if not job['total']:
+        return jsonify({'error': f'No sessions for exam {exam_name}'}), 404
+    return jsonify(report_job_response(job)), 202
+
+@app.route('/api/report-jobs/<job_id>')
+def get_report_job(job_id):
+    """Progress of a bulk report job"""
+    job = report_jobs.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(report_job_response(job))
+
+@app.route('/api/report-jobs/<job_id>/download')
+def download_report_job(job_id):
+    """Zip of every report rendered by a finished bulk job"""
+    job = report_jobs.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    path = report_jobs.archive(job_id, os.path.join(EXAM_REPORTS_DIR, f'{job_id}.zip'))
+    if not path:
+        return jsonify({'error': 'Job still running'}), 409
+    return send_file(os.path.abspath(path), as_attachment=True, mimetype='application/zip',
+                     download_name=f"{job['exam_name']}_reports.zip")
 
 def log_violation(violation_type, details):
     timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    log = {"timestamp": timestamp, "type": violation_type, "details": details}
-    os.makedirs(os.path.dirname(REPORTS_FILE), exist_ok=True)
-    try:
-        with open(REPORTS_FILE, 'r') as f:
-            logs = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        logs = []
-    logs.append(log)
-    with open(REPORTS_FILE, 'w') as f:
-        json.dump(logs, f, indent=2)
+    violation_log.append({"timestamp": timestamp, "type": violation_type, "details": details})
 
-def log_violation_db(violation_type, details, severity=1, image_data=None):
+def log_violation_db(violation_type, details, severity=1, image=None):
+    """Record a violation; ``image`` is optional evidence from ``evidence_encoder.prepare``"""
     session_id = session.get('session_id', 'unknown')
     timestamp = datetime.datetime.now()
-    
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT INTO violations (session_id, timestamp, violation_type, details, severity, image_data)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (session_id, timestamp, violation_type, details, severity, image_data))
-    conn.commit()
-    conn.close()
+    if risk_scheduler and session_id != 'unknown':
+        risk_scheduler.record_violation(session_id, violation_type, severity)
 
-def create_pdf_report():
-    session_id = session.get('session_id')
-    
-    # Get data from database if session exists, otherwise use JSON file
-    if session_id:
+    if violation_writer:
+        violation_writer.write(session_id, timestamp, violation_type, details, severity, image)
+        return
+
+    with stage_metrics.timer('db_write'):
+        evidence_ref = evidence_store.put(image) if image is not None else None
         conn = sqlite3.connect(DATABASE_PATH)
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT s.student_name, s.exam_name, s.start_time, s.end_time,
-                   v.timestamp, v.violation_type, v.details, v.severity
-            FROM sessions s
-            LEFT JOIN violations v ON s.session_id = v.session_id
-            WHERE s.session_id = ?
-            ORDER BY v.timestamp
-        ''', (session_id,))
-        data = cursor.fetchall()
+            INSERT INTO violations (session_id, timestamp, violation_type, details, severity, evidence_ref)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (session_id, timestamp, violation_type, details, severity, evidence_ref))
+        conn.commit()
         conn.close()
-        
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", 'B', 16)
-        pdf.cell(200, 10, txt="Proctoring Violation Report", ln=True, align='C')
-        pdf.ln(10)
-        
-        if data:
-            student_name = data[0][0] or 'Unknown'
-            exam_name = data[0][1] or 'Unknown Exam'
-            start_time = data[0][2]
-            end_time = data[0][3] or 'Ongoing'
-            
-            pdf.set_font("Arial", 'B', 12)
-            pdf.cell(200, 10, txt=f"Student: {student_name}", ln=True)
-            pdf.cell(200, 10, txt=f"Exam: {exam_name}", ln=True)
-            pdf.cell(200, 10, txt=f"Start Time: {start_time}", ln=True)
-            pdf.cell(200, 10, txt=f"End Time: {end_time}", ln=True)
-            pdf.ln(10)
-            
-            pdf.set_font("Arial", 'B', 12)
-            pdf.cell(200, 10, txt="Violations:", ln=True)
-            pdf.set_font("Arial", size=10)
-            
-            violation_count = 0
-            for row in data:
-                if row[4]:  # If timestamp exists (violation data)
-                    violation_count += 1
-                    severity_text = ["Low", "Medium", "High", "Critical"][min(row[7]-1, 3)]
-                    line = f"{row[4]} | {row[5]} | {row[6]} | Severity: {severity_text}"
-                    pdf.multi_cell(0, 8, txt=line)
-            
-            if violation_count == 0:
-                pdf.cell(200, 10, txt="No violations recorded.", ln=True)
-            else:
-                pdf.ln(5)
-                pdf.set_font("Arial", 'B', 12)
-                pdf.cell(200, 10, txt=f"Total Violations: {violation_count}", ln=True)
-    else:
-        # Fallback to JSON file
-        try:
-            with open(REPORTS_FILE, 'r') as f:
-                logs = json.load(f)
-        except:
-            logs = []
-        
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", 'B', 16)
-        pdf.cell(200, 10, txt="Proctoring Violation Report", ln=True, align='C')
-        pdf.ln(10)
-        pdf.set_font("Arial", size=10)
-        
-        for log in logs:
-            line = f"{log['timestamp']} | {log['type']} | {log['details']}"
-            pdf.multi_cell(0, 8, txt=line)
-    
-    os.makedirs(os.path.dirname(PDF_REPORT_PATH), exist_ok=True)
-    pdf.output(PDF_REPORT_PATH)
 
-if __name__ == '__main__':
-    # Load configuration
-    try:
-        with open('config.json', 'r') as f:
-            config = json.load(f)
-            print("Configuration loaded successfully")
-    except FileNotFoundError:
-        print("Config file not found, using defaults")
-        config = {}
-    
-    print("Starting Biometric Proctoring System...")
-    print(f"Known faces loaded: {len(known_face_names)}")
-    print(f"Database initialized: {DATABASE_PATH}")
-    
-    app.run(debug=True, host='0.0.0.0', port=5000)
+def create_pdf_report():
+    """Path of the PDF report for the current session, or of the client log when there is none"""
+    session_id = session.get('session_id')
+    if session_id:
+        path = report_cache.get(session_id)
+        if path:
+            return path
+
+    # Fallback to the JSON Lines log, streamed entry by entry
+    return render_log_report(violation_log.entries(), PDF_REPORT_PATH)
 
 # Additional API endpoints for enhanced functionality
 @app.route('/api/stats')
@@ -545,21 +728,18 @@ def get_stats():
     total_sessions = cursor.fetchone()[0]
     
     # Get active sessions
-    cursor.execute('SELECT COUNT(*) FROM sessions WHERE status = "active"')
+    cursor.execute("SELECT COUNT(*) FROM sessions WHERE status = 'active'")
     active_sessions = cursor.fetchone()[0]
     
-    # Get total violations
-    cursor.execute('SELECT COUNT(*) FROM violations')
-    total_violations = cursor.fetchone()[0]
-    
-    # Get violations by type
+    # Violation totals come from the trigger-maintained counter table
     cursor.execute('''
-        SELECT violation_type, COUNT(*) 
-        FROM violations 
-        GROUP BY violation_type 
-        ORDER BY COUNT(*) DESC
+        SELECT violation_type, violation_count
+        FROM violation_type_counts
+        WHERE violation_count > 0
+        ORDER BY violation_count DESC
     ''')
     violations_by_type = dict(cursor.fetchall())
+    total_violations = sum(violations_by_type.values())
     
     conn.close()
     
@@ -568,43 +748,62 @@ def get_stats():
         'active_sessions': active_sessions,
         'total_violations': total_violations,
         'violations_by_type': violations_by_type,
-        'known_faces': len(known_face_names)
+        'known_faces': len(gallery)
     })
 
+def encode_cursor(start_time, row_id):
+    """Opaque keyset pagination cursor for a sessions row"""
+    return base64.urlsafe_b64encode(json.dumps([start_time, row_id]).encode()).decode()
+
+def decode_cursor(cursor_value):
+    start_time, row_id = json.loads(base64.urlsafe_b64decode(cursor_value.encode()))
+    return start_time, int(row_id)
+
 @app.route('/api/sessions')
 def get_sessions():
-    """Get all sessions with pagination"""
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
-    offset = (page - 1) * per_page
-    
+    """Get sessions newest first, paginated by ``cursor`` (or the older ``page``)"""
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), 100)
+    cursor_value = request.args.get('cursor')
+
+    query = '''
+        SELECT s.id, s.session_id, s.student_name, s.exam_name, s.start_time, s.end_time, s.status,
+               IFNULL(c.violation_count, 0) as violation_count
+        FROM sessions s
+        LEFT JOIN session_violation_counts c ON c.session_id = s.session_id
+    '''
+    if cursor_value:
+        try:
+            after = decode_cursor(cursor_value)
+        except (ValueError, TypeError):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query += ' WHERE (s.start_time, s.id) < (?, ?) ORDER BY s.start_time DESC, s.id DESC LIMIT ?'
+        params = (after[0], after[1], per_page + 1)
+    else:
+        page = max(request.args.get('page', 1, type=int), 1)
+        query += ' ORDER BY s.start_time DESC, s.id DESC LIMIT ? OFFSET ?'
+        params = (per_page + 1, (page - 1) * per_page)
+
     conn = sqlite3.connect(DATABASE_PATH)
     cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT s.session_id, s.student_name, s.exam_name, s.start_time, s.end_time, s.status,
-               COUNT(v.id) as violation_count
-        FROM sessions s
-        LEFT JOIN violations v ON s.session_id = v.session_id
-        GROUP BY s.session_id
-        ORDER BY s.start_time DESC
-        LIMIT ? OFFSET ?
-    ''', (per_page, offset))
-    
+    cursor.execute(query, params)
+    rows = cursor.fetchall()
+    conn.close()
+
+    # One extra row tells whether there is a next page
+    next_cursor = encode_cursor(rows[per_page - 1][4], rows[per_page - 1][0]) if len(rows) > per_page else None
     sessions = []
-    for row in cursor.fetchall():
+    for row in rows[:per_page]:
         sessions.append({
-            'session_id': row[0],
-            'student_name': row[1],
-            'exam_name': row[2],
-            'start_time': row[3],
-            'end_time': row[4],
-            'status': row[5],
-            'violation_count': row[6]
+            'session_id': row[1],
+            'student_name': row[2],
+            'exam_name': row[3],
+            'start_time': row[4],
+            'end_time': row[5],
+            'status': row[6],
+            'violation_count': row[7]
         })
-    
-    conn.close()
-    return jsonify({'sessions': sessions})
+
+    return jsonify({'sessions': sessions, 'next_cursor': next_cursor})
 
 @app.route('/api/upload-face', methods=['POST'])
 def upload_face():
@@ -627,14 +826,31 @@ def upload_face():
         filepath = os.path.join(KNOWN_FACES_DIR, filename)
         file.save(filepath)
         
-        # Reload known faces
-        load_known_faces()
+        # Encode just the new image instead of reloading the whole gallery
+        gallery.add_image(filepath, key=filename)
         
         return jsonify({'message': f'Face for {name} uploaded successfully'})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/faces/<name>', methods=['DELETE'])
+def delete_face(name):
+    """Remove a known face from the gallery and from disk"""
+    try:
+        keys = gallery.remove_name(name)
+        if not keys:
+            return jsonify({'error': f'No face registered for {name}'}), 404
+
+        for key in keys:
+            filepath = os.path.join(KNOWN_FACES_DIR, key)
+            if os.path.exists(filepath):
+                os.remove(filepath)
+
+        return jsonify({'message': f'Face for {name} removed', 'images_removed': len(keys)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/config')
 def get_config():
     """Get current configuration"""
@@ -652,6 +868,7 @@ def update_config():
         config = request.get_json()
         with open('config.json', 'w') as f:
             json.dump(config, f, indent=2)
+        model_registry.configure(config.get('models'))
         return jsonify({'message': 'Configuration updated successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -716,7 +933,7 @@ def get_session_violations(session_id):
         cursor = conn.cursor()
         
         cursor.execute('''
-            SELECT timestamp, violation_type, details, severity, image_data
+            SELECT timestamp, violation_type, details, severity, evidence_ref
             FROM violations
             WHERE session_id = ?
             ORDER BY timestamp DESC
@@ -729,7 +946,8 @@ def get_session_violations(session_id):
                 'type': row[1],
                 'details': row[2],
                 'severity': row[3],
-                'has_image': bool(row[4])
+                'has_image': row[4] is not None,
+                'image_url': f'/api/evidence/{row[4]}' if row[4] else None
             })
         
         conn.close()
@@ -737,6 +955,20 @@ def get_session_violations(session_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/evidence/<ref>')
+def get_evidence(ref):
+    """Stream a violation evidence image"""
+    if not evidence_store.exists(ref):
+        return jsonify({'error': 'Evidence not found'}), 404
+    # Content-addressed files never change, so clients may cache them indefinitely
+    return send_file(os.path.abspath(evidence_store.path_for(ref)), mimetype='image/jpeg',
+                     conditional=True, max_age=31536000)
+
+@app.route('/api/models')
+def get_models():
+    """Get detector load times, memory and pool usage"""
+    return jsonify(model_registry.stats())
+
 @app.route('/api/screenshot')
 def take_screenshot():
     """Take a screenshot for monitoring purposes"""
@@ -769,10 +1001,65 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'database': db_status,
-        'known_faces': len(known_face_names),
+        'known_faces': len(gallery),
+        'matcher': matcher.stats(),
+        'tracking': face_tracker.stats() if face_tracker else None,
+        'frame_gate': frame_gate.stats() if frame_gate else None,
+        'streaming': stream_pacer.stats(),
+        'adaptive_rate': risk_scheduler.stats() if risk_scheduler else None,
+        'inference': inference_batcher.stats() if inference_batcher else None,
+        'workers': worker_pool.stats() if worker_pool else None,
+        'violation_writer': violation_writer.stats() if violation_writer else None,
+        'evidence': dict(evidence_store.stats(), **evidence_encoder.stats()),
+        'slow_frames': slow_frames.stats() if slow_frames else None,
         'timestamp': datetime.datetime.now().isoformat()
     })
 
+@app.route('/metrics')
+def metrics():
+    """Stage and request latency histograms, queue depths and sizes in Prometheus text format"""
+    if not stage_metrics.enabled:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    conn = sqlite3.connect(DATABASE_PATH)
+    active_sessions = conn.execute("SELECT COUNT(*) FROM sessions WHERE status = 'active'").fetchone()[0]
+    conn.close()
+
+    queues = {('queue', 'violation_writer'): violation_writer.stats()['queue_depth'] if violation_writer else 0,
+              ('queue', 'inference'): inference_batcher.stats()['queue_depth'] if inference_batcher else 0,
+              ('queue', 'workers'): worker_pool.stats()['pending'] if worker_pool else 0}
+    gauges = [
+        ('queue_depth', 'Items waiting in each work queue', queues),
+        ('active_sessions', 'Exam sessions started and not yet ended', active_sessions),
+        ('active_streams', 'Open /ws/frames connections', stream_pacer.stats()['active_streams']),
+        ('gallery_size', 'Known face encodings', len(gallery)),
+    ]
+    return Response(stage_metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/slow-frames')
+def list_slow_frames():
+    """Stored slow-frame captures, newest first"""
+    if not slow_frames:
+        return jsonify({'error': 'Slow frame capture is disabled'}), 404
+    return jsonify({'captures': slow_frames.list(), 'stats': slow_frames.stats()})
+
+@app.route('/api/slow-frames/<capture_id>')
+def download_slow_frame(capture_id):
+    """One capture (frame, timings, profile) as a zip, for replay with benchmarks.endpoints"""
+    data = slow_frames.archive(capture_id) if slow_frames else None
+    if data is None:
+        return jsonify({'error': 'Capture not found'}), 404
+    return send_file(io.BytesIO(data), as_attachment=True, mimetype='application/zip',
+                     download_name=f'{capture_id}.zip')
+
+def export_response(filters, export_format, filename):
+    """Stream an export as an attachment, one cursor chunk at a time"""
+    if violation_writer:
+        violation_writer.flush()
+    body = stream_export(DATABASE_PATH, filters, export_format, export_chunk_size)
+    response = Response(body, mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}.{export_format}'
+    return response
+
 @app.route('/api/export/<format>')
 def export_data(format):
     """Export session data in various formats"""
@@ -781,8 +1068,11 @@ def export_data(format):
         if not session_id:
             return jsonify({"error": "No active session"}), 400
         
-        if format not in ['json', 'csv']:
+        if format not in ['json', 'csv', 'jsonl']:
             return jsonify({"error": "Unsupported format"}), 400
+
+        if format != 'json':
+            return export_response(ExportFilters(session_id=session_id), format, f'session_{session_id}')
         
         conn = sqlite3.connect(DATABASE_PATH)
         cursor = conn.cursor()
@@ -800,27 +1090,57 @@ def export_data(format):
         data = cursor.fetchall()
         conn.close()
         
-        if format == 'json':
-            export_data = []
-            for row in data:
-                export_data.append({
-                    'session_id': row[0],
-                    'student_name': row[1],
-                    'exam_name': row[2],
-                    'start_time': row[3],
-                    'end_time': row[4],
-                    'violation_timestamp': row[5],
-                    'violation_type': row[6],
-                    'violation_details': row[7],
-                    'violation_severity': row[8]
-                })
-            
-            response = jsonify(export_data)
-            response.headers['Content-Disposition'] = f'attachment; filename=session_{session_id}.json'
-            return response
-            
-        # CSV format would be implemented here
-        return jsonify({"error": "CSV export not yet implemented"}), 501
+        export_data = []
+        for row in data:
+            export_data.append({
+                'session_id': row[0],
+                'student_name': row[1],
+                'exam_name': row[2],
+                'start_time': row[3],
+                'end_time': row[4],
+                'violation_timestamp': row[5],
+                'violation_type': row[6],
+                'violation_details': row[7],
+                'violation_severity': row[8]
+            })
+        
+        response = jsonify(export_data)
+        response.headers['Content-Disposition'] = f'attachment; filename=session_{session_id}.json'
+        return response
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@app.route('/api/exports/<export_format>')
+def bulk_export(export_format):
+    """Stream every matching session as CSV or JSON Lines.
+
+    Filters: ``exam``, ``since``/``until`` (session start, ISO date or
+    datetime) and ``violation_type`` (repeatable).
+    """
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": "Unsupported format"}), 400
+    try:
+        filters = ExportFilters.from_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return export_response(filters, export_format, 'proctoring_export')
+
+if __name__ == '__main__':
+    print("Configuration loaded successfully" if config else "Config file not found, using defaults")
+    print("Starting Biometric Proctoring System...")
+    print(f"Known faces loaded: {len(gallery)}")
+    print(f"Models loaded: {', '.join(name for name, stats in model_registry.stats().items() if stats['available'])}")
+    print(f"Database initialized: {DATABASE_PATH}")
+
+    if workers_config.get('enabled', False):
+        # Workers are forked from this thread before any request threads exist
+        worker_pool = VisionWorkerPool.from_config(gallery, worker_settings(), workers_config)
+        print(f"Analysis workers started: {len(worker_pool.start())}")
+    if report_jobs.workers:
+        report_jobs.start()
+        atexit.register(report_jobs.shutdown)
+        print(f"Report workers started: {report_jobs.workers}")
+
+    # The reloader would run a second copy of the app with its own pools
+    app.run(debug=True, host='0.0.0.0', port=5000, threaded=True, use_reloader=worker_pool is None and not report_jobs.workers)
@@ -0,0 +1 @@
+"""Offline performance benchmarks, run from the repository root"""
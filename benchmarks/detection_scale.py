@@ -0,0 +1,101 @@
+"""Face detection latency versus recall at different detection scales.
+
+Full-resolution detections on each fixture image are the reference; every
+scale is scored by how many reference faces it still finds (IoU >= 0.5).
+
+    python -m benchmarks.detection_scale --fixtures models/known_faces
+    python -m benchmarks.detection_scale --scales 1 0.75 0.5 0.33 --json scale.json
+"""
+import argparse
+import json
+import os
+import time
+
+import cv2
+import face_recognition
+import numpy as np
+
+from services.frame_pipeline import HOG_MIN_FACE_SIZE, FrameContext
+from services.gallery import IMAGE_EXTENSIONS
+
+
+def iou(a, b):
+    """Intersection over union of two (top, right, bottom, left) boxes"""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(bottom - top, 0) * max(right - left, 0)
+    union = (a[2] - a[0]) * (a[1] - a[3]) + (b[2] - b[0]) * (b[1] - b[3]) - inter
+    return inter / union if union else 0.0
+
+
+def load_fixtures(directory):
+    frames = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.lower().endswith(IMAGE_EXTENSIONS):
+            img = cv2.imread(os.path.join(directory, filename))
+            if img is not None:
+                frames.append((filename, img))
+    return frames
+
+
+def detect(img, scale):
+    frame = FrameContext(img, detection_scale=scale)
+    frame.get('rgb')  # colour conversion is shared, time detection only
+    started = time.perf_counter()
+    locations = frame.face_locations
+    return locations, (time.perf_counter() - started) * 1000
+
+
+def run(frames, scales, repeat):
+    reference = {name: face_recognition.face_locations(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+                 for name, img in frames}
+    results = []
+    for scale in scales:
+        latencies = []
+        found = expected = 0
+        for name, img in frames:
+            for _ in range(repeat):
+                locations, elapsed = detect(img, scale)
+                latencies.append(elapsed)
+            expected += len(reference[name])
+            found += sum(1 for ref in reference[name]
+                         if any(iou(ref, box) >= 0.5 for box in locations))
+        results.append({
+            'scale': scale,
+            'min_face_px': round(HOG_MIN_FACE_SIZE / scale),
+            'mean_ms': round(float(np.mean(latencies)), 2),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+            'recall': round(found / expected, 3) if expected else None,
+        })
+    baseline = results[0]['mean_ms'] if results and results[0]['scale'] == 1.0 else None
+    for row in results:
+        row['speedup'] = round(baseline / row['mean_ms'], 2) if baseline and row['mean_ms'] else None
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixtures', default='models/known_faces', help='Directory of face images')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1.0, 0.75, 0.5, 0.33, 0.25])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    frames = load_fixtures(args.fixtures)
+    if not frames:
+        parser.error(f"No images found in {args.fixtures}")
+
+    results = run(frames, args.scales, args.repeat)
+    print(f"{len(frames)} fixture images, {args.repeat} runs each")
+    print(f"{'scale':>6} {'min face':>9} {'mean ms':>9} {'p95 ms':>9} {'speedup':>8} {'recall':>7}")
+    for row in results:
+        print(f"{row['scale']:>6} {row['min_face_px']:>8}px {row['mean_ms']:>9} {row['p95_ms']:>9} "
+              f"{row['speedup'] or '-':>8} {row['recall'] if row['recall'] is not None else '-':>7}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'fixtures': len(frames), 'repeat': args.repeat, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
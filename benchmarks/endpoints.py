@@ -0,0 +1,288 @@
+"""Frame-analysis latency per stage and per endpoint, across gallery sizes and concurrency.
+
+Stages run in request order on one FrameContext, so an artifact shared by
+several analyzers (gray, RGB, pyramid, face locations) is charged to the
+first stage that needs it, as in a real request. Frames without a
+detectable face still time ``face_encodings`` and the gallery match, on a
+box in the middle of the frame.
+
+Endpoints are driven through Flask's test client against a throwaway copy
+of the app: database, evidence and gallery cache live in a temporary
+directory, the gallery is replaced by N synthetic encodings and the frame
+gate is off so every request is analysed. Each concurrency level runs that
+many client threads, each with its own session.
+
+    python -m benchmarks.endpoints
+    python -m benchmarks.endpoints --fixtures frames/ --gallery-sizes 100 10000 100000 --concurrency 1 4 8
+    python -m benchmarks.endpoints --json after.json --baseline before.json
+    python -m benchmarks.endpoints --captures reports/slow_frames --gallery-sizes 5000
+"""
+import argparse
+import concurrent.futures
+import importlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import cv2
+import face_recognition
+import numpy as np
+
+from benchmarks.detection_scale import load_fixtures
+from benchmarks.object_detection import synthetic_frames
+from services.analysis import (match_faces, detect_suspicious_objects, analyze_gaze_direction,
+                               assess_image_quality)
+from services.frame_pipeline import FrameContext
+from services.gallery import ENCODING_DIM, FaceGallery
+from services.matching import create_matcher
+from services.slow_frames import FRAME_FILE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STAGES = ('decode', 'face_locations', 'face_encodings', 'gallery_match', 'detect_suspicious_objects',
+          'analyze_gaze_direction', 'assess_image_quality', 'log_violation_db')
+ENDPOINTS = ('/verify-face', '/analyze-attention', '/api/stats')
+STUDENT = 'student_000000'
+
+
+def synthetic_gallery(size, seed=0):
+    """Gallery of ``size`` random encodings with the spread of real dlib ones, one per student"""
+    rng = np.random.default_rng(seed)
+    encodings = rng.normal(0.0, 0.09, size=(size, ENCODING_DIM)).astype(np.float32)
+    gallery = FaceGallery()
+    for i, encoding in enumerate(encodings):
+        gallery.add_encoding(f'synthetic_{i:06d}.jpg', f'student_{i:06d}', encoding)
+    return gallery
+
+
+def encode_frames(frames, quality=80):
+    """(name, JPEG bytes) for decoded frames, as a browser would upload them"""
+    return [(name, cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes())
+            for name, img in frames]
+
+
+def load_captures(directory):
+    """(capture id, frame bytes) for every capture stored by services/slow_frames.py"""
+    frames = []
+    for capture_id in sorted(os.listdir(directory)):
+        path = os.path.join(directory, capture_id, FRAME_FILE)
+        if os.path.isfile(path):
+            with open(path, 'rb') as f:
+                frames.append((capture_id, f.read()))
+    return frames
+
+
+def load_app(workdir, config_path):
+    """Import app.py with its working files in ``workdir``"""
+    shutil.copy(config_path, os.path.join(workdir, 'config.json'))
+    os.makedirs(os.path.join(workdir, 'reports'), exist_ok=True)
+    os.chdir(workdir)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    app_module = importlib.import_module('app')
+    app_module.frame_gate = None
+    return app_module
+
+
+def use_gallery(app_module, gallery):
+    """Swap the app's gallery and matcher, building the match index up front"""
+    app_module.gallery = gallery
+    app_module.matcher = create_matcher(gallery, app_module.face_config.get('matcher'))
+    app_module.matcher.warm_up(wait=True)
+
+
+def percentiles(latencies):
+    latencies = np.asarray(latencies)
+    return {
+        'count': int(latencies.size),
+        'mean_ms': round(float(latencies.mean()), 3),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 3),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 3),
+    }
+
+
+def stage_timings(app_module, image_bytes):
+    """Milliseconds per stage for one frame, run the way /verify-face and /analyze-attention do"""
+    timings = {}
+
+    def timed(stage, fn):
+        started = time.perf_counter()
+        result = fn()
+        timings[stage] = (time.perf_counter() - started) * 1000
+        return result
+
+    img = timed('decode', lambda: cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR))
+    frame = FrameContext(img, detection_scale=app_module.detection_scale)
+    locations = timed('face_locations', lambda: frame.face_locations)
+    height, width = img.shape[:2]
+    side = min(height, width) // 3
+    boxes = locations or [(height // 2 - side // 2, width // 2 + side // 2,
+                           height // 2 + side // 2, width // 2 - side // 2)]
+    encodings = timed('face_encodings', lambda: face_recognition.face_encodings(frame.rgb, boxes))
+    timed('gallery_match', lambda: match_faces(app_module.matcher, encodings, [STUDENT] * len(encodings),
+                                               app_module.face_config.get('tolerance', 0.6)))
+    timed('detect_suspicious_objects', lambda: detect_suspicious_objects(frame))
+    timed('analyze_gaze_direction', lambda: analyze_gaze_direction(frame))
+    timed('assess_image_quality', lambda: assess_image_quality(frame))
+
+    with app_module.app.test_request_context():
+        app_module.session['session_id'] = 'benchmark'
+        evidence = app_module.evidence_encoder.prepare(image_bytes)
+        timed('log_violation_db', lambda: app_module.log_violation_db('benchmark', 'Stage benchmark', 1, evidence))
+    return timings
+
+
+def run_stages(app_module, frames, repeat):
+    latencies = {stage: [] for stage in STAGES}
+    for _ in range(repeat):
+        for _, image_bytes in frames:
+            for stage, elapsed in stage_timings(app_module, image_bytes).items():
+                latencies[stage].append(elapsed)
+    results = []
+    for stage in STAGES:
+        row = dict(stage=stage, **percentiles(latencies[stage]))
+        row['frames_per_second'] = round(1000 / row['mean_ms'], 1) if row['mean_ms'] else None
+        results.append(row)
+    return results
+
+
+def request_frame(client, endpoint, name, image_bytes):
+    if endpoint == '/api/stats':
+        return client.get(endpoint)
+    return client.post(endpoint, data={'image': (io.BytesIO(image_bytes), name)},
+                       content_type='multipart/form-data')
+
+
+def run_client(app_module, endpoint, frames, indices):
+    """One client thread: its own session, then one request per frame index"""
+    client = app_module.app.test_client()
+    client.post('/start-session', json={'student_name': STUDENT, 'exam_name': 'benchmark'})
+    latencies, errors = [], 0
+    for i in indices:
+        name, image_bytes = frames[i % len(frames)]
+        started = time.perf_counter()
+        response = request_frame(client, endpoint, name, image_bytes)
+        latencies.append((time.perf_counter() - started) * 1000)
+        payload = response.get_json(silent=True) or {}
+        if response.status_code != 200 or payload.get('status') in ('error', 'busy'):
+            errors += 1
+    client.post('/end-session')
+    return latencies, errors
+
+
+def run_endpoint(app_module, endpoint, frames, concurrency, requests):
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(run_client, app_module, endpoint, frames, range(i, requests, concurrency))
+                   for i in range(concurrency)]
+        for future in futures:
+            client_latencies, client_errors = future.result()
+            latencies.extend(client_latencies)
+            errors += client_errors
+    wall = time.perf_counter() - started
+    row = dict(endpoint=endpoint, concurrency=concurrency, errors=errors, **percentiles(latencies))
+    row['requests_per_second'] = round(len(latencies) / wall, 1) if wall else None
+    return row
+
+
+def run(app_module, frames, gallery_sizes, concurrency_levels, endpoints, repeat, requests):
+    stages, endpoint_rows = [], []
+    for size in gallery_sizes:
+        use_gallery(app_module, synthetic_gallery(size))
+        for row in run_stages(app_module, frames, repeat):
+            stages.append(dict(row, gallery_size=size))
+        for endpoint in endpoints:
+            for concurrency in concurrency_levels:
+                row = run_endpoint(app_module, endpoint, frames, concurrency, requests)
+                endpoint_rows.append(dict(row, gallery_size=size))
+    if app_module.violation_writer:
+        app_module.violation_writer.flush()
+    return stages, endpoint_rows
+
+
+def row_key(row):
+    return (row.get('gallery_size'), row.get('stage') or row.get('endpoint'), row.get('concurrency'))
+
+
+def compare(results, baseline):
+    """p95 change against a previous --json run, per matching row"""
+    previous = {row_key(row): row for row in baseline.get('stages', []) + baseline.get('endpoints', [])}
+    changes = []
+    for row in results['stages'] + results['endpoints']:
+        before = previous.get(row_key(row))
+        if before and before['p95_ms']:
+            changes.append((row_key(row), before['p95_ms'], row['p95_ms'],
+                            round((row['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100, 1)))
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixtures', help='Directory of frames (default: synthetic frames)')
+    parser.add_argument('--captures', help='Slow-frame capture directory to replay instead of --fixtures')
+    parser.add_argument('--synthetic', type=int, default=20, help='Synthetic frames when no fixtures are given')
+    parser.add_argument('--gallery-sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--endpoints', nargs='+', default=list(ENDPOINTS), choices=ENDPOINTS)
+    parser.add_argument('--repeat', type=int, default=3, help='Passes over the frames for the stage timings')
+    parser.add_argument('--requests', type=int, default=50, help='Requests per endpoint and concurrency level')
+    parser.add_argument('--config', default='config.json', help='Config the app is loaded with')
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--baseline', help='Earlier --json output to compare p95 latencies against')
+    args = parser.parse_args()
+
+    if args.captures:
+        frames = load_captures(args.captures)
+    else:
+        frames = encode_frames(load_fixtures(args.fixtures) if args.fixtures else synthetic_frames(args.synthetic))
+    if not frames:
+        parser.error(f"No images found in {args.captures or args.fixtures}")
+    config_path = os.path.abspath(args.config)
+    baseline_path = os.path.abspath(args.baseline) if args.baseline else None
+    json_path = os.path.abspath(args.json) if args.json else None
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix='proctor-bench-') as workdir:
+        try:
+            app_module = load_app(workdir, config_path)
+            stages, endpoints = run(app_module, frames, args.gallery_sizes, args.concurrency,
+                                    args.endpoints, args.repeat, args.requests)
+            if app_module.violation_writer:
+                app_module.violation_writer.close()
+            app_module.violation_log.close()
+        finally:
+            os.chdir(cwd)
+
+    results = {'frames': len(frames), 'repeat': args.repeat, 'requests': args.requests,
+               'stages': stages, 'endpoints': endpoints}
+    print(f"{len(frames)} frames, galleries of {', '.join(map(str, args.gallery_sizes))} encodings")
+    print(f"{'gallery':>8} {'stage':>26} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'fps':>8}")
+    for row in stages:
+        print(f"{row['gallery_size']:>8} {row['stage']:>26} {row['p50_ms']:>9} {row['p95_ms']:>9} "
+              f"{row['p99_ms']:>9} {row['frames_per_second']:>8}")
+    print(f"{'gallery':>8} {'endpoint':>19} {'clients':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'req/s':>7} {'errors':>6}")
+    for row in endpoints:
+        print(f"{row['gallery_size']:>8} {row['endpoint']:>19} {row['concurrency']:>7} {row['p50_ms']:>9} "
+              f"{row['p95_ms']:>9} {row['p99_ms']:>9} {row['requests_per_second']:>7} {row['errors']:>6}")
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            changes = compare(results, json.load(f))
+        print(f"p95 against {args.baseline}:")
+        for key, before, after, change in changes:
+            label = ' '.join(str(part) for part in key if part is not None)
+            print(f"{label:>40} {before:>9} -> {after:>9} ({change:+.1f}%)")
+
+    if json_path:
+        with open(json_path, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Gaze scoring latency per method on attention-only frames.
+
+Attention-only requests have no face locations from verification, so each
+method pays for its own face detector: ``landmarks`` runs the HOG detector
+(at ``--detection-scale``) and then the 68-point predictor, ``cascade`` the
+Haar face and eye cascades. Detection time is reported separately; status
+agreement and score difference are measured against the landmarks method.
+
+    python -m benchmarks.gaze --fixtures models/known_faces
+    python -m benchmarks.gaze --width 1280 --detection-scale 0.5 --json gaze.json
+"""
+import argparse
+import json
+
+import cv2
+import numpy as np
+
+from benchmarks.detection_scale import load_fixtures
+from benchmarks.object_detection import timed
+from services.analysis import analyze_gaze_direction, gaze_settings
+from services.frame_pipeline import FrameContext
+from services.metrics import stage_metrics
+
+METHODS = ('landmarks', 'cascade')
+
+
+def resize(img, width):
+    if not width or img.shape[1] == width:
+        return img
+    return cv2.resize(img, (width, int(round(img.shape[0] * width / img.shape[1]))), interpolation=cv2.INTER_AREA)
+
+
+def score(method, img, detection_scale, detection_ms):
+    frame = FrameContext(img, detection_scale=detection_scale)
+    frame.get('gray'), frame.get('rgb')  # shared with other analyzers in the app
+    gaze_settings['method'] = method
+    with stage_metrics.capture() as timings:
+        result = analyze_gaze_direction(frame)
+    detection_ms.append(timings.get('detection', 0.0) * 1000)
+    return result
+
+
+def run(frames, repeat, detection_scale):
+    configured = gaze_settings.get('method')
+    outcomes = {}
+    try:
+        for method in METHODS:
+            latencies, detection_ms, payloads = [], [], {}
+            for name, img in frames:
+                payloads[name], elapsed = timed(lambda: score(method, img, detection_scale, detection_ms), repeat)
+                latencies.extend(elapsed)
+            outcomes[method] = (latencies, detection_ms, payloads)
+    finally:
+        gaze_settings['method'] = configured
+
+    reference = outcomes['landmarks'][2]
+    names = list(reference)
+    results = []
+    for method, (latencies, detection_ms, payloads) in outcomes.items():
+        results.append({
+            'method': method,
+            'mean_ms': round(float(np.mean(latencies)), 2),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+            'detection_ms': round(float(np.mean(detection_ms)), 2),
+            'status_agreement': round(sum(1 for n in names if payloads[n]['status'] == reference[n]['status'])
+                                      / len(names), 3),
+            'mean_score_diff': round(float(np.mean([abs(payloads[n].get('score', 0) - reference[n].get('score', 0))
+                                                    for n in names])), 2),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixtures', default='models/known_faces', help='Directory of face images')
+    parser.add_argument('--width', type=int, default=640, help='Resize fixtures to this webcam width (0 keeps them)')
+    parser.add_argument('--detection-scale', type=float, default=1.0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    frames = [(name, resize(img, args.width)) for name, img in load_fixtures(args.fixtures)]
+    if not frames:
+        parser.error(f"No images found in {args.fixtures}")
+
+    results = run(frames, args.repeat, args.detection_scale)
+    print(f"{len(frames)} fixture images at width {args.width or 'original'}, "
+          f"detection scale {args.detection_scale}, {args.repeat} runs each")
+    print(f"{'method':>10} {'mean ms':>9} {'p95 ms':>9} {'detect ms':>10} {'agree':>6} {'score diff':>11}")
+    for row in results:
+        print(f"{row['method']:>10} {row['mean_ms']:>9} {row['p95_ms']:>9} {row['detection_ms']:>10} "
+              f"{row['status_agreement']:>6} {row['mean_score_diff']:>11}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'fixtures': len(frames), 'width': args.width, 'detection_scale': args.detection_scale,
+                       'repeat': args.repeat, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
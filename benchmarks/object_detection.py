@@ -0,0 +1,119 @@
+"""Rectangle detector throughput and agreement: reference loop versus fast path.
+
+The reference is the original full-frame, per-contour detector. Each fast
+configuration is scored by how often it reaches the same verdict (more than
+two rectangles, i.e. "books/papers detected") and how far its counts are
+from the reference. Without fixture images, cluttered synthetic frames with
+a known number of rectangles are generated.
+
+    python -m benchmarks.object_detection
+    python -m benchmarks.object_detection --fixtures frames/ --widths 480 320 --json objects.json
+"""
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.detection_scale import load_fixtures
+from services.frame_pipeline import FrameContext
+from services.object_detection import count_rectangles, count_rectangles_fast, edge_level
+
+BOOK_THRESHOLD = 2  # detect_suspicious_objects flags more than this many rectangles
+
+
+def synthetic_frames(count, seed=0, size=(480, 640)):
+    """Noisy, textured frames with 0-6 large rectangles and many small shapes each"""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for i in range(count):
+        img = rng.integers(90, 140, size=size + (3,), dtype=np.uint8)
+        for _ in range(300):  # clutter: many small contours
+            x, y = int(rng.integers(0, size[1])), int(rng.integers(0, size[0]))
+            cv2.circle(img, (x, y), int(rng.integers(2, 9)), tuple(int(c) for c in rng.integers(0, 255, 3)), -1)
+        rectangles = int(rng.integers(0, 7))
+        for _ in range(rectangles):
+            w, h = int(rng.integers(90, 200)), int(rng.integers(70, 150))
+            x, y = int(rng.integers(0, size[1] - w)), int(rng.integers(0, size[0] - h))
+            cv2.rectangle(img, (x, y), (x + w, y + h), (250, 250, 250), -1)
+        frames.append((f'synthetic_{i:03d}', img))
+    return frames
+
+
+def timed(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return result, latencies
+
+
+def run(frames, widths, repeat):
+    reference_counts, reference_ms, contours = {}, [], 0
+    for name, img in frames:
+        gray = FrameContext(img).gray
+        reference_counts[name], latencies = timed(lambda: count_rectangles(gray), repeat)
+        reference_ms.extend(latencies)
+        edges = cv2.Canny(gray, 50, 150)
+        contours += len(cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)[0])
+
+    results = [summarise('reference', reference_ms, reference_counts, reference_counts)]
+    for width in widths:
+        counts, latencies = {}, []
+        for name, img in frames:
+            frame = FrameContext(img)
+            frame.get('pyramid')  # shared with other analyzers in the app, time detection only
+            small, scale = edge_level(frame.pyramid, width)
+            counts[name], elapsed = timed(lambda: count_rectangles_fast(small, scale), repeat)
+            latencies.extend(elapsed)
+        results.append(summarise(f'fast@{width}', latencies, counts, reference_counts))
+
+    baseline = results[0]['mean_ms']
+    for row in results:
+        row['speedup'] = round(baseline / row['mean_ms'], 2) if row['mean_ms'] else None
+    return results, contours / len(frames)
+
+
+def summarise(name, latencies, counts, reference_counts):
+    names = list(reference_counts)
+    agree = sum(1 for n in names if (counts[n] > BOOK_THRESHOLD) == (reference_counts[n] > BOOK_THRESHOLD))
+    return {
+        'detector': name,
+        'mean_ms': round(float(np.mean(latencies)), 3),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 3),
+        'frames_per_second': round(1000 / float(np.mean(latencies)), 1) if np.mean(latencies) else None,
+        'verdict_agreement': round(agree / len(names), 3),
+        'mean_count_diff': round(float(np.mean([abs(counts[n] - reference_counts[n]) for n in names])), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixtures', help='Directory of frames (default: synthetic frames)')
+    parser.add_argument('--synthetic', type=int, default=50, help='Synthetic frames when no fixtures are given')
+    parser.add_argument('--widths', type=int, nargs='+', default=[640, 480, 320])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    frames = load_fixtures(args.fixtures) if args.fixtures else synthetic_frames(args.synthetic)
+    if not frames:
+        parser.error(f"No images found in {args.fixtures}")
+
+    results, mean_contours = run(frames, args.widths, args.repeat)
+    print(f"{len(frames)} frames, {args.repeat} runs each, {mean_contours:.0f} contours per frame")
+    print(f"{'detector':>10} {'mean ms':>9} {'p95 ms':>9} {'fps':>8} {'speedup':>8} {'agree':>6} {'count diff':>11}")
+    for row in results:
+        print(f"{row['detector']:>10} {row['mean_ms']:>9} {row['p95_ms']:>9} {row['frames_per_second']:>8} "
+              f"{row['speedup']:>8} {row['verdict_agreement']:>6} {row['mean_count_diff']:>11}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'frames': len(frames), 'repeat': args.repeat, 'mean_contours': mean_contours,
+                       'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
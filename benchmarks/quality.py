@@ -0,0 +1,137 @@
+"""Image quality fast path versus the original full-resolution path on blurred frames.
+
+Every fixture (or synthetic frame) is cropped to each webcam size and
+blurred with a ladder of box and Gaussian kernels. Both paths score every
+frame; the run reports latency, blur-verdict agreement and the largest
+sharpness difference, and exits with status 1 if any blur verdict differs.
+
+    python -m benchmarks.quality --fixtures models/known_faces
+    python -m benchmarks.quality --sizes 640x480 1920x1080 --json quality.json
+"""
+import argparse
+import json
+import sys
+
+import cv2
+import numpy as np
+
+from benchmarks.detection_scale import load_fixtures
+from benchmarks.object_detection import synthetic_frames, timed
+from services.analysis import assess_image_quality, quality_settings
+from services.frame_pipeline import FrameContext
+
+BLURS = (('none', 0), ('box', 3), ('box', 5), ('box', 9), ('gaussian', 1), ('gaussian', 2), ('gaussian', 3))
+
+
+def webcam_frame(img, width, height):
+    """Scale to cover width x height, then centre-crop to it"""
+    scale = max(width / img.shape[1], height / img.shape[0])
+    if scale != 1:
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC
+        img = cv2.resize(img, (int(np.ceil(img.shape[1] * scale)), int(np.ceil(img.shape[0] * scale))),
+                         interpolation=interpolation)
+    top, left = (img.shape[0] - height) // 2, (img.shape[1] - width) // 2
+    return img[top:top + height, left:left + width]
+
+
+def blur(img, kind, size):
+    if kind == 'box':
+        return cv2.blur(img, (size, size))
+    if kind == 'gaussian':
+        return cv2.GaussianBlur(img, (0, 0), size)
+    return img
+
+
+def assess(img, fast):
+    frame = FrameContext(img)
+    frame.get('gray'), frame.get('pyramid')  # shared with other analyzers in the app
+    quality_settings['fast'] = fast
+    return assess_image_quality(frame)
+
+
+def run(frames, sizes, repeat):
+    configured = quality_settings.get('fast', True)
+    rows = []
+    try:
+        for name, source in frames:
+            for width, height in sizes:
+                img = webcam_frame(source, width, height)
+                for kind, size in BLURS:
+                    blurred = blur(img, kind, size)
+                    reference, reference_ms = timed(lambda: assess(blurred, False), repeat)
+                    result, fast_ms = timed(lambda: assess(blurred, True), repeat)
+                    rows.append({
+                        'frame': name, 'size': f'{width}x{height}', 'blur': f'{kind}:{size}' if size else kind,
+                        'reference_sharpness': reference['sharpness'], 'fast_sharpness': result['sharpness'],
+                        'reference_blurry': 'Image blurry' in reference['issues'],
+                        'fast_blurry': 'Image blurry' in result['issues'],
+                        'reference_ms': float(np.mean(reference_ms)), 'fast_ms': float(np.mean(fast_ms)),
+                    })
+    finally:
+        quality_settings['fast'] = configured
+    return rows
+
+
+def summarise(rows, sizes):
+    summary = []
+    for width, height in sizes:
+        size = f'{width}x{height}'
+        group = [row for row in rows if row['size'] == size]
+        reference_ms = float(np.mean([row['reference_ms'] for row in group]))
+        fast_ms = float(np.mean([row['fast_ms'] for row in group]))
+        summary.append({
+            'size': size,
+            'frames': len(group),
+            'blurry': sum(row['reference_blurry'] for row in group),
+            'reference_ms': round(reference_ms, 3),
+            'fast_ms': round(fast_ms, 3),
+            'speedup': round(reference_ms / fast_ms, 2) if fast_ms else None,
+            'verdict_agreement': round(sum(row['fast_blurry'] == row['reference_blurry'] for row in group)
+                                       / len(group), 3),
+            'max_sharpness_diff': round(max(abs(row['fast_sharpness'] - row['reference_sharpness'])
+                                            for row in group), 2),
+        })
+    return summary
+
+
+def parse_size(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--fixtures', help='Directory of frames (default: synthetic frames)')
+    parser.add_argument('--synthetic', type=int, default=5, help='Synthetic frames when no fixtures are given')
+    parser.add_argument('--sizes', type=parse_size, nargs='+', default=[(640, 480), (1280, 720), (1920, 1080)])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    frames = load_fixtures(args.fixtures) if args.fixtures else synthetic_frames(args.synthetic)
+    if not frames:
+        parser.error(f"No images found in {args.fixtures}")
+
+    rows = run(frames, args.sizes, args.repeat)
+    summary = summarise(rows, args.sizes)
+    print(f"{len(frames)} frames x {len(BLURS)} blurs, {args.repeat} runs each")
+    print(f"{'size':>10} {'frames':>7} {'blurry':>7} {'full ms':>8} {'fast ms':>8} {'speedup':>8} "
+          f"{'agree':>6} {'max diff':>9}")
+    for row in summary:
+        print(f"{row['size']:>10} {row['frames']:>7} {row['blurry']:>7} {row['reference_ms']:>8} "
+              f"{row['fast_ms']:>8} {row['speedup']:>8} {row['verdict_agreement']:>6} {row['max_sharpness_diff']:>9}")
+
+    mismatches = [row for row in rows if row['fast_blurry'] != row['reference_blurry']]
+    for row in mismatches:
+        print(f"verdict differs: {row['frame']} {row['size']} {row['blur']} "
+              f"(full {row['reference_sharpness']}, fast {row['fast_sharpness']})")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'frames': len(frames), 'repeat': args.repeat, 'summary': summary, 'rows': rows}, f, indent=2)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+"""Lets tests import app.py and services/ from the repository root."""
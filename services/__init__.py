@@ -0,0 +1 @@
+"""Backend services used by the Flask application in app.py"""
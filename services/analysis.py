@@ -0,0 +1,312 @@
+"""Frame analyzers and the per-frame verification/attention flows.
+
+Everything here works on a ``FrameContext`` and returns plain data, so the
+same code runs inside Flask request threads and inside pool workers
+(services/worker_pool.py) that don't import the web app.
+"""
+import cv2
+import numpy as np
+
+from services.frame_pipeline import FrameContext, FramePipeline, as_frame, locations_to_boxes
+from services.model_registry import ModelRegistry
+from services.object_detection import count_rectangles, count_rectangles_fast, edge_level
+from services.gaze import analyze_landmark_gaze
+from services.quality import assess_quality
+from services.metrics import stage_metrics
+
+# Detectors used by this process; app.py and pool workers configure it from config.json
+model_registry = ModelRegistry()
+
+# Rectangle detector settings, from the ``object_detection`` section of config.json
+# edge_width: count on the pyramid level this wide (approximate), or None for the full frame (exact)
+object_detection = {'fast_rectangles': True, 'edge_width': None, 'exclude_faces': True}
+
+
+def configure_object_detection(options):
+    object_detection.update(options or {})
+
+
+# Gaze scoring: 'landmarks' (face_recognition landmarks) or 'cascade' (Haar eye detector)
+gaze_settings = {'method': 'landmarks'}
+
+# Image quality: 'fast' metrics on a downsampled frame, or the full-resolution original
+quality_settings = {'fast': True}
+
+
+def configure_quality(options):
+    quality_settings.update(options or {})
+
+
+@FrameContext.artifact('face_boxes', requires=('gray',))
+def detect_face_boxes(frame, gray):
+    """Face boxes as (x, y, w, h), reusing face_recognition's locations when present"""
+    if frame.has('face_locations'):
+        return locations_to_boxes(frame.face_locations)
+    with stage_metrics.timer('detection'), model_registry.acquire('face_cascade') as face_cascade:
+        return face_cascade.detectMultiScale(gray, 1.1, 5)
+
+
+# Enhanced object detection function
+@stage_metrics.timed('objects')
+def detect_suspicious_objects(img):
+    """Detect phones, books, and other potentially suspicious objects"""
+    suspicious_objects = []
+
+    # Grayscale shared with the other analyzers of this frame
+    frame = as_frame(img)
+    gray = frame.gray
+
+    # Phone detection (simplified - you'd need a trained model for better accuracy)
+    with model_registry.acquire('phone_cascade') as phone_cascade:
+        if phone_cascade is not None:
+            phones = phone_cascade.detectMultiScale(gray, 1.1, 4)
+            if len(phones) > 0:
+                suspicious_objects.append(f"Phone detected ({len(phones)} instances)")
+
+    # Simple edge detection to identify rectangular objects (books, papers)
+    if object_detection.get('fast_rectangles', True):
+        edge_width = object_detection.get('edge_width')
+        small, scale = edge_level(frame.pyramid, edge_width) if edge_width else (gray, 1.0)
+        # The face itself is not an object; only skip it when detection already ran
+        exclude = frame.face_boxes if object_detection.get('exclude_faces', True) and frame.has('face_locations') else ()
+        book_like_objects = count_rectangles_fast(small, scale, exclude=exclude)
+    else:
+        book_like_objects = count_rectangles(gray)
+
+    if book_like_objects > 2:  # More than 2 rectangular objects might indicate books/papers
+        suspicious_objects.append(f"Rectangular objects detected ({book_like_objects} instances)")
+
+    return suspicious_objects
+
+
+# Enhanced attention analysis
+@stage_metrics.timed('gaze')
+def analyze_gaze_direction(img):
+    """Analyze if the person is looking at the screen"""
+    frame = as_frame(img)
+    if gaze_settings.get('method') == 'landmarks':
+        return analyze_landmark_gaze(frame.face_landmarks, gaze_settings)
+
+    gray = frame.gray
+    faces = frame.face_boxes
+
+    if len(faces) == 0:
+        return {"status": "no_face", "details": "No face detected for gaze analysis"}
+
+    attention_score = 0
+    gaze_details = []
+
+    for (x, y, w, h) in faces:
+        roi_gray = gray[y:y+h, x:x+w]
+        with model_registry.acquire('eye_cascade') as eye_cascade:
+            eyes = eye_cascade.detectMultiScale(roi_gray, 1.1, 5)
+
+        if len(eyes) >= 2:
+            attention_score += 50  # Base score for detecting both eyes
+
+            # Analyze eye positions (simplified)
+            eye_positions = [(ex + ew//2, ey + eh//2) for (ex, ey, ew, eh) in eyes[:2]]
+
+            # Check if eyes are looking forward (very basic check)
+            if len(eye_positions) == 2:
+                eye_distance = abs(eye_positions[0][0] - eye_positions[1][0])
+                if 30 < eye_distance < 80:  # Eyes are properly spaced
+                    attention_score += 30
+                    gaze_details.append("Eyes properly positioned")
+        elif len(eyes) == 1:
+            attention_score += 20
+            gaze_details.append("Only one eye visible")
+        else:
+            gaze_details.append("Eyes not clearly visible")
+
+    if attention_score >= 70:
+        return {"status": "focused", "score": attention_score, "details": gaze_details}
+    elif attention_score >= 40:
+        return {"status": "partially_focused", "score": attention_score, "details": gaze_details}
+    else:
+        return {"status": "distracted", "score": attention_score, "details": gaze_details}
+
+
+@stage_metrics.timed('quality')
+def assess_image_quality(img):
+    """Assess the quality of the captured image"""
+    frame = as_frame(img)
+    if quality_settings.get('fast', True):
+        small, _ = edge_level(frame.pyramid, quality_settings.get('analysis_width', 320))
+        return assess_quality(small, frame.gray, quality_settings)
+
+    gray = frame.gray
+
+    # Calculate brightness
+    brightness = np.mean(gray)
+
+    # Calculate sharpness using Laplacian variance
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+
+    quality_score = 0
+    issues = []
+
+    if brightness < 50:
+        issues.append("Image too dark")
+    elif brightness > 200:
+        issues.append("Image too bright")
+    else:
+        quality_score += 30
+
+    if sharpness < 100:
+        issues.append("Image blurry")
+    else:
+        quality_score += 40
+
+    # Check image size
+    height, width = gray.shape
+    if width < 640 or height < 480:
+        issues.append("Image resolution too low")
+    else:
+        quality_score += 30
+
+    return {
+        "score": quality_score,
+        "brightness": round(brightness, 1),
+        "sharpness": round(sharpness, 1),
+        "issues": issues
+    }
+
+
+# Analysis stages and the frame artifacts each one reads
+frame_pipeline = FramePipeline()
+frame_pipeline.add('suspicious_objects', detect_suspicious_objects, requires=('gray', 'pyramid'))
+frame_pipeline.add('gaze_analysis', analyze_gaze_direction, requires=('gray', 'face_boxes'))
+frame_pipeline.add('image_quality', assess_image_quality, requires=('gray', 'pyramid'))
+
+
+def configure_gaze(options):
+    """Apply the ``gaze`` section of config.json and the artifacts its method reads"""
+    gaze_settings.update(options or {})
+    requires = ('face_landmarks',) if gaze_settings.get('method') == 'landmarks' else ('gray', 'face_boxes')
+    frame_pipeline.add('gaze_analysis', analyze_gaze_direction, requires=requires)
+
+
+configure_gaze(None)
+
+
+@stage_metrics.timed('matching')
+def match_faces(matcher, encodings, student_names, tolerance=0.6):
+    """Best gallery match within tolerance for each encoding, or None.
+
+    Each face is checked 1:1 against its session's student first; the rest
+    fall back to 1:N identification, scored together in one matrix product.
+    """
+    matches = [None] * len(encodings)
+    pending = []
+    for i, (encoding, student_name) in enumerate(zip(encodings, student_names)):
+        match = matcher.verify(student_name, encoding) if student_name else None
+        if match is not None and match.distance < tolerance:
+            matches[i] = match
+        else:
+            pending.append(i)
+
+    if pending:
+        for i, match in zip(pending, matcher.match_batch([encodings[i] for i in pending])):
+            if match is not None and match.distance < tolerance:
+                matches[i] = match
+    return matches
+
+
+def verify_frame(frame, identify, tracker=None, track=None, student_name=None):
+    """Face count, analysis and identity for one frame as a /verify-face payload.
+
+    ``identify(frame, location, student_name)`` encodes and matches the single
+    face; with a tracker the previous box and verified identity are reused.
+    """
+    face_locations = tracker.locate(track, frame) if track else frame.face_locations
+    face_count = len(face_locations)
+
+    # Enhanced analysis; gaze reuses the face boxes found above
+    stages = ['suspicious_objects', 'image_quality']
+    if face_count == 1:
+        stages.append('gaze_analysis')
+    analysis_results = {"face_count": face_count, "gaze_analysis": None}
+    analysis_results.update(frame_pipeline.run(frame, stages))
+
+    if face_count != 1:
+        if track:
+            tracker.update(track, frame, face_locations)
+        status = "no_face" if face_count == 0 else "multiple_faces"
+        return {"status": status, "face_count": face_count, "analysis": analysis_results}
+
+    # Reuse the identity verified on earlier frames while the face looks the same,
+    # otherwise encode and match the single face
+    match = tracker.reusable_match(track, frame, face_locations[0]) if track else None
+    tracked = match is not None
+    if not tracked:
+        match = identify(frame, face_locations[0], student_name)
+        if track:
+            tracker.update(track, frame, face_locations, match)
+
+    if match is None:
+        return {"status": "unverified", "face_count": 1, "analysis": analysis_results}
+
+    return {
+        "status": "verified",
+        "name": match.name,
+        "confidence": round((1 - match.distance) * 100, 2),
+        "face_count": 1,
+        "tracked": tracked,
+        "analysis": analysis_results
+    }
+
+
+def analyze_attention_frame(frame, gaze_result=None):
+    """Gaze plus whole-frame eye detection as an /analyze-attention payload"""
+    if gaze_result is None:
+        gaze_result = frame_pipeline.run(frame, ['gaze_analysis'])['gaze_analysis']
+
+    if 'eye_aspect_ratio' in gaze_result:
+        # Landmark gaze already measured the eyes
+        eyes_detected = 2 if "Eyes closed" not in gaze_result["details"] else 0
+    elif gaze_result["status"] == "no_face" and gaze_settings.get('method') == 'landmarks':
+        eyes_detected = 0
+    else:
+        # Traditional eye detection as fallback
+        with model_registry.acquire('eye_cascade') as eye_cascade:
+            eyes_detected = len(eye_cascade.detectMultiScale(frame.gray, 1.3, 5))
+
+    combined_analysis = {
+        "eyes_detected": eyes_detected,
+        "gaze_analysis": gaze_result,
+        "attention_score": gaze_result.get("score", 0)
+    }
+
+    # Determine overall attention status
+    if gaze_result["status"] == "focused":
+        status = "attentive"
+    elif gaze_result["status"] == "partially_focused":
+        status = "attention_warning"
+    else:
+        status = "distracted"
+
+    return {
+        "status": status,
+        "analysis": combined_analysis,
+        "details": gaze_result.get("details", [])
+    }
+
+
+FRAME_ANALYSES = ('verify', 'attention')
+
+
+def analyze_frame(frame, analyses, identify, tracker=None, track=None, student_name=None):
+    """Several analyses of one decoded frame as an /analyze-frame payload.
+
+    The analyses share the frame's artifacts, and attention reuses the gaze
+    result computed during verification instead of scoring gaze twice.
+    """
+    results = {}
+    gaze_result = None
+    if 'verify' in analyses:
+        results['verify'] = verify_frame(frame, identify, tracker, track, student_name)
+        gaze_result = results['verify']['analysis'].get('gaze_analysis')
+    if 'attention' in analyses:
+        results['attention'] = analyze_attention_frame(frame, gaze_result)
+    return results
@@ -0,0 +1,190 @@
+"""Content-addressed storage for violation evidence images.
+
+Each JPEG is written once under ``<root>/ab/cd/<sha256>.jpg`` and the
+violation row keeps only the hash. Identical frames (a frozen webcam, the
+same empty desk) share one file.
+
+``EvidenceEncoder`` decides what gets stored: the uploaded JPEG itself,
+passed along as a memoryview without copying, when it is already small
+enough, otherwise a ``PendingEvidence`` thumbnail that is only decoded,
+resized and encoded when the violation writer thread stores it. Either way
+only the compressed upload waits in the writer queue, and the encoder
+stops handing out evidence once ``max_pending_bytes`` of it is queued.
+"""
+import hashlib
+import os
+import re
+import struct
+import tempfile
+import threading
+import weakref
+
+import cv2
+import numpy as np
+
+_REF = re.compile(r'^[0-9a-f]{64}$')
+
+
+class EvidenceStore:
+    """Write-once JPEG blobs addressed by their SHA-256"""
+
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self.counters = {'stored': 0, 'deduplicated': 0, 'bytes_written': 0}
+
+    @staticmethod
+    def is_ref(ref):
+        return bool(ref) and bool(_REF.match(ref))
+
+    def path_for(self, ref):
+        if not self.is_ref(ref):
+            raise ValueError(f"Invalid evidence reference: {ref!r}")
+        return os.path.join(self.root, ref[:2], ref[2:4], ref + '.jpg')
+
+    def put(self, data):
+        """Store image bytes (or a PendingEvidence) and return their reference"""
+        if isinstance(data, PendingEvidence):
+            data = data.encode()
+            if data is None:
+                return None
+        data = memoryview(data)
+        ref = hashlib.sha256(data).hexdigest()
+        path = self.path_for(ref)
+        if os.path.exists(path):
+            with self._lock:
+                self.counters['deduplicated'] += 1
+            return ref
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial image
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            self.counters['stored'] += 1
+            self.counters['bytes_written'] += data.nbytes
+        return ref
+
+    def exists(self, ref):
+        return self.is_ref(ref) and os.path.exists(self.path_for(ref))
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+# JPEG start-of-frame markers that carry the image size (all but DHT, JPG and DAC)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_size(data):
+    """(width, height) from a JPEG header without decoding it, or None if not a JPEG"""
+    data = memoryview(data)
+    if data[:2] != b'\xff\xd8':
+        return None
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:  # markers without a length
+            pos += 2
+            continue
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        if marker in _SOF_MARKERS and pos + 9 <= len(data):
+            height, width = struct.unpack('>HH', data[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + length
+    return None
+
+
+class PendingEvidence:
+    """An upload to be decoded, shrunk and JPEG-encoded later, off the request thread.
+
+    Only the compressed upload is kept: a decoded frame is ~10x larger and
+    thousands of them can sit in the writer queue.
+    """
+
+    def __init__(self, image_bytes, max_dimension=None, quality=80):
+        self.image_bytes = image_bytes
+        self.max_dimension = max_dimension
+        self.quality = quality
+
+    def encode(self):
+        img = cv2.imdecode(np.frombuffer(self.image_bytes, np.uint8), cv2.IMREAD_COLOR)
+        if img is None:
+            return None
+        height, width = img.shape[:2]
+        if self.max_dimension and max(height, width) > self.max_dimension:
+            scale = self.max_dimension / float(max(height, width))
+            img = cv2.resize(img, (max(int(width * scale), 1), max(int(height * scale), 1)),
+                             interpolation=cv2.INTER_AREA)
+        ok, encoded = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return encoded.tobytes() if ok else None
+
+
+class EvidenceEncoder:
+    """Chooses between storing the upload as-is and a deferred thumbnail.
+
+    ``quality`` follows config.json's ``recording.image_quality`` (0-1).
+    Evidence still referenced (queued for the writer, usually) is counted
+    against ``max_pending_bytes``; past it, violations are recorded without
+    an image until the writer catches up.
+    """
+
+    def __init__(self, max_dimension=None, quality=0.8, enabled=True, max_pending_bytes=None):
+        self.max_dimension = max_dimension
+        self.quality = int(round(quality * 100)) if quality <= 1 else int(quality)
+        self.enabled = enabled
+        self.max_pending_bytes = max_pending_bytes
+        self._lock = threading.Lock()
+        self._pending_bytes = 0
+        self.counters = {'passthrough': 0, 'deferred': 0, 'over_budget': 0}
+
+    @classmethod
+    def from_config(cls, recording):
+        recording = recording or {}
+        max_pending_mb = recording.get('evidence_max_pending_mb')
+        return cls(max_dimension=recording.get('evidence_max_dimension'),
+                   quality=recording.get('image_quality', 0.8),
+                   enabled=recording.get('save_violation_images', True),
+                   max_pending_bytes=max_pending_mb * 1024 * 1024 if max_pending_mb else None)
+
+    def prepare(self, image_bytes):
+        """Evidence for a violation: the uploaded bytes, a PendingEvidence, or None"""
+        if not self.enabled or image_bytes is None:
+            return None
+        size = jpeg_size(image_bytes)
+        passthrough = size is not None and (not self.max_dimension or max(size) <= self.max_dimension)
+        nbytes = len(image_bytes)
+        with self._lock:
+            if self.max_pending_bytes and self._pending_bytes + nbytes > self.max_pending_bytes:
+                self.counters['over_budget'] += 1
+                return None
+            self._pending_bytes += nbytes
+            self.counters['passthrough' if passthrough else 'deferred'] += 1
+        evidence = (memoryview(image_bytes) if passthrough
+                    else PendingEvidence(image_bytes, self.max_dimension, self.quality))
+        # Give the bytes back to the budget once the evidence is stored or discarded
+        weakref.finalize(evidence, self._release, nbytes)
+        return evidence
+
+    def _release(self, nbytes):
+        with self._lock:
+            self._pending_bytes -= nbytes
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, pending_bytes=self._pending_bytes)
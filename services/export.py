@@ -0,0 +1,137 @@
+"""Streaming export of sessions and their violations.
+
+Rows are read from one SQLite cursor ``chunk_size`` at a time and encoded
+as CSV or JSON Lines as they arrive, so an export of a whole exam season
+holds no more than one chunk in memory however many sessions it covers.
+"""
+import csv
+import datetime
+import io
+import json
+import sqlite3
+
+EXPORT_COLUMNS = (
+    'session_id', 'student_name', 'exam_name', 'start_time', 'end_time', 'status',
+    'violation_timestamp', 'violation_type', 'violation_details', 'violation_severity',
+)
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+}
+
+
+class ExportFilters:
+    """Which sessions and violations an export covers.
+
+    ``since``/``until`` bound the session start time; a bare date for
+    ``until`` includes that whole day. Giving ``violation_types`` leaves out
+    sessions without a matching violation.
+    """
+
+    def __init__(self, session_id=None, exam_name=None, since=None, until=None, violation_types=()):
+        self.session_id = session_id
+        self.exam_name = exam_name
+        self.since, _ = self._bound(since, 'since')
+        self.until, self.until_op = self._bound(until, 'until')
+        self.violation_types = tuple(violation_types or ())
+
+    @classmethod
+    def from_args(cls, args):
+        """Build filters from request query arguments; raises ValueError on bad dates"""
+        return cls(exam_name=args.get('exam') or None,
+                   since=args.get('since') or None,
+                   until=args.get('until') or None,
+                   violation_types=[t for t in args.getlist('violation_type') if t])
+
+    @staticmethod
+    def _bound(value, name):
+        """Normalise a date or datetime bound to the stored format, with its comparison"""
+        if not value:
+            return None, None
+        try:
+            if len(value) == 10:
+                day = datetime.date.fromisoformat(value)
+                if name == 'until':
+                    # Whole-day bound: everything before the next day
+                    return str(day + datetime.timedelta(days=1)), '<'
+                return str(day), '>='
+            # Stored timestamps use str(datetime), with a space separator
+            return str(datetime.datetime.fromisoformat(value)), '<=' if name == 'until' else '>='
+        except ValueError:
+            raise ValueError(f"Invalid {name} date: {value!r}")
+
+    def query(self):
+        """SQL and parameters selecting the export rows in a stable order"""
+        join = 'JOIN' if self.violation_types else 'LEFT JOIN'
+        on = 's.session_id = v.session_id'
+        where, params = [], []
+        if self.violation_types:
+            on += f" AND v.violation_type IN ({', '.join('?' * len(self.violation_types))})"
+            params.extend(self.violation_types)
+        if self.session_id:
+            where.append('s.session_id = ?')
+            params.append(self.session_id)
+        if self.exam_name:
+            where.append('s.exam_name = ?')
+            params.append(self.exam_name)
+        if self.since:
+            where.append('s.start_time >= ?')
+            params.append(self.since)
+        if self.until:
+            where.append(f's.start_time {self.until_op} ?')
+            params.append(self.until)
+
+        sql = f'''
+            SELECT s.session_id, s.student_name, s.exam_name, s.start_time, s.end_time, s.status,
+                   v.timestamp, v.violation_type, v.details, v.severity
+            FROM sessions s
+            {join} violations v ON {on}
+        '''
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY s.start_time, s.id, v.timestamp, v.id'
+        return sql, params
+
+
+def iter_export_rows(database_path, filters, chunk_size=1000):
+    """Yield lists of at most ``chunk_size`` rows straight off the cursor"""
+    conn = sqlite3.connect(database_path)
+    try:
+        cursor = conn.execute(*filters.query())
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield rows
+    finally:
+        conn.close()
+
+
+def stream_csv(chunks):
+    """Encode row chunks as CSV text, header first"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_jsonl(chunks):
+    """Encode row chunks as one JSON object per line"""
+    for rows in chunks:
+        yield ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, row)), separators=(',', ':')) + '\n'
+                      for row in rows)
+
+
+def stream_export(database_path, filters, export_format, chunk_size=1000):
+    """Text chunks of the export in ``export_format`` ('csv' or 'jsonl')"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported format: {export_format}")
+    encode = stream_csv if export_format == 'csv' else stream_jsonl
+    return encode(iter_export_rows(database_path, filters, chunk_size))
@@ -0,0 +1,116 @@
+"""Per-session motion gate in front of frame analysis.
+
+Most exam frames are nearly identical to the one before. Each upload is
+decoded at 1/8 scale straight from the JPEG (cheap compared to a full
+decode) and shrunk to a small grayscale thumbnail. When the thumbnail is
+close enough to the one of the last *analysed* frame for the same session
+and endpoint, that frame's result is returned again instead of running
+detection. Comparing against the last analysed frame, not the last upload,
+means slow drift still triggers a fresh analysis eventually, and
+``max_consecutive_skips``/``max_age_seconds`` bound how long a result is
+reused either way.
+"""
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+class _GateEntry:
+    """Reference thumbnail and result for one (session, endpoint)"""
+
+    def __init__(self, thumbnail, result):
+        self.thumbnail = thumbnail
+        self.result = result
+        self.analysed_at = time.monotonic()
+        self.skips = 0
+
+
+class FrameGate:
+    """Skip analysis of frames that barely differ from the previous analysed one.
+
+    A frame counts as unchanged when the mean absolute thumbnail difference
+    is at most ``max_mean_diff`` (0-255 gray levels) and no more than
+    ``max_changed_fraction`` of thumbnail pixels moved by over
+    ``pixel_threshold``; the second test catches a small object entering
+    an otherwise still scene.
+    """
+
+    def __init__(self, thumbnail_size=32, pixel_threshold=12, max_mean_diff=3.0,
+                 max_changed_fraction=0.02, max_consecutive_skips=5, max_age_seconds=10,
+                 session_ttl_seconds=900):
+        self.thumbnail_size = thumbnail_size
+        self.pixel_threshold = pixel_threshold
+        self.max_mean_diff = max_mean_diff
+        self.max_changed_fraction = max_changed_fraction
+        self.max_consecutive_skips = max_consecutive_skips
+        self.max_age_seconds = max_age_seconds
+        self.session_ttl_seconds = session_ttl_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._next_purge = time.monotonic() + session_ttl_seconds
+        self.counters = {'checked': 0, 'skipped': 0, 'analysed': 0, 'undecodable': 0}
+
+    @classmethod
+    def from_config(cls, options):
+        options = dict(options or {})
+        options.pop('enabled', None)
+        return cls(**options)
+
+    def thumbnail(self, image_bytes):
+        """Small grayscale thumbnail decoded at reduced size, or None if undecodable"""
+        small = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if small is None:
+            with self._lock:
+                self.counters['undecodable'] += 1
+            return None
+        size = (self.thumbnail_size, self.thumbnail_size)
+        return cv2.resize(small, size, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+    def lookup(self, key, thumbnail):
+        """Cached result for ``key`` if ``thumbnail`` shows no meaningful change"""
+        now = time.monotonic()
+        with self._lock:
+            self.counters['checked'] += 1
+            if now >= self._next_purge:
+                self._purge(now)
+            entry = self._entries.get(key)
+            if (thumbnail is None or entry is None
+                    or entry.skips >= self.max_consecutive_skips
+                    or now - entry.analysed_at >= self.max_age_seconds):
+                return None
+            diff = np.abs(thumbnail - entry.thumbnail)
+            if (diff.mean() > self.max_mean_diff
+                    or np.count_nonzero(diff > self.pixel_threshold) > self.max_changed_fraction * diff.size):
+                return None
+            entry.skips += 1
+            self.counters['skipped'] += 1
+            return entry.result
+
+    def store(self, key, thumbnail, result):
+        """Remember an analysed frame as the new reference for ``key``"""
+        with self._lock:
+            self.counters['analysed'] += 1
+            if thumbnail is not None:
+                self._entries[key] = _GateEntry(thumbnail, result)
+
+    def drop(self, session_id):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == session_id]:
+                del self._entries[key]
+
+    def _purge(self, now):
+        expired = [key for key, entry in self._entries.items()
+                   if now - entry.analysed_at > self.session_ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        self._next_purge = now + self.session_ttl_seconds
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+            sessions = len({key[0] for key in self._entries})
+        checked = counters['checked']
+        return dict(counters, sessions=sessions,
+                    skip_rate=round(counters['skipped'] / checked, 3) if checked else 0)
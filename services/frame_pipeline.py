@@ -0,0 +1,198 @@
+"""Shared per-frame analysis: derived images are computed once per request.
+
+A ``FrameContext`` wraps one decoded BGR frame. Derived artifacts (gray,
+RGB, face locations, a downscaled pyramid, ...) are produced on first access
+and cached, so analyzers that need the same view of the frame share it.
+A ``FramePipeline`` runs named stages that declare which artifacts they read.
+"""
+import collections
+
+import cv2
+import dlib
+import face_recognition
+import numpy as np
+from face_recognition import api as face_api
+
+from services.metrics import stage_metrics
+
+Stage = collections.namedtuple('Stage', ['name', 'fn', 'requires'])
+
+# Smallest face (pixels) dlib's HOG detector finds with its default single upsample
+HOG_MIN_FACE_SIZE = 40
+MIN_DETECTION_SCALE = 0.25
+
+
+class FrameContext:
+    """One decoded frame plus lazily computed, cached artifacts"""
+
+    producers = {}
+
+    def __init__(self, img, **options):
+        self.options = options
+        self._artifacts = {'bgr': img}
+
+    @classmethod
+    def artifact(cls, name, requires=()):
+        """Register a producer: ``fn(frame, *required_artifacts)``"""
+        def decorator(fn):
+            cls.producers[name] = (fn, tuple(requires))
+            return fn
+        return decorator
+
+    def __getattr__(self, name):
+        # Only reached when normal attribute lookup fails
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self.get(name)
+
+    def get(self, name):
+        if name in self._artifacts:
+            return self._artifacts[name]
+        if name not in self.producers:
+            raise AttributeError(f"Unknown frame artifact: {name}")
+        producer, requires = self.producers[name]
+        value = producer(self, *[self.get(required) for required in requires])
+        self._artifacts[name] = value
+        return value
+
+    def provide(self, name, value):
+        """Store an artifact computed elsewhere so stages reuse it"""
+        self._artifacts[name] = value
+
+    def has(self, name):
+        return name in self._artifacts
+
+    def computed(self):
+        return list(self._artifacts)
+
+
+@stage_metrics.timed('decode')
+def decode_frame(image_bytes):
+    """Decode an uploaded JPEG/PNG to a BGR image, or None if it isn't one"""
+    return cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+
+
+def as_frame(img_or_frame):
+    """Accept either a BGR image or an existing FrameContext"""
+    if isinstance(img_or_frame, FrameContext):
+        return img_or_frame
+    return FrameContext(img_or_frame)
+
+
+@FrameContext.artifact('gray', requires=('bgr',))
+def _gray(frame, bgr):
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+
+
+@FrameContext.artifact('rgb', requires=('bgr',))
+def _rgb(frame, bgr):
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+
+@FrameContext.artifact('detection_rgb', requires=('rgb',))
+def _detection_rgb(frame, rgb):
+    """RGB frame downscaled by the ``detection_scale`` option"""
+    scale = frame.options.get('detection_scale', 1.0)
+    if scale >= 1.0:
+        return rgb
+    return cv2.resize(rgb, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+@FrameContext.artifact('face_locations', requires=('rgb', 'detection_rgb'))
+def _face_locations(frame, rgb, detection_rgb):
+    """Detect on the downscaled frame, report boxes in full-resolution pixels"""
+    with stage_metrics.timer('detection'):
+        locations = face_recognition.face_locations(detection_rgb)
+    if detection_rgb is rgb:
+        return locations
+    return scale_locations(locations, rgb.shape[1] / detection_rgb.shape[1], rgb.shape)
+
+
+@FrameContext.artifact('face_encodings', requires=('rgb', 'face_locations'))
+def _face_encodings(frame, rgb, face_locations):
+    with stage_metrics.timer('encoding'):
+        return face_recognition.face_encodings(rgb, face_locations)
+
+
+def batch_face_encodings(faces):
+    """Encodings for ``(rgb, location)`` faces from any number of frames, in one network pass.
+
+    ``face_recognition.face_encodings`` runs dlib's network once per face;
+    its batch overload takes every image with its faces at once. Faces of
+    the same frame are grouped so each image is passed once. Landmarks are
+    the 5-point model, as in ``face_encodings``, so the results are identical.
+    """
+    images, shapes, slots, groups = [], [], [], {}
+    for rgb, location in faces:
+        group = groups.get(id(rgb))
+        if group is None:
+            group = groups[id(rgb)] = len(images)
+            images.append(rgb)
+            shapes.append(dlib.full_object_detections())
+        slots.append((group, len(shapes[group])))
+        shapes[group].append(face_api.pose_predictor_5_point(rgb, face_api._css_to_rect(location)))
+    descriptors = face_api.face_encoder.compute_face_descriptor(images, shapes, 1)
+    return [np.array(descriptors[group][i]) for group, i in slots]
+
+
+@FrameContext.artifact('pyramid', requires=('gray',))
+def _pyramid(frame, gray, min_width=160):
+    """Gray image halved repeatedly down to ``min_width``"""
+    levels = [gray]
+    while levels[-1].shape[1] // 2 >= min_width:
+        levels.append(cv2.pyrDown(levels[-1]))
+    return levels
+
+
+def detection_scale_for(min_face_size):
+    """Smallest detection scale that still finds faces of ``min_face_size`` pixels"""
+    if not min_face_size:
+        return 1.0
+    return min(1.0, max(MIN_DETECTION_SCALE, HOG_MIN_FACE_SIZE / float(min_face_size)))
+
+
+def scale_locations(face_locations, factor, shape):
+    """Rescale (top, right, bottom, left) boxes and clip them to an image shape"""
+    height, width = shape[:2]
+    scaled = []
+    for top, right, bottom, left in face_locations:
+        scaled.append((
+            max(int(round(top * factor)), 0),
+            min(int(round(right * factor)), width),
+            min(int(round(bottom * factor)), height),
+            max(int(round(left * factor)), 0),
+        ))
+    return scaled
+
+
+def locations_to_boxes(face_locations):
+    """face_recognition (top, right, bottom, left) to OpenCV (x, y, w, h)"""
+    return np.array([(left, top, right - left, bottom - top)
+                     for top, right, bottom, left in face_locations], dtype=np.int32).reshape(-1, 4)
+
+
+class FramePipeline:
+    """Named analysis stages run against a shared FrameContext"""
+
+    def __init__(self):
+        self.stages = collections.OrderedDict()
+
+    def add(self, name, fn, requires=()):
+        self.stages[name] = Stage(name, fn, tuple(requires))
+
+    def requirements(self, names):
+        """Artifacts needed by a set of stages, in first-use order"""
+        required = []
+        for name in names:
+            for artifact in self.stages[name].requires:
+                if artifact not in required:
+                    required.append(artifact)
+        return required
+
+    def run(self, frame, names=None):
+        """Run stages (all by default) and return ``{stage name: result}``"""
+        frame = as_frame(frame)
+        names = list(self.stages) if names is None else list(names)
+        for artifact in self.requirements(names):
+            frame.get(artifact)
+        return {name: self.stages[name].fn(frame) for name in names}
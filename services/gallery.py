@@ -0,0 +1,290 @@
+"""Known-face gallery backed by one contiguous float32 encoding matrix.
+
+The matrix is cached on disk (``encodings.npy`` plus an ``index.json``
+manifest recording each image's size, mtime and SHA-1), so a restart only
+re-encodes images that are new or have changed since the last run.
+"""
+import collections
+import hashlib
+import json
+import os
+import threading
+
+import face_recognition
+import numpy as np
+
+ENCODING_DIM = 128
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+CACHE_FORMAT_VERSION = 1
+
+GallerySnapshot = collections.namedtuple(
+    'GallerySnapshot', ['encodings', 'names', 'version', 'generation'])
+
+
+def encode_image_file(path):
+    """Return the first face encoding found in an image file, or None"""
+    img = face_recognition.load_image_file(path)
+    encodings = face_recognition.face_encodings(img)
+    return encodings[0] if encodings else None
+
+
+def file_digest(path):
+    """SHA-1 of a file's contents, read in chunks"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FaceGallery:
+    """Face encodings in a float32 matrix with incremental add/remove.
+
+    Rows are appended into spare capacity, so a snapshot taken by a reader
+    stays valid while new faces are enrolled. Replacing a row copies the
+    matrix first if a snapshot still shares it, so readers never see a new
+    vector next to norms computed from the old one. Replacing or removing
+    rows bumps ``generation`` so indexes built on top know to reassign rows.
+    """
+
+    def __init__(self, cache_dir=None, encoder=encode_image_file, initial_capacity=64):
+        self.cache_dir = cache_dir
+        self._encoder = encoder
+        self._lock = threading.RLock()
+        self._matrix = np.zeros((initial_capacity, ENCODING_DIM), dtype=np.float32)
+        self._count = 0
+        self._entries = []  # manifest entry per row: key, name, size, mtime, sha1
+        self._rows = {}  # image key -> row index
+        self._misses = {}  # images without a detectable face, so they aren't retried
+        self._snapshot = None
+        self._shared = False  # a snapshot holds a view of self._matrix
+        self.version = 0
+        self.generation = 0
+
+        if cache_dir:
+            self.load()
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, key):
+        return key in self._rows
+
+    def snapshot(self):
+        """Consistent (encodings, names) view for matching"""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self.version:
+            return snapshot
+        with self._lock:
+            snapshot = GallerySnapshot(
+                encodings=self._matrix[:self._count],
+                names=tuple(entry['name'] for entry in self._entries),
+                version=self.version,
+                generation=self.generation,
+            )
+            self._snapshot = snapshot
+            self._shared = True
+            return snapshot
+
+    def keys_for(self, name):
+        """Image keys enrolled under a student name"""
+        with self._lock:
+            return [entry['key'] for entry in self._entries if entry['name'] == name]
+
+    # Mutation
+
+    def add_encoding(self, key, name, encoding, **meta):
+        """Insert or replace the encoding stored for an image key"""
+        encoding = np.asarray(encoding, dtype=np.float32).reshape(ENCODING_DIM)
+        entry = dict(meta, key=key, name=name)
+        with self._lock:
+            self._misses.pop(key, None)
+            row = self._rows.get(key)
+            if row is None:
+                if self._count == len(self._matrix):
+                    self._grow()
+                row = self._count
+                self._count += 1
+                self._rows[key] = row
+                self._entries.append(entry)
+            else:
+                if self._shared:
+                    # Copy on write: published snapshots keep the old buffer
+                    self._matrix = self._matrix.copy()
+                    self._shared = False
+                self._entries[row] = entry
+                self.generation += 1
+            self._matrix[row] = encoding
+            self.version += 1
+
+    def remove(self, *keys):
+        """Drop image keys from the gallery, compacting the matrix once"""
+        with self._lock:
+            for key in keys:
+                self._misses.pop(key, None)
+            drop = sorted(self._rows[key] for key in keys if key in self._rows)
+            if not drop:
+                return 0
+            keep = np.setdiff1d(np.arange(self._count), drop)
+            capacity = max(len(self._matrix), 1)
+            matrix = np.zeros((capacity, ENCODING_DIM), dtype=np.float32)
+            matrix[:len(keep)] = self._matrix[keep]
+            self._matrix = matrix
+            self._shared = False
+            self._entries = [self._entries[i] for i in keep]
+            self._rows = {entry['key']: i for i, entry in enumerate(self._entries)}
+            self._count = len(keep)
+            self.version += 1
+            self.generation += 1
+            return len(drop)
+
+    def remove_name(self, name):
+        """Drop every image enrolled under a student name"""
+        keys = self.keys_for(name)
+        removed = self.remove(*keys)
+        if removed:
+            self.save()
+        return keys
+
+    def add_image(self, path, key=None):
+        """Encode a single image and add it without touching the rest"""
+        key = key or os.path.basename(path)
+        if self._index_file(path, key) in ('encoded', 'no_face', 'touched'):
+            self.save()
+        return key in self._rows
+
+    def sync(self, directory):
+        """Bring the gallery in line with the images in a directory.
+
+        Unchanged images (same size and mtime, or same content hash) reuse
+        their cached encoding; only new or modified images are encoded.
+        """
+        summary = {'encoded': 0, 'reused': 0, 'removed': 0, 'no_face': 0, 'errors': 0}
+        seen = set()
+        changed = False
+
+        for filename in sorted(os.listdir(directory)):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            seen.add(filename)
+            result = self._index_file(os.path.join(directory, filename), filename)
+            if result == 'encoded':
+                summary['encoded'] += 1
+            elif result == 'no_face':
+                summary['no_face'] += 1
+            elif result == 'error':
+                summary['errors'] += 1
+            else:
+                summary['reused'] += 1
+            changed = changed or result in ('encoded', 'no_face', 'touched')
+
+        with self._lock:
+            stale = [key for key in list(self._rows) + list(self._misses) if key not in seen]
+        if stale:
+            summary['removed'] = self.remove(*stale)
+            changed = True
+
+        if changed:
+            self.save()
+        return summary
+
+    def _index_file(self, path, key):
+        """Encode one image if it changed; returns what happened, or None if unchanged"""
+        try:
+            stat = os.stat(path)
+            meta = {'size': stat.st_size, 'mtime': stat.st_mtime}
+            with self._lock:
+                row = self._rows.get(key)
+                known = self._entries[row] if row is not None else self._misses.get(key)
+            if known and known['size'] == meta['size'] and known['mtime'] == meta['mtime']:
+                return None
+
+            meta['sha1'] = file_digest(path)
+            if known and known.get('sha1') == meta['sha1']:
+                # Touched but not modified: refresh the stat fields only
+                with self._lock:
+                    known.update(meta)
+                return 'touched'
+
+            encoding = self._encoder(path)
+        except Exception as e:
+            print(f"Error processing {key}: {e}")
+            return 'error'
+
+        if encoding is None:
+            print(f"No face found in {key}")
+            self.remove(key)
+            with self._lock:
+                self._misses[key] = meta
+            return 'no_face'
+
+        self.add_encoding(key, os.path.splitext(key)[0], encoding, **meta)
+        return 'encoded'
+
+    def _grow(self):
+        matrix = np.zeros((len(self._matrix) * 2, ENCODING_DIM), dtype=np.float32)
+        matrix[:self._count] = self._matrix[:self._count]
+        # Existing snapshots keep a reference to the old buffer
+        self._matrix = matrix
+        self._shared = False
+
+    # Persistence
+
+    def _cache_paths(self):
+        return (os.path.join(self.cache_dir, 'encodings.npy'),
+                os.path.join(self.cache_dir, 'index.json'))
+
+    def save(self):
+        """Write the encoding matrix and manifest atomically"""
+        if not self.cache_dir:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        matrix_path, index_path = self._cache_paths()
+        with self._lock:
+            matrix = self._matrix[:self._count].copy()
+            manifest = {
+                'format': CACHE_FORMAT_VERSION,
+                'dim': ENCODING_DIM,
+                'count': self._count,
+                'entries': [dict(entry) for entry in self._entries],
+                'misses': dict(self._misses),
+            }
+
+        with open(matrix_path + '.tmp', 'wb') as f:
+            np.save(f, matrix)
+        with open(index_path + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.replace(matrix_path + '.tmp', matrix_path)
+        os.replace(index_path + '.tmp', index_path)
+
+    def load(self):
+        """Restore the cached matrix; a missing or inconsistent cache is ignored"""
+        matrix_path, index_path = self._cache_paths()
+        try:
+            with open(index_path, 'r') as f:
+                manifest = json.load(f)
+            cached = np.load(matrix_path, mmap_mode='r')
+        except (FileNotFoundError, ValueError, OSError):
+            return False
+
+        count = manifest.get('count', -1)
+        if (manifest.get('format') != CACHE_FORMAT_VERSION
+                or cached.shape != (count, ENCODING_DIM)
+                or len(manifest.get('entries', [])) != count):
+            print("Face gallery cache is stale, re-encoding")
+            return False
+
+        with self._lock:
+            capacity = max(len(self._matrix), 1)
+            while capacity < count:
+                capacity *= 2
+            self._matrix = np.zeros((capacity, ENCODING_DIM), dtype=np.float32)
+            self._matrix[:count] = cached
+            self._shared = False
+            self._count = count
+            self._entries = manifest['entries']
+            self._rows = {entry['key']: i for i, entry in enumerate(self._entries)}
+            self._misses = manifest.get('misses', {})
+            self.version += 1
+            self.generation += 1
+        return True
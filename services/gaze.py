@@ -0,0 +1,137 @@
+"""Gaze and attention scoring from 68-point face landmarks.
+
+Landmarks come from ``face_recognition.face_landmarks`` on the face boxes
+the frame already has, so no extra detector runs. Head pose and eye
+openness are computed for every face at once as array operations and
+normalised by the distance between the eyes, which makes the score
+independent of image resolution and of how close the student sits.
+
+Per face, with ``iod`` the inter-ocular distance:
+
+* yaw: horizontal offset of the nose tip from the midpoint of the eyes / iod
+* pitch: nose tip's position between the eye line and the chin, relative to
+  ``pitch_neutral``
+* roll: angle of the eye line
+* eye aspect ratio (EAR): eyelid opening over eye width, averaged over both eyes
+
+The score is 100 times the product of an eyes-open factor and quadratic
+yaw and pitch falloffs, so small head movements cost little and looking
+well away drives it to zero.
+"""
+import face_recognition
+import numpy as np
+
+from services.frame_pipeline import FrameContext
+
+DEFAULT_SETTINGS = {
+    'ear_closed': 0.15,
+    'ear_open': 0.25,
+    'max_yaw': 0.35,
+    'pitch_neutral': 0.4,
+    'max_pitch': 0.15,
+    'focused_score': 70,
+    'partial_score': 40,
+}
+
+NOSE_TIP = 2  # middle point of face_recognition's five nose_tip landmarks
+CHIN = 8  # lowest point of the 17 chin landmarks
+
+
+@FrameContext.artifact('face_landmarks', requires=('rgb', 'face_locations'))
+def _face_landmarks(frame, rgb, face_locations):
+    """68-point landmarks for the faces already located in this frame"""
+    if not face_locations:
+        return []
+    return face_recognition.face_landmarks(rgb, face_locations, model='large')
+
+
+def landmark_arrays(landmarks):
+    """Eyes (n, 2, 6, 2), nose tips (n, 2) and chins (n, 2) as float32 arrays"""
+    eyes = np.array([[face['left_eye'], face['right_eye']] for face in landmarks], dtype=np.float32)
+    nose = np.array([face['nose_tip'][NOSE_TIP] for face in landmarks], dtype=np.float32)
+    chin = np.array([face['chin'][CHIN] for face in landmarks], dtype=np.float32)
+    return eyes, nose, chin
+
+
+def gaze_features(eyes, nose, chin):
+    """Head pose and eye aspect ratio for all faces, as a dict of (n,) arrays"""
+    centers = eyes.mean(axis=2)  # (n, 2, 2)
+    eye_vector = centers[:, 1] - centers[:, 0]
+    iod = np.maximum(np.linalg.norm(eye_vector, axis=1), 1e-6)
+    midpoint = centers.mean(axis=1)
+
+    # EAR = (|p1 - p5| + |p2 - p4|) / (2 |p0 - p3|), for both eyes of every face
+    vertical = (np.linalg.norm(eyes[:, :, 1] - eyes[:, :, 5], axis=2)
+                + np.linalg.norm(eyes[:, :, 2] - eyes[:, :, 4], axis=2))
+    horizontal = np.maximum(np.linalg.norm(eyes[:, :, 0] - eyes[:, :, 3], axis=2), 1e-6)
+    ear = (vertical / (2 * horizontal)).mean(axis=1)
+
+    # Express the nose tip in the face's own frame so roll doesn't read as yaw
+    roll = np.arctan2(eye_vector[:, 1], eye_vector[:, 0])
+    cos, sin = np.cos(roll), np.sin(roll)
+    offset = nose - midpoint
+    along = offset[:, 0] * cos + offset[:, 1] * sin
+    down = offset[:, 1] * cos - offset[:, 0] * sin
+    chin_offset = chin - midpoint
+    chin_down = np.maximum(chin_offset[:, 1] * cos - chin_offset[:, 0] * sin, 1e-6)
+
+    return {
+        'iod': iod,
+        'ear': ear,
+        'yaw': along / iod,
+        'pitch': down / chin_down,
+        'roll': np.degrees(roll),
+    }
+
+
+def gaze_scores(features, settings=None):
+    """Continuous 0-100 attention score per face"""
+    settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+    eyes_open = np.clip((features['ear'] - settings['ear_closed'])
+                        / (settings['ear_open'] - settings['ear_closed']), 0.0, 1.0)
+    yaw = np.clip(1.0 - (features['yaw'] / settings['max_yaw']) ** 2, 0.0, 1.0)
+    pitch = np.clip(1.0 - ((features['pitch'] - settings['pitch_neutral']) / settings['max_pitch']) ** 2, 0.0, 1.0)
+    return 100.0 * eyes_open * yaw * pitch
+
+
+def analyze_landmark_gaze(landmarks, settings=None):
+    """Gaze payload with the same status contract as ``analyze_gaze_direction``.
+
+    The largest face (by eye distance) is taken to be the student's and
+    decides the status; every face's score is reported.
+    """
+    if not landmarks:
+        return {"status": "no_face", "details": "No face detected for gaze analysis"}
+    settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+
+    features = gaze_features(*landmark_arrays(landmarks))
+    scores = gaze_scores(features, settings)
+    primary = int(np.argmax(features['iod']))
+    score = round(float(scores[primary]), 1)
+    yaw, pitch = float(features['yaw'][primary]), float(features['pitch'][primary]) - settings['pitch_neutral']
+
+    details = []
+    if features['ear'][primary] <= settings['ear_closed']:
+        details.append("Eyes closed")
+    if abs(yaw) > settings['max_yaw'] / 2:
+        details.append("Head turned away")
+    if abs(pitch) > settings['max_pitch'] / 2:
+        details.append("Head tilted")
+    if not details:
+        details.append("Facing the screen")
+
+    if score >= settings['focused_score']:
+        status = "focused"
+    elif score >= settings['partial_score']:
+        status = "partially_focused"
+    else:
+        status = "distracted"
+    return {
+        "status": status,
+        "score": score,
+        "details": details,
+        "head_pose": {"yaw": round(yaw, 3), "pitch": round(pitch, 3),
+                      "roll": round(float(features['roll'][primary]), 1)},
+        "eye_aspect_ratio": round(float(features['ear'][primary]), 3),
+        "face_scores": [round(float(value), 1) for value in scores],
+    }
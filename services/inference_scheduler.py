@@ -0,0 +1,135 @@
+"""Micro-batching of inference work submitted by concurrent requests.
+
+Request threads hand items to a ``MicroBatcher`` and block on a future. A
+single background thread collects items until the batch is full or the
+oldest item has waited ``max_wait_ms``, runs the batch function once and
+hands each caller its own result.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """Run ``process_batch(items) -> results`` over small batches of items"""
+
+    def __init__(self, process_batch, max_batch_size=16, max_wait_ms=4, timeout_seconds=10,
+                 name='inference'):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.timeout = timeout_seconds
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'batches': 0,
+            'items': 0,
+            'errors': 0,
+            'largest_batch': 0,
+            'wait_ms_total': 0.0,
+            'process_ms_total': 0.0,
+        }
+
+    @classmethod
+    def from_config(cls, process_batch, options, name='inference'):
+        options = dict(options or {})
+        options.pop('enabled', None)
+        return cls(process_batch, name=name, **options)
+
+    def submit(self, item):
+        """Queue an item and return a Future for its result"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def run(self, item, timeout=None):
+        """Submit an item and wait for its result (``timeout_seconds`` by default)"""
+        return self.submit(item).result(self.timeout if timeout is None else timeout)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name=f'{self.name}-batcher', daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        """Block for one item, then gather more until full or the deadline passes"""
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = first[2] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(entry)
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            wait_ms = sum(started - queued for _, _, queued in batch) * 1000
+            try:
+                results = self.process_batch([item for item, _, _ in batch])
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+                errors = 0
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                errors = 1
+            process_ms = (time.perf_counter() - started) * 1000
+
+            with self._stats_lock:
+                stats = self._stats
+                stats['batches'] += 1
+                stats['items'] += len(batch)
+                stats['errors'] += errors
+                stats['largest_batch'] = max(stats['largest_batch'], len(batch))
+                stats['wait_ms_total'] += wait_ms
+                stats['process_ms_total'] += process_ms
+
+    def close(self):
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        batches, items = stats['batches'], stats['items']
+        return {
+            'queue_depth': self._queue.qsize(),
+            'batches': batches,
+            'items': items,
+            'errors': stats['errors'],
+            'largest_batch': stats['largest_batch'],
+            'max_batch_size': self.max_batch_size,
+            'mean_batch_size': round(items / batches, 2) if batches else 0,
+            'batch_fill': round(items / (batches * self.max_batch_size), 3) if batches else 0,
+            'mean_wait_ms': round(stats['wait_ms_total'] / items, 2) if items else 0,
+            'mean_batch_ms': round(stats['process_ms_total'] / batches, 2) if batches else 0,
+        }
@@ -0,0 +1,281 @@
+"""Gallery matchers for 1:N identification and 1:1 verification.
+
+``ExactMatcher`` scores every gallery row with one BLAS product using
+||a - b||^2 = ||a||^2 + ||b||^2 - 2ab. ``IVFMatcher`` partitions the gallery
+with k-means and only scans the ``nprobe`` closest partitions, trading a
+little recall for latency on large galleries. Training the partitions takes
+seconds on large galleries, so it runs on a background thread and searches
+stay exact until the index covers the current gallery.
+"""
+import collections
+import threading
+
+import numpy as np
+
+Match = collections.namedtuple('Match', ['name', 'distance', 'index'])
+
+
+class ExactMatcher:
+    """Brute-force nearest neighbour over the whole gallery"""
+
+    backend = 'exact'
+
+    def __init__(self, gallery):
+        self.gallery = gallery
+        self._lock = threading.Lock()
+        self._state = None
+
+    def warm_up(self, wait=False):
+        """Build the search state now rather than on the first request.
+
+        ``wait`` also blocks until any background index is ready.
+        """
+        self._prepare()
+        return self.stats()
+
+    def _prepare(self):
+        snapshot = self.gallery.snapshot()
+        state = self._state
+        if state is not None and state['version'] == snapshot.version:
+            return state
+        with self._lock:
+            state = self._state
+            if state is None or state['version'] != snapshot.version:
+                state = self._build(snapshot, state)
+                self._state = state
+            return state
+
+    def _build(self, snapshot, previous):
+        encodings = snapshot.encodings
+        rows_by_name = collections.defaultdict(list)
+        for row, name in enumerate(snapshot.names):
+            rows_by_name[name].append(row)
+        return {
+            'version': snapshot.version,
+            'generation': snapshot.generation,
+            'encodings': encodings,
+            'sq_norms': np.einsum('ij,ij->i', encodings, encodings),
+            'names': snapshot.names,
+            'rows_by_name': {name: np.array(rows) for name, rows in rows_by_name.items()},
+        }
+
+    @staticmethod
+    def _queries(encodings):
+        return np.atleast_2d(np.asarray(encodings, dtype=np.float32))
+
+    @staticmethod
+    def _nearest(state, queries, rows=None):
+        """Best row per query among ``rows`` (all rows when None)"""
+        encodings = state['encodings'] if rows is None else state['encodings'][rows]
+        sq_norms = state['sq_norms'] if rows is None else state['sq_norms'][rows]
+        sq_dist = sq_norms[None, :] - 2.0 * (queries @ encodings.T)
+        sq_dist += np.einsum('ij,ij->i', queries, queries)[:, None]
+        best = np.argmin(sq_dist, axis=1)
+        distances = np.sqrt(np.maximum(sq_dist[np.arange(len(queries)), best], 0.0))
+        if rows is not None:
+            best = rows[best]
+        return best, distances
+
+    def match(self, encoding):
+        """Closest known face to one encoding, or None for an empty gallery"""
+        results = self.match_batch([encoding])
+        return results[0] if results else None
+
+    def match_batch(self, encodings):
+        """Closest known face for each encoding in a batch"""
+        state = self._prepare()
+        if not len(encodings) or not len(state['names']):
+            return [None] * len(encodings)
+        best, distances = self._search(state, self._queries(encodings))
+        return [Match(state['names'][i], float(d), int(i)) for i, d in zip(best, distances)]
+
+    def _search(self, state, queries):
+        return self._nearest(state, queries)
+
+    def verify(self, name, encoding):
+        """1:1 comparison against the rows enrolled under ``name``"""
+        state = self._prepare()
+        rows = state['rows_by_name'].get(name)
+        if rows is None:
+            return None
+        best, distances = self._nearest(state, self._queries([encoding]), rows)
+        return Match(name, float(distances[0]), int(best[0]))
+
+    def stats(self):
+        state = self._state or {}
+        return {'backend': self.backend, 'gallery_size': len(state.get('names', ()))}
+
+
+class IVFMatcher(ExactMatcher):
+    """Inverted-file approximate search over k-means partitions.
+
+    ``nprobe`` is the recall/latency knob: more probed partitions means more
+    candidates scored exactly. Galleries smaller than ``min_size`` are
+    searched exhaustively, as is every gallery version until its index has
+    been built off the request path.
+    """
+
+    backend = 'ivf'
+
+    def __init__(self, gallery, nlist=0, nprobe=8, min_size=2048,
+                 train_iterations=10, train_sample=32, seed=0):
+        super().__init__(gallery)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.min_size = min_size
+        self.train_iterations = train_iterations
+        self.train_sample = train_sample
+        self.seed = seed
+        self._indexed = None  # last state carrying an index, reused for appends
+        self._indexer = None
+
+    def warm_up(self, wait=False):
+        stats = super().warm_up()
+        if wait:
+            self.wait_for_index()
+            stats = self.stats()
+        return stats
+
+    def wait_for_index(self, timeout=None):
+        """Block until the background index build has caught up; False on timeout"""
+        indexer = self._indexer
+        if indexer is not None:
+            indexer.join(timeout)
+            return not indexer.is_alive()
+        return True
+
+    def _build(self, snapshot, previous):
+        # Called under the lock: publish the exact state now and index it later
+        state = super()._build(snapshot, previous)
+        if len(state['names']) >= self.min_size and (self._indexer is None or not self._indexer.is_alive()):
+            self._indexer = threading.Thread(target=self._index_loop, name='ivf-index', daemon=True)
+            self._indexer.start()
+        return state
+
+    def _index_loop(self):
+        while True:
+            with self._lock:
+                state = self._state
+                if state is None or 'centroids' in state or len(state['names']) < self.min_size:
+                    self._indexer = None
+                    return
+                previous = self._indexed
+            indexed = self._index(dict(state), previous)
+            with self._lock:
+                self._indexed = indexed
+                if self._state is state:
+                    self._state = indexed
+
+    def _index(self, state, previous):
+        encodings = state['encodings']
+        count = len(encodings)
+        centroids = None
+        assignments = None
+        if previous is not None and previous.get('centroids') is not None \
+                and count <= 2 * previous['trained_size']:
+            centroids = previous['centroids']
+            if previous['generation'] == snapshot.generation:
+                # Only appends since the last build: assign the new rows
+                known = len(previous['assignments'])
+                assignments = np.concatenate(
+                    [previous['assignments'], self._assign(encodings[known:], centroids)])
+            else:
+                assignments = self._assign(encodings, centroids)
+            state['trained_size'] = previous['trained_size']
+        else:
+            centroids = self._train(encodings)
+            assignments = self._assign(encodings, centroids)
+            state['trained_size'] = count
+
+        order = np.argsort(assignments, kind='stable')
+        offsets = np.searchsorted(assignments[order], np.arange(len(centroids) + 1))
+        state.update({
+            'centroids': centroids,
+            'centroid_sq_norms': np.einsum('ij,ij->i', centroids, centroids),
+            'assignments': assignments,
+            'order': order,
+            'offsets': offsets,
+        })
+        return state
+
+    def _train(self, encodings):
+        """Lloyd's k-means on a sample of the gallery"""
+        rng = np.random.default_rng(self.seed)
+        nlist = self.nlist or int(4 * np.sqrt(len(encodings)))
+        nlist = max(1, min(nlist, len(encodings)))
+        sample_size = min(len(encodings), nlist * self.train_sample)
+        sample = encodings[rng.choice(len(encodings), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+        for _ in range(self.train_iterations):
+            assignments = self._assign(sample, centroids)
+            order = np.argsort(assignments, kind='stable')
+            counts = np.bincount(assignments, minlength=nlist)
+            filled = counts > 0
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[filled]
+            sums = np.add.reduceat(sample[order], starts, axis=0)
+            centroids[filled] = sums / counts[filled, None]
+            # Re-seed empty partitions from random sample points
+            empty = np.flatnonzero(~filled)
+            if len(empty):
+                centroids[empty] = sample[rng.choice(sample_size, len(empty))]
+        return centroids
+
+    @staticmethod
+    def _assign(vectors, centroids, chunk=8192):
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        centroid_norms = np.einsum('ij,ij->i', centroids, centroids)
+        for start in range(0, len(vectors), chunk):
+            block = vectors[start:start + chunk]
+            scores = centroid_norms[None, :] - 2.0 * (block @ centroids.T)
+            assignments[start:start + chunk] = np.argmin(scores, axis=1)
+        return assignments
+
+    def _search(self, state, queries):
+        if state.get('centroids') is None:
+            return self._nearest(state, queries)
+
+        centroids = state['centroids']
+        nprobe = min(self.nprobe, len(centroids))
+        scores = state['centroid_sq_norms'][None, :] - 2.0 * (queries @ centroids.T)
+        probes = np.argpartition(scores, nprobe - 1, axis=1)[:, :nprobe]
+
+        order, offsets = state['order'], state['offsets']
+        best = np.empty(len(queries), dtype=np.int64)
+        distances = np.empty(len(queries), dtype=np.float64)
+        for i, lists in enumerate(probes):
+            rows = np.concatenate([order[offsets[c]:offsets[c + 1]] for c in lists])
+            if not len(rows):
+                rows = np.arange(len(state['names']))
+            row_best, row_dist = self._nearest(state, queries[i:i + 1], rows)
+            best[i], distances[i] = row_best[0], row_dist[0]
+        return best, distances
+
+    def stats(self):
+        stats = super().stats()
+        state = self._state or {}
+        centroids = state.get('centroids')
+        indexer = self._indexer
+        stats.update({
+            'nlist': 0 if centroids is None else len(centroids),
+            'nprobe': self.nprobe,
+            'exhaustive': centroids is None,
+            'indexing': indexer is not None and indexer.is_alive(),
+        })
+        return stats
+
+
+def create_matcher(gallery, options=None):
+    """Build the matcher selected by the ``face_recognition.matcher`` config"""
+    options = dict(options or {})
+    backend = options.pop('backend', 'exact')
+    if backend == 'exact':
+        return ExactMatcher(gallery)
+    if backend == 'ivf':
+        return IVFMatcher(
+            gallery,
+            nlist=options.get('nlist', 0),
+            nprobe=options.get('nprobe', 8),
+            min_size=options.get('ivf_min_gallery_size', 2048),
+        )
+    raise ValueError(f"Unknown matcher backend: {backend}")
@@ -0,0 +1,205 @@
+"""In-process latency histograms for the frame-analysis hot path.
+
+Stages are timed with ``stage_metrics.timer(name)`` and requests with
+``stage_metrics.observe_request``; both feed fixed-bucket histograms that
+``render`` writes in the Prometheus text exposition format. When metrics
+are disabled and nothing is capturing, ``timer`` returns a shared no-op
+context manager, so an instrumented stage costs two attribute checks.
+
+Pool workers can't share histograms with the web process, so a task runs
+inside ``capture()`` and returns the stage timings it collected; the parent
+feeds them back in with ``record``. The same capture gives request handlers
+the per-stage breakdown of a single request.
+"""
+import bisect
+import contextlib
+import functools
+import threading
+import time
+
+# Seconds; the last bucket is +Inf
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative-on-render bucket counts, sum and count for one label"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        cumulative, total = [], 0
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return cumulative, self.sum, self.count
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ('metrics', 'stage', 'started')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class StageMetrics:
+    """Stage and request latency histograms plus per-thread timing capture"""
+
+    def __init__(self, enabled=False, buckets=DEFAULT_BUCKETS, prefix='proctor'):
+        self.enabled = enabled
+        self.buckets = tuple(sorted(buckets))
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._requests = {}
+        self._local = threading.local()
+
+    def configure(self, options):
+        """Apply the ``metrics`` section of config.json"""
+        options = options or {}
+        self.enabled = options.get('enabled', self.enabled)
+        if 'buckets' in options:
+            with self._lock:
+                self.buckets = tuple(sorted(options['buckets']))
+                self._stages, self._requests = {}, {}
+
+    def timer(self, stage):
+        """Context manager timing one stage (a no-op when disabled and not capturing)"""
+        if not self.enabled and getattr(self._local, 'timings', None) is None:
+            return _NULL_TIMER
+        return _Timer(self, stage)
+
+    def timed(self, stage):
+        """Decorator timing every call of a function as ``stage``"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _histogram(self, table, key):
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = Histogram(self.buckets)
+        return histogram
+
+    def observe(self, stage, seconds):
+        if self.enabled:
+            with self._lock:
+                self._histogram(self._stages, stage).observe(seconds)
+        timings = getattr(self._local, 'timings', None)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    def observe_request(self, endpoint, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._histogram(self._requests, endpoint).observe(seconds)
+
+    def record(self, timings):
+        """Observe stage timings collected elsewhere, e.g. returned by a pool worker"""
+        if not timings:
+            return
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds)
+
+    @contextlib.contextmanager
+    def capture(self):
+        """Collect ``{stage: seconds}`` for everything timed on this thread inside the block"""
+        outer = getattr(self._local, 'timings', None)
+        timings = self._local.timings = {}
+        try:
+            yield timings
+        finally:
+            self._local.timings = outer
+            if outer is not None:
+                for stage, seconds in timings.items():
+                    outer[stage] = outer.get(stage, 0.0) + seconds
+
+    def stats(self):
+        """Count and mean milliseconds per stage"""
+        with self._lock:
+            return {stage: {'count': histogram.count,
+                            'mean_ms': round(histogram.sum / histogram.count * 1000, 3) if histogram.count else 0}
+                    for stage, histogram in self._stages.items()}
+
+    def _render_histograms(self, lines, name, help_text, label, table):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        bounds = [_format(bound) for bound in self.buckets] + ['+Inf']
+        for key, (cumulative, total, count) in sorted(table.items()):
+            key = _escape(key)
+            for bound, value in zip(bounds, cumulative):
+                lines.append(f'{name}_bucket{{{label}="{key}",le="{bound}"}} {value}')
+            lines.append(f'{name}_sum{{{label}="{key}"}} {_format(total)}')
+            lines.append(f'{name}_count{{{label}="{key}"}} {count}')
+
+    def render(self, gauges=()):
+        """Prometheus text format: the histograms, then ``(name, help, value)`` gauges.
+
+        A gauge value may be a number or a ``{(label, value): number}`` dict.
+        """
+        with self._lock:
+            stages = {stage: histogram.snapshot() for stage, histogram in self._stages.items()}
+            requests = {endpoint: histogram.snapshot() for endpoint, histogram in self._requests.items()}
+
+        lines = []
+        self._render_histograms(lines, f'{self.prefix}_stage_duration_seconds',
+                                'Time spent in each frame-analysis stage', 'stage', stages)
+        self._render_histograms(lines, f'{self.prefix}_request_duration_seconds',
+                                'Request latency per endpoint', 'endpoint', requests)
+        for name, help_text, value in gauges:
+            if value is None:
+                continue
+            name = f'{self.prefix}_{name}'
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} gauge')
+            if isinstance(value, dict):
+                for (label, label_value), sample in sorted(value.items()):
+                    lines.append(f'{name}{{{label}="{_escape(label_value)}"}} {_format(sample)}')
+            else:
+                lines.append(f'{name} {_format(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+# Shared by everything in this process; app.py and pool workers configure it from config.json
+stage_metrics = StageMetrics()
@@ -0,0 +1,125 @@
+"""Versioned schema migrations for the proctoring database.
+
+The schema version lives in SQLite's ``PRAGMA user_version``. ``migrate``
+runs every migration above the current version in order and records each
+one as it completes. Migrations are written to be safe to re-run, so an
+interrupted upgrade simply continues on the next start.
+"""
+import base64
+import binascii
+
+MIGRATION_BATCH = 200
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+
+
+def _move_evidence_to_store(conn, evidence_store=None, **context):
+    """1: add violations.evidence_ref and move base64 image_data into the evidence store"""
+    if 'evidence_ref' not in _columns(conn, 'violations'):
+        conn.execute('ALTER TABLE violations ADD COLUMN evidence_ref TEXT')
+    if evidence_store is None:
+        return
+
+    moved = 0
+    last_id = 0
+    while True:
+        rows = conn.execute('''
+            SELECT id, image_data FROM violations
+            WHERE image_data IS NOT NULL AND id > ?
+            ORDER BY id LIMIT ?
+        ''', (last_id, MIGRATION_BATCH)).fetchall()
+        if not rows:
+            break
+        updates = []
+        for violation_id, image_data in rows:
+            try:
+                ref = evidence_store.put(base64.b64decode(image_data))
+            except (binascii.Error, ValueError, TypeError):
+                ref = None
+            updates.append((ref, violation_id))
+        conn.executemany('UPDATE violations SET evidence_ref = ?, image_data = NULL WHERE id = ?', updates)
+        conn.commit()
+        moved += len(updates)
+        last_id = rows[-1][0]
+
+    if moved:
+        print(f"Moved {moved} violation images to the evidence store")
+
+
+def _add_indexes_and_counters(conn, **context):
+    """2: indexes for the dashboard queries and trigger-maintained violation counters"""
+    conn.executescript('''
+        BEGIN;
+        CREATE INDEX IF NOT EXISTS idx_violations_session_time ON violations (session_id, timestamp);
+        CREATE INDEX IF NOT EXISTS idx_violations_type ON violations (violation_type);
+        CREATE INDEX IF NOT EXISTS idx_violations_timestamp ON violations (timestamp);
+        CREATE INDEX IF NOT EXISTS idx_sessions_start ON sessions (start_time, id);
+        CREATE INDEX IF NOT EXISTS idx_sessions_status ON sessions (status);
+
+        CREATE TABLE IF NOT EXISTS session_violation_counts (
+            session_id TEXT PRIMARY KEY,
+            violation_count INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS violation_type_counts (
+            violation_type TEXT PRIMARY KEY,
+            violation_count INTEGER NOT NULL DEFAULT 0
+        );
+
+        CREATE TRIGGER IF NOT EXISTS trg_violations_count_insert AFTER INSERT ON violations
+        BEGIN
+            INSERT INTO session_violation_counts (session_id, violation_count)
+            VALUES (IFNULL(NEW.session_id, 'unknown'), 1)
+            ON CONFLICT (session_id) DO UPDATE SET violation_count = violation_count + 1;
+            INSERT INTO violation_type_counts (violation_type, violation_count)
+            VALUES (IFNULL(NEW.violation_type, 'unknown'), 1)
+            ON CONFLICT (violation_type) DO UPDATE SET violation_count = violation_count + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_violations_count_delete AFTER DELETE ON violations
+        BEGIN
+            UPDATE session_violation_counts SET violation_count = violation_count - 1
+            WHERE session_id = IFNULL(OLD.session_id, 'unknown');
+            UPDATE violation_type_counts SET violation_count = violation_count - 1
+            WHERE violation_type = IFNULL(OLD.violation_type, 'unknown');
+        END;
+
+        DELETE FROM session_violation_counts;
+        INSERT INTO session_violation_counts (session_id, violation_count)
+        SELECT IFNULL(session_id, 'unknown'), COUNT(*) FROM violations GROUP BY 1;
+
+        DELETE FROM violation_type_counts;
+        INSERT INTO violation_type_counts (violation_type, violation_count)
+        SELECT IFNULL(violation_type, 'unknown'), COUNT(*) FROM violations GROUP BY 1;
+        COMMIT;
+    ''')
+
+
+def _add_exam_index(conn, **context):
+    """3: index sessions by exam for bulk exports and exam report jobs"""
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_exam ON sessions (exam_name, start_time, id)')
+
+
+MIGRATIONS = [
+    (1, _move_evidence_to_store),
+    (2, _add_indexes_and_counters),
+    (3, _add_exam_index),
+]
+
+
+def migrate(conn, **context):
+    """Bring the schema up to date; returns the resulting version"""
+    version = schema_version(conn)
+    for target, migration in MIGRATIONS:
+        if target <= version:
+            continue
+        migration(conn, **context)
+        conn.execute(f'PRAGMA user_version = {target}')
+        conn.commit()
+        version = target
+    return version
@@ -0,0 +1,176 @@
+"""Registry of OpenCV detectors that are loaded once and reused.
+
+A ``cv2.CascadeClassifier`` must not run ``detectMultiScale`` from two
+threads at the same time, so each model keeps a pool of instances: a request
+thread checks one out, uses it exclusively and hands it back. This gives the
+thread-confinement OpenCV needs while still surviving Werkzeug's
+thread-per-request model, where plain thread-locals would reload every time.
+"""
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+import cv2
+
+OPENCV_PREFIX = 'opencv:'
+
+DEFAULT_MODELS = {
+    'face_cascade': OPENCV_PREFIX + 'haarcascade_frontalface_default.xml',
+    'eye_cascade': OPENCV_PREFIX + 'haarcascade_eye.xml',
+    'phone_cascade': 'models/phone_cascade.xml',
+}
+
+
+def resolve_model_path(path):
+    """Expand the ``opencv:`` prefix to OpenCV's bundled cascade directory"""
+    if path.startswith(OPENCV_PREFIX):
+        return os.path.join(cv2.data.haarcascades, path[len(OPENCV_PREFIX):])
+    return path
+
+
+def _resident_bytes():
+    """Current RSS from /proc, or None where it isn't available"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class _ModelSlot:
+    def __init__(self, path):
+        self.path = path
+        self.generation = 0
+        self.pool = collections.deque()
+        self.instances = 0
+        self.loads = 0
+        self.load_ms = None
+        self.memory_bytes = None
+        self.file_bytes = None
+        self.available = None
+
+
+class ModelRegistry:
+    """Load each detector once and lend instances to request threads"""
+
+    def __init__(self, models=None, config_path=None, check_interval=5.0):
+        self.config_path = config_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._slots = {}
+        self._config_mtime = None
+        self._next_check = 0.0
+        self.configure(models)
+
+    def configure(self, models=None):
+        """Apply a ``models`` config section; changed paths are reloaded lazily"""
+        paths = dict(DEFAULT_MODELS, **(models or {}))
+        with self._lock:
+            for name, path in paths.items():
+                slot = self._slots.get(name)
+                if slot is None:
+                    self._slots[name] = _ModelSlot(path)
+                elif slot.path != path:
+                    slot.path = path
+                    slot.generation += 1
+                    slot.pool.clear()
+                    slot.instances = 0
+                    slot.available = None
+                    print(f"Model {name} switched to {path}")
+
+    @contextlib.contextmanager
+    def acquire(self, name):
+        """Check out an instance of a model; yields None if it can't be loaded"""
+        self._maybe_reload_config()
+        slot = self._slots[name]
+        with self._lock:
+            generation = slot.generation
+            model = slot.pool.popleft() if slot.pool else None
+        if model is None:
+            model = self._load(name, slot, generation)
+        try:
+            yield model
+        finally:
+            if model is not None:
+                with self._lock:
+                    if slot.generation == generation:
+                        slot.pool.append(model)
+
+    def _load(self, name, slot, generation):
+        path = resolve_model_path(slot.path)
+        if slot.available is False or not os.path.exists(path):
+            slot.available = False
+            return None
+
+        rss_before = _resident_bytes()
+        started = time.perf_counter()
+        model = cv2.CascadeClassifier(path)
+        load_ms = (time.perf_counter() - started) * 1000
+        rss_after = _resident_bytes()
+
+        if model.empty():
+            print(f"Failed to load model {name} from {path}")
+            slot.available = False
+            return None
+
+        with self._lock:
+            if slot.generation != generation:
+                return model
+            slot.available = True
+            slot.instances += 1
+            slot.loads += 1
+            slot.load_ms = round(load_ms, 2)
+            slot.file_bytes = os.path.getsize(path)
+            if rss_before is not None and rss_after is not None:
+                slot.memory_bytes = max(rss_after - rss_before, 0)
+        return model
+
+    def _maybe_reload_config(self):
+        """Pick up ``models`` changes in the config file without a restart"""
+        now = time.monotonic()
+        if not self.config_path or now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+
+        with self._lock:
+            # Re-probe models that were missing, they may have been installed since
+            for slot in self._slots.values():
+                if slot.available is False:
+                    slot.available = None
+
+        try:
+            mtime = os.path.getmtime(self.config_path)
+            if mtime == self._config_mtime:
+                return
+            with open(self.config_path, 'r') as f:
+                models = json.load(f).get('models')
+        except (OSError, ValueError):
+            return
+        self._config_mtime = mtime
+        self.configure(models)
+
+    def warm_up(self):
+        """Load one instance of every model up front and return the stats"""
+        for name in list(self._slots):
+            with self.acquire(name):
+                pass
+        return self.stats()
+
+    def stats(self):
+        with self._lock:
+            return {
+                name: {
+                    'path': slot.path,
+                    'available': slot.available,
+                    'instances': slot.instances,
+                    'idle': len(slot.pool),
+                    'loads': slot.loads,
+                    'load_ms': slot.load_ms,
+                    'file_bytes': slot.file_bytes,
+                    'memory_bytes': slot.memory_bytes,
+                }
+                for name, slot in self._slots.items()
+            }
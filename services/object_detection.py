@@ -0,0 +1,94 @@
+"""Rectangle (book/paper) counting for suspicious object detection.
+
+``count_rectangles`` is the original detector: Canny on the full frame, then
+area, perimeter and polygon approximation for every external contour, one
+contour at a time. ``count_rectangles_fast`` takes the bounding boxes of
+all contours in one set of NumPy reductions and only approximates polygons
+for contours whose bounding box is large enough to hold a qualifying
+rectangle. A contour's area never exceeds its bounding box, so the
+prefilter drops nothing the full test would have kept: on the full frame
+it gives the reference count (face boxes aside, which it can blank out).
+
+Run on a downscaled edge map it is an approximation. Edges merge and
+break differently at lower resolution, and on synthetic cluttered frames
+(benchmarks/object_detection.py) the "more than two rectangles" verdict
+agreed with the reference on only 80-90% of frames at any downscaled level
+(90% at 320 px for 640x480, 80-83% at 640 px for 1280x720 and 1920x1080),
+while running 4-30x faster. ``object_detection.edge_width`` therefore
+defaults to the full frame.
+"""
+import cv2
+import numpy as np
+
+MIN_RECTANGLE_AREA = 5000  # full-resolution pixels
+
+
+def count_rectangles(gray, min_area=MIN_RECTANGLE_AREA):
+    """Reference detector: four-cornered external contours over ``min_area``"""
+    edges = cv2.Canny(gray, 50, 150)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    rectangles = 0
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if area > min_area:  # Filter small objects
+            # Check if the contour is rectangular
+            epsilon = 0.02 * cv2.arcLength(contour, True)
+            approx = cv2.approxPolyDP(contour, epsilon, True)
+            if len(approx) == 4:
+                rectangles += 1
+    return rectangles
+
+
+def contour_bounds(contours):
+    """Bounding boxes of many contours at once as an (n, 4) array of x0, y0, x1, y1"""
+    if not contours:
+        return np.empty((0, 4), dtype=np.int32)
+    lengths = np.fromiter((len(contour) for contour in contours), dtype=np.intp, count=len(contours))
+    offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    points = np.concatenate(contours).reshape(-1, 2)
+    return np.stack([
+        np.minimum.reduceat(points[:, 0], offsets),
+        np.minimum.reduceat(points[:, 1], offsets),
+        np.maximum.reduceat(points[:, 0], offsets),
+        np.maximum.reduceat(points[:, 1], offsets),
+    ], axis=1)
+
+
+def count_rectangles_fast(gray, scale=1.0, min_area=MIN_RECTANGLE_AREA, exclude=()):
+    """Rectangle count on a gray image downscaled by ``scale`` from the full frame.
+
+    ``min_area`` and the ``exclude`` boxes, given as full-resolution
+    (x, y, w, h), are mapped to the downscaled image; edges inside the
+    excluded boxes are ignored. Exact at ``scale`` 1, approximate below it.
+    """
+    edges = cv2.Canny(gray, 50, 150)
+    for x, y, w, h in exclude:
+        x0, y0 = max(int(x * scale), 0), max(int(y * scale), 0)
+        edges[y0:int(np.ceil((y + h) * scale)), x0:int(np.ceil((x + w) * scale))] = 0
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return 0
+
+    area = min_area * scale * scale
+    bounds = contour_bounds(contours)
+    box_area = (bounds[:, 2] - bounds[:, 0]) * (bounds[:, 3] - bounds[:, 1])
+    candidates = np.flatnonzero(box_area > area)
+
+    rectangles = 0
+    for i in candidates:
+        contour = contours[i]
+        if cv2.contourArea(contour) > area:
+            approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+            if len(approx) == 4:
+                rectangles += 1
+    return rectangles
+
+
+def edge_level(pyramid, width):
+    """Smallest pyramid level at least ``width`` pixels wide, with its scale"""
+    full_width = pyramid[0].shape[1]
+    for level in reversed(pyramid):
+        if level.shape[1] >= width:
+            return level, level.shape[1] / full_width
+    return pyramid[0], 1.0
@@ -0,0 +1,115 @@
+"""Image quality metrics from one pass over a downsampled frame.
+
+The frame's shared gray pyramid already holds a small copy of the image, so
+nothing is converted at full resolution or widened to float64. Pixel values
+and their squares are averaged per tile in one reshaped reduction. Global
+brightness and contrast come from the tile averages, and the tiles
+themselves show local glare or a partly covered camera that whole-frame
+averages hide. Noise uses Immerkær's fast estimator (one 3x3 convolution).
+
+Sharpness is the exception: Laplacian variance at the analysis width has no
+fixed relation to the full-resolution value (blur shrinks with the image,
+pixel noise disappears), so no rescaled threshold reproduces its verdicts.
+It is measured on the full-resolution frame in int16, which gives the
+original value at a fifth of the float64 cost.
+"""
+import math
+
+import cv2
+import numpy as np
+
+DEFAULT_SETTINGS = {
+    'analysis_width': 320,
+    'tiles': (4, 4),
+    'sharpness_threshold': 100,
+    'glare_level': 245,
+    'dark_level': 25,
+    'flat_std': 10,
+    'min_width': 640,
+    'min_height': 480,
+}
+
+# Immerkær (1996): responds to noise but not to edges or smooth gradients
+NOISE_KERNEL = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+
+
+def tile_statistics(gray, tiles=(4, 4)):
+    """Per-tile mean and variance of the image, each (rows, cols)"""
+    rows, cols = tiles
+    height, width = gray.shape[0] // rows * rows, gray.shape[1] // cols * cols
+    img = gray[:height, :width].astype(np.float32)
+    means = np.stack([img, img * img]).reshape(2, rows, height // rows, cols, width // cols).mean(axis=(2, 4))
+    return {
+        'mean': means[0],
+        'var': np.maximum(means[1] - means[0] ** 2, 0),
+    }
+
+
+def laplacian_variance(gray):
+    """Variance of the 3x3 Laplacian, equal to ``cv2.Laplacian(gray, cv2.CV_64F).var()``"""
+    # An 8-bit Laplacian fits in int16, and meanStdDev avoids a float64 copy of the frame
+    _, std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S))
+    return float(std[0, 0]) ** 2
+
+
+def estimate_noise(gray):
+    """Standard deviation of additive noise (Immerkær's method)"""
+    height, width = gray.shape
+    if height < 3 or width < 3:
+        return 0.0
+    response = cv2.filter2D(gray.astype(np.float32), cv2.CV_32F, NOISE_KERNEL)[1:-1, 1:-1]
+    return float(np.abs(response).mean()) * math.sqrt(math.pi / 2) / 6
+
+
+def assess_quality(gray, full_gray, settings=None):
+    """Quality payload for a downsampled gray frame and the full-resolution one it came from"""
+    settings = dict(DEFAULT_SETTINGS, **(settings or {}))
+    stats = tile_statistics(gray, tuple(settings['tiles']))
+
+    # Equal-sized tiles, so global moments are plain averages of the tile moments
+    brightness = float(stats['mean'].mean())
+    contrast = math.sqrt(max(float((stats['var'] + stats['mean'] ** 2).mean()) - brightness ** 2, 0.0))
+    sharpness = laplacian_variance(full_gray)
+    noise = estimate_noise(gray)
+
+    quality_score = 0
+    issues = []
+
+    if brightness < 50:
+        issues.append("Image too dark")
+    elif brightness > 200:
+        issues.append("Image too bright")
+    else:
+        quality_score += 30
+
+    if sharpness < settings['sharpness_threshold']:
+        issues.append("Image blurry")
+    else:
+        quality_score += 40
+
+    height, width = full_gray.shape[:2]
+    if width < settings['min_width'] or height < settings['min_height']:
+        issues.append("Image resolution too low")
+    else:
+        quality_score += 30
+
+    # Local problems only; a frame that is dark or bright everywhere is reported above
+    tile_count = stats['mean'].size
+    glare = int(np.count_nonzero(stats['mean'] >= settings['glare_level']))
+    occluded = int(np.count_nonzero((stats['mean'] <= settings['dark_level'])
+                                    & (np.sqrt(stats['var']) <= settings['flat_std'])))
+    if 0 < glare < tile_count:
+        issues.append(f"Local glare ({glare}/{tile_count} regions)")
+    if 0 < occluded < tile_count:
+        issues.append(f"Camera partly covered ({occluded}/{tile_count} regions)")
+
+    return {
+        "score": quality_score,
+        "brightness": round(brightness, 1),
+        "sharpness": round(sharpness, 1),
+        "contrast": round(contrast, 1),
+        "noise": round(noise, 2),
+        "tiles": {"grid": list(stats['mean'].shape), "glare": glare, "occluded": occluded,
+                  "brightness": np.round(stats['mean'].astype(np.float64), 1).tolist()},
+        "issues": issues
+    }
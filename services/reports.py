@@ -0,0 +1,296 @@
+"""PDF violation reports, cached per session.
+
+A session's report is written once to ``<root>/<session_id>/<key>.pdf``,
+where the key is the session's latest violation id plus whether it has
+ended. Downloading again returns the cached file until a new violation is
+recorded or the session ends. Rows are read straight off the SQLite cursor
+while the PDF is drawn, and files are renamed into place so concurrent
+downloads never see (or overwrite) each other's output.
+
+``ReportJobs`` renders every session of an exam in the background, on a
+process pool when one has been started.
+"""
+import os
+import re
+import secrets
+import sqlite3
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from fpdf import FPDF
+
+from services.worker_pool import pool_context
+
+SEVERITY_LABELS = ["Low", "Medium", "High", "Critical"]
+
+_SAFE_NAME = re.compile(r'[^A-Za-z0-9_-]')
+
+
+def _new_pdf():
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", 'B', 16)
+    pdf.cell(200, 10, txt="Proctoring Violation Report", ln=True, align='C')
+    pdf.ln(10)
+    return pdf
+
+
+def _output(pdf, path):
+    """Write the PDF under a temporary name and rename it into place"""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    os.close(fd)
+    try:
+        pdf.output(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
+
+
+def report_key(conn, session_id):
+    """Cache key for a session's report, or None when the session doesn't exist"""
+    row = conn.execute('''
+        SELECT s.end_time IS NOT NULL,
+               (SELECT MAX(v.id) FROM violations v WHERE v.session_id = s.session_id)
+        FROM sessions s
+        WHERE s.session_id = ?
+    ''', (session_id,)).fetchone()
+    if row is None:
+        return None
+    ended, last_violation_id = row
+    return f"{last_violation_id or 0}-{'ended' if ended else 'open'}"
+
+
+def render_session_report(conn, session_id, path):
+    """Draw one session's report, reading violations row by row from the cursor"""
+    header = conn.execute('''
+        SELECT student_name, exam_name, start_time, end_time
+        FROM sessions WHERE session_id = ?
+    ''', (session_id,)).fetchone()
+
+    pdf = _new_pdf()
+    if header:
+        student_name, exam_name, start_time, end_time = header
+        pdf.set_font("Arial", 'B', 12)
+        pdf.cell(200, 10, txt=f"Student: {student_name or 'Unknown'}", ln=True)
+        pdf.cell(200, 10, txt=f"Exam: {exam_name or 'Unknown Exam'}", ln=True)
+        pdf.cell(200, 10, txt=f"Start Time: {start_time}", ln=True)
+        pdf.cell(200, 10, txt=f"End Time: {end_time or 'Ongoing'}", ln=True)
+        pdf.ln(10)
+
+        pdf.set_font("Arial", 'B', 12)
+        pdf.cell(200, 10, txt="Violations:", ln=True)
+        pdf.set_font("Arial", size=10)
+
+        violation_count = 0
+        cursor = conn.execute('''
+            SELECT timestamp, violation_type, details, severity
+            FROM violations
+            WHERE session_id = ?
+            ORDER BY timestamp
+        ''', (session_id,))
+        for timestamp, violation_type, details, severity in cursor:
+            violation_count += 1
+            severity_text = SEVERITY_LABELS[min(max((severity or 1) - 1, 0), 3)]
+            pdf.multi_cell(0, 8, txt=f"{timestamp} | {violation_type} | {details} | Severity: {severity_text}")
+
+        if violation_count == 0:
+            pdf.cell(200, 10, txt="No violations recorded.", ln=True)
+        else:
+            pdf.ln(5)
+            pdf.set_font("Arial", 'B', 12)
+            pdf.cell(200, 10, txt=f"Total Violations: {violation_count}", ln=True)
+    return _output(pdf, path)
+
+
+def render_log_report(entries, path):
+    """Draw the session-less report from client log entries"""
+    pdf = _new_pdf()
+    pdf.set_font("Arial", size=10)
+    for log in entries:
+        pdf.multi_cell(0, 8, txt=f"{log.get('timestamp')} | {log.get('type')} | {log.get('details')}")
+    return _output(pdf, path)
+
+
+class ReportCache:
+    """Per-session report files, re-rendered only when the cache key changes"""
+
+    def __init__(self, database_path, root):
+        self.database_path = database_path
+        self.root = root
+        self._lock = threading.Lock()
+        self.counters = {'hits': 0, 'rendered': 0}
+
+    def _session_dir(self, session_id):
+        return os.path.join(self.root, _SAFE_NAME.sub('_', session_id))
+
+    def get(self, session_id):
+        """Path of an up-to-date report for ``session_id``, or None if it doesn't exist"""
+        conn = sqlite3.connect(self.database_path)
+        try:
+            key = report_key(conn, session_id)
+            if key is None:
+                return None
+            directory = self._session_dir(session_id)
+            path = os.path.join(directory, key + '.pdf')
+            if os.path.exists(path):
+                with self._lock:
+                    self.counters['hits'] += 1
+                return path
+            render_session_report(conn, session_id, path)
+        finally:
+            conn.close()
+
+        with self._lock:
+            self.counters['rendered'] += 1
+        self._prune(directory, keep=path)
+        return path
+
+    @staticmethod
+    def _prune(directory, keep):
+        """Remove reports made stale by newer violations"""
+        for filename in os.listdir(directory):
+            path = os.path.join(directory, filename)
+            if filename.endswith('.pdf') and path != keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # still being sent to another client
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+def _render_cached(database_path, root, session_id):
+    """Pool task: bring one session's cached report up to date"""
+    return session_id, ReportCache(database_path, root).get(session_id)
+
+
+class ReportJobs:
+    """Background rendering of every session report for an exam.
+
+    With ``workers`` > 0 and ``start()`` called, sessions are rendered on a
+    process pool; otherwise each job renders its sessions on its own thread.
+    Finished jobs are kept for ``retain_seconds`` so clients can poll them.
+    """
+
+    def __init__(self, cache, workers=0, start_method=None, retain_seconds=3600):
+        self.cache = cache
+        self.workers = workers
+        self.start_method = start_method
+        self.retain_seconds = retain_seconds
+        self._executor = None
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    @classmethod
+    def from_config(cls, cache, options):
+        return cls(cache, **dict(options or {}))
+
+    def start(self):
+        """Start the render pool; call from the main thread before serving requests"""
+        if self.workers and self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=pool_context(self.start_method))
+            self._executor.submit(os.getpid).result()
+        return self
+
+    def submit(self, exam_name):
+        """Queue reports for every session of ``exam_name``; returns the job"""
+        conn = sqlite3.connect(self.cache.database_path)
+        try:
+            session_ids = [row[0] for row in conn.execute(
+                'SELECT session_id FROM sessions WHERE exam_name = ? ORDER BY start_time', (exam_name,))]
+        finally:
+            conn.close()
+
+        job = {
+            'job_id': secrets.token_urlsafe(8),
+            'exam_name': exam_name,
+            'status': 'running',
+            'total': len(session_ids),
+            'completed': 0,
+            'failed': 0,
+            'reports': {},
+            'created_at': time.time(),
+            'finished_at': None,
+        }
+        with self._lock:
+            self._expire()
+            self._jobs[job['job_id']] = job
+        threading.Thread(target=self._run, args=(job, session_ids),
+                         name=f"report-job-{job['job_id']}", daemon=True).start()
+        return self.get(job['job_id'])
+
+    def _run(self, job, session_ids):
+        if self._executor is not None:
+            futures = [self._executor.submit(_render_cached, self.cache.database_path, self.cache.root, session_id)
+                       for session_id in session_ids]
+            results = (self._result(future.result) for future in futures)
+        else:
+            results = (self._result(self.cache.get, session_id) for session_id in session_ids)
+
+        for session_id, path in zip(session_ids, results):
+            with self._lock:
+                if path:
+                    job['completed'] += 1
+                    job['reports'][session_id] = path
+                else:
+                    job['failed'] += 1
+
+        with self._lock:
+            job['status'] = 'completed' if not job['failed'] else 'completed_with_errors'
+            job['finished_at'] = time.time()
+
+    @staticmethod
+    def _result(fn, *args):
+        try:
+            result = fn(*args)
+        except Exception as e:
+            print(f"Report rendering failed: {e}")
+            return None
+        return result[1] if isinstance(result, tuple) else result
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job, reports=dict(job['reports'])) if job else None
+
+    def _expire(self):
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job['finished_at'] and now - job['finished_at'] > self.retain_seconds:
+                del self._jobs[job_id]
+
+    def archive(self, job_id, path):
+        """Zip a finished job's reports into ``path`` and return it"""
+        job = self.get(job_id)
+        if job is None or job['status'] == 'running':
+            return None
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f, zipfile.ZipFile(f, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for session_id, report_path in job['reports'].items():
+                    if os.path.exists(report_path):
+                        archive.write(report_path, _SAFE_NAME.sub('_', session_id) + '.pdf')
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return path
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
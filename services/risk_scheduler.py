@@ -0,0 +1,149 @@
+"""Per-session analysis rate from recent violations, within a CPU budget.
+
+Each session's risk is the decayed weight of its recent violations (a
+``multiple_faces`` a minute ago counts for more than a ``partial_attention``
+ten minutes ago), squashed into 0..1. Calm sessions are analysed at
+``calm_factor`` times the base interval and risky ones at ``alert_factor``
+times it. Whatever the risk, the frames all active sessions ask for must fit
+in ``cpu_budget`` seconds of analysis per second; when they don't, every
+interval is stretched by the same factor until they do.
+"""
+import math
+import os
+import threading
+import time
+
+DEFAULT_WEIGHTS = {
+    'multiple_faces': 1.0,
+    'unverified': 1.0,
+    'no_face': 0.6,
+    'suspicious_object': 0.6,
+    'tab_switch': 0.5,
+    'distracted': 0.3,
+    'partial_attention': 0.15,
+}
+
+
+class _SessionRisk:
+    def __init__(self, now):
+        self.score = 0.0
+        self.scored_at = now
+        self.seen_at = now
+
+    def decayed(self, now, half_life):
+        return self.score * 0.5 ** ((now - self.scored_at) / half_life)
+
+
+class RiskScheduler:
+    """Risk-weighted frame intervals per session, bounded by a global CPU budget"""
+
+    def __init__(self, half_life_seconds=300, risk_scale=2.0, calm_factor=2.0, alert_factor=0.5,
+                 cpu_budget=None, target_utilisation=0.7, session_ttl_seconds=120,
+                 cost_smoothing=0.1, violation_weights=None):
+        self.half_life = half_life_seconds
+        self.risk_scale = risk_scale
+        self.calm_factor = calm_factor
+        self.alert_factor = alert_factor
+        # Seconds of analysis the server can spend per wall-clock second
+        self.cpu_budget = cpu_budget or max((os.cpu_count() or 1) * target_utilisation, 0.1)
+        self.session_ttl = session_ttl_seconds
+        self.cost_smoothing = cost_smoothing
+        self.weights = dict(DEFAULT_WEIGHTS, **(violation_weights or {}))
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._frame_cost = None
+        self._stretch = 1.0
+        self._demand = 0.0
+        self._stretch_at = 0.0
+
+    @classmethod
+    def from_config(cls, options):
+        options = dict(options or {})
+        options.pop('enabled', None)
+        return cls(**options)
+
+    def _weight(self, violation_type, severity):
+        if violation_type in self.weights:
+            return self.weights[violation_type]
+        return min(max(severity or 1, 1), 4) / 4.0 * 0.5
+
+    def record_violation(self, session_id, violation_type, severity=1):
+        """Add a violation to the session's decayed risk"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                entry = self._sessions[session_id] = _SessionRisk(now)
+            entry.score = entry.decayed(now, self.half_life) + self._weight(violation_type, severity)
+            entry.scored_at = now
+
+    def record_frame(self, session_id, elapsed_seconds):
+        """Mark the session active and fold one frame's analysis time into the cost estimate"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                entry = self._sessions[session_id] = _SessionRisk(now)
+            entry.seen_at = now
+            if self._frame_cost is None:
+                self._frame_cost = elapsed_seconds
+            else:
+                self._frame_cost += self.cost_smoothing * (elapsed_seconds - self._frame_cost)
+
+    def _risk(self, entry, now):
+        score = entry.decayed(now, self.half_life)
+        return 1.0 - math.exp(-score / self.risk_scale) if self.risk_scale else 0.0
+
+    def _factor(self, risk):
+        return self.calm_factor - (self.calm_factor - self.alert_factor) * risk
+
+    def risk(self, session_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            return self._risk(entry, now) if entry else 0.0
+
+    def _update_stretch(self, now, base_interval):
+        """Uniform interval stretch that keeps total demand within the CPU budget"""
+        expired = [sid for sid, entry in self._sessions.items() if now - entry.seen_at > self.session_ttl]
+        for sid in expired:
+            del self._sessions[sid]
+        if not self._frame_cost:
+            self._demand, self._stretch = 0.0, 1.0
+        else:
+            frames_per_second = sum(1.0 / (base_interval * self._factor(self._risk(entry, now)))
+                                    for entry in self._sessions.values())
+            self._demand = frames_per_second * self._frame_cost
+            self._stretch = max(1.0, self._demand / self.cpu_budget)
+        self._stretch_at = now
+
+    def intervals(self, session_id, frame_interval, verify_interval):
+        """Frame and verification intervals (seconds) for one session"""
+        now = time.monotonic()
+        with self._lock:
+            # Summing over every session is cheap but needn't happen on every frame
+            if now - self._stretch_at >= 1.0:
+                self._update_stretch(now, frame_interval)
+            entry = self._sessions.get(session_id)
+            factor = self._factor(self._risk(entry, now) if entry else 0.0) * self._stretch
+        return frame_interval * factor, verify_interval * factor
+
+    def drop(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            risks = [self._risk(entry, now) for entry in self._sessions.values()]
+            frame_cost = self._frame_cost
+            demand, stretch = self._demand, self._stretch
+        return {
+            'sessions': len(risks),
+            'high_risk_sessions': sum(1 for risk in risks if risk >= 0.5),
+            'mean_risk': round(sum(risks) / len(risks), 3) if risks else 0,
+            'frame_cost_ms': round(frame_cost * 1000, 2) if frame_cost else None,
+            'cpu_budget': round(self.cpu_budget, 2),
+            'cpu_demand': round(demand, 3),
+            'stretch': round(stretch, 3),
+        }
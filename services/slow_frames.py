@@ -0,0 +1,253 @@
+"""Opt-in capture of slow frame requests for offline analysis.
+
+Frame handlers run inside ``SlowFrameRecorder.watch``. Every watched
+request collects its stage timings (services/metrics.py) and is profiled
+while it runs; only requests slower than ``threshold_ms`` are kept. Each
+capture is a directory holding the uploaded frame, ``meta.json`` with the
+stage timings, and the profile:
+
+* ``sample`` (default): a background thread samples the request thread's
+  stack every ``sample_interval_ms`` into ``stacks.txt``, in the folded
+  format flame graph tools read. Cheap enough to leave on.
+* ``cprofile``: deterministic profile as ``profile.prof`` plus a text
+  summary. It slows every watched request, and only one thread can be
+  profiled at a time, so concurrent requests go unprofiled.
+
+Frames analysed in pool workers report their worker stage timings, but the
+profile only shows the request thread waiting. The newest ``max_captures``
+are kept on disk; ``python -m benchmarks.endpoints --captures DIR`` replays
+their frames.
+"""
+import collections
+import contextlib
+import cProfile
+import datetime
+import io
+import json
+import os
+import pstats
+import re
+import secrets
+import shutil
+import sys
+import threading
+import time
+import zipfile
+
+from services.metrics import stage_metrics
+
+PROFILERS = ('sample', 'cprofile', None)
+FRAME_FILE = 'frame.jpg'
+META_FILE = 'meta.json'
+_CAPTURE_ID = re.compile(r'^\d{8}T\d{12}-[0-9a-f]{6}$')
+
+
+def folded_stack(frame):
+    """``outer;...;inner`` call stack of a frame, innermost last"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class StackSampler:
+    """Counts the call stacks of registered threads from one sampling thread"""
+
+    def __init__(self, interval_seconds=0.005):
+        self.interval = interval_seconds
+        self._lock = threading.Lock()
+        self._watched = {}
+        self._thread = None
+
+    def start(self, ident):
+        stacks = collections.Counter()
+        with self._lock:
+            self._watched[ident] = stacks
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+        return stacks
+
+    def stop(self, ident):
+        with self._lock:
+            return self._watched.pop(ident, collections.Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                watched = list(self._watched.items())
+            if not watched:
+                continue
+            frames = sys._current_frames()
+            for ident, stacks in watched:
+                frame = frames.get(ident)
+                if frame is not None:
+                    stacks[folded_stack(frame)] += 1
+
+
+class Capture:
+    """What a watched request contributes: its frame and anything worth recording"""
+
+    def __init__(self, endpoint, meta):
+        self.endpoint = endpoint
+        self.meta = meta
+        self.frame = None
+
+
+class SlowFrameRecorder:
+    """Keeps the frame, stage timings and profile of requests over ``threshold_ms``"""
+
+    def __init__(self, directory, threshold_ms=1000, max_captures=50, profiler='sample',
+                 sample_interval_ms=5):
+        if profiler not in PROFILERS:
+            raise ValueError(f"profiler must be one of {', '.join(map(str, PROFILERS))}")
+        self.directory = directory
+        self.threshold_ms = threshold_ms
+        self.max_captures = max_captures
+        self.profiler = profiler
+        self.sampler = StackSampler(sample_interval_ms / 1000) if profiler == 'sample' else None
+        self._lock = threading.Lock()
+        self.counters = {'watched': 0, 'captured': 0, 'pruned': 0, 'unprofiled': 0}
+
+    @classmethod
+    def from_config(cls, directory, options):
+        options = dict(options or {})
+        options.pop('enabled', None)
+        return cls(directory, **options)
+
+    @contextlib.contextmanager
+    def watch(self, endpoint, frame=None, **meta):
+        """Time and profile the block; store it if it ran over the threshold.
+
+        ``frame`` (or ``capture.frame``, set inside the block) is the
+        uploaded image; blocks without one are not stored. Exceptions are
+        recorded and re-raised.
+        """
+        capture = Capture(endpoint, meta)
+        capture.frame = frame
+        ident = threading.get_ident()
+        profile = self._start_profile(ident)
+        error = None
+        started = time.perf_counter()
+        with stage_metrics.capture() as timings:
+            try:
+                yield capture
+            except BaseException as e:
+                error = repr(e)
+                raise
+            finally:
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                profile = self._stop_profile(ident, profile)
+                with self._lock:
+                    self.counters['watched'] += 1
+                if elapsed_ms >= self.threshold_ms and capture.frame is not None:
+                    self._save(capture, elapsed_ms, timings, profile, error)
+
+    def _start_profile(self, ident):
+        if self.profiler == 'sample':
+            return self.sampler.start(ident)
+        if self.profiler == 'cprofile':
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:  # another thread is already being profiled
+                with self._lock:
+                    self.counters['unprofiled'] += 1
+                return None
+            return profile
+        return None
+
+    def _stop_profile(self, ident, profile):
+        if self.profiler == 'sample':
+            return self.sampler.stop(ident)
+        if profile is not None:
+            profile.disable()
+        return profile
+
+    def _save(self, capture, elapsed_ms, timings, profile, error):
+        now = datetime.datetime.now()
+        capture_id = f'{now:%Y%m%dT%H%M%S%f}-{secrets.token_hex(3)}'
+        meta = dict(capture.meta, id=capture_id, endpoint=capture.endpoint, timestamp=now.isoformat(),
+                    elapsed_ms=round(elapsed_ms, 2), threshold_ms=self.threshold_ms,
+                    stages_ms={stage: round(seconds * 1000, 3) for stage, seconds in timings.items()},
+                    profiler=self.profiler if profile is not None else None, error=error)
+
+        os.makedirs(self.directory, exist_ok=True)
+        # Build the capture under a temporary name so listings never see half of one
+        tmp_path = os.path.join(self.directory, f'.{capture_id}.tmp')
+        os.makedirs(tmp_path)
+        try:
+            with open(os.path.join(tmp_path, FRAME_FILE), 'wb') as f:
+                f.write(capture.frame)
+            if isinstance(profile, collections.Counter):
+                with open(os.path.join(tmp_path, 'stacks.txt'), 'w') as f:
+                    for stack, count in profile.most_common():
+                        f.write(f'{stack} {count}\n')
+                meta['samples'] = sum(profile.values())
+            elif profile is not None:
+                profile.dump_stats(os.path.join(tmp_path, 'profile.prof'))
+                summary = io.StringIO()
+                pstats.Stats(profile, stream=summary).sort_stats('cumulative').print_stats(40)
+                with open(os.path.join(tmp_path, 'profile.txt'), 'w') as f:
+                    f.write(summary.getvalue())
+            with open(os.path.join(tmp_path, META_FILE), 'w') as f:
+                json.dump(meta, f, indent=2)
+            os.replace(tmp_path, os.path.join(self.directory, capture_id))
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+
+        with self._lock:
+            self.counters['captured'] += 1
+        self._prune()
+        return capture_id
+
+    def _capture_ids(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory) if _CAPTURE_ID.match(name))
+
+    def _prune(self):
+        """Drop the oldest captures beyond ``max_captures``"""
+        with self._lock:
+            ids = self._capture_ids()
+            for capture_id in ids[:max(len(ids) - self.max_captures, 0)]:
+                shutil.rmtree(os.path.join(self.directory, capture_id), ignore_errors=True)
+                self.counters['pruned'] += 1
+
+    def path_for(self, capture_id):
+        """Directory of a stored capture, or None for unknown or malformed ids"""
+        if not _CAPTURE_ID.match(capture_id or ''):
+            return None
+        path = os.path.join(self.directory, capture_id)
+        return path if os.path.isdir(path) else None
+
+    def list(self):
+        """Metadata of every stored capture, newest first"""
+        captures = []
+        for capture_id in reversed(self._capture_ids()):
+            try:
+                with open(os.path.join(self.directory, capture_id, META_FILE)) as f:
+                    captures.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return captures
+
+    def archive(self, capture_id):
+        """Zip of one capture's files as bytes, or None if it doesn't exist"""
+        path = self.path_for(capture_id)
+        if path is None:
+            return None
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name in sorted(os.listdir(path)):
+                archive.write(os.path.join(path, name), f'{capture_id}/{name}')
+        return buffer.getvalue()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, stored=len(self._capture_ids()), threshold_ms=self.threshold_ms,
+                        profiler=self.profiler)
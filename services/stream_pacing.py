@@ -0,0 +1,121 @@
+"""Server-driven frame pacing for streaming proctoring clients.
+
+Streaming clients don't poll on fixed timers; after every frame the server
+tells them when to send the next one and at what size and JPEG quality.
+The pacing follows server load: the highest of the registered load sources
+(worker pool saturation, inference queue depth, ...) and of the recent
+analysis latency against ``latency_budget_ms``. Below ``low_load`` clients
+run at the configured base rate and full size; at ``high_load`` and above
+they are slowed to ``max_interval_seconds`` at ``min_width``/``min_quality``,
+with a linear ramp in between.
+"""
+import threading
+
+
+def _clamp(value, low=0.0, high=1.0):
+    return min(max(value, low), high)
+
+
+class StreamPacer:
+    """Maps current server load to the frame interval, size and quality clients should use"""
+
+    def __init__(self, frame_interval_seconds=2, verify_interval_seconds=3, max_interval_seconds=10,
+                 max_width=640, min_width=320, quality=0.8, min_quality=0.5,
+                 low_load=0.25, high_load=0.75, latency_budget_ms=500, latency_smoothing=0.2):
+        self.frame_interval = frame_interval_seconds
+        self.verify_interval = verify_interval_seconds
+        self.max_interval = max(max_interval_seconds, frame_interval_seconds)
+        self.max_width = max_width
+        self.min_width = min(min_width, max_width)
+        self.quality = quality
+        self.min_quality = min(min_quality, quality)
+        self.low_load = low_load
+        self.high_load = max(high_load, low_load + 1e-6)
+        self.latency_budget_ms = latency_budget_ms
+        self.latency_smoothing = latency_smoothing
+        self._sources = {}
+        self._lock = threading.Lock()
+        self._latency_ms = 0.0
+        self._streams = 0
+        self.counters = {'frames': 0, 'busy': 0, 'streams_opened': 0}
+
+    @classmethod
+    def from_config(cls, options, monitoring=None):
+        """Pacer from the ``streaming`` section, defaulting intervals to ``monitoring``'s"""
+        options = dict(options or {})
+        options.pop('enabled', None)
+        monitoring = monitoring or {}
+        if 'attention_check_interval' in monitoring:
+            options.setdefault('frame_interval_seconds', monitoring['attention_check_interval'])
+        if 'face_check_interval' in monitoring:
+            options.setdefault('verify_interval_seconds', monitoring['face_check_interval'])
+        return cls(**options)
+
+    def add_source(self, name, fn):
+        """Register ``fn() -> load`` where 1.0 means that resource is saturated"""
+        self._sources[name] = fn
+
+    def record(self, elapsed_ms, busy=False):
+        """Fold one frame's analysis time (or a busy rejection) into the load estimate"""
+        with self._lock:
+            self.counters['frames'] += 1
+            if busy:
+                self.counters['busy'] += 1
+                elapsed_ms = max(elapsed_ms, self.latency_budget_ms * 2)
+            self._latency_ms += self.latency_smoothing * (elapsed_ms - self._latency_ms)
+
+    def opened(self):
+        with self._lock:
+            self._streams += 1
+            self.counters['streams_opened'] += 1
+
+    def closed(self):
+        with self._lock:
+            self._streams -= 1
+
+    def loads(self):
+        """Current load of every source, including analysis latency"""
+        loads = {}
+        for name, fn in self._sources.items():
+            try:
+                loads[name] = _clamp(float(fn()), 0.0, 2.0)
+            except Exception:
+                loads[name] = 0.0
+        with self._lock:
+            latency_ms = self._latency_ms
+        loads['latency'] = latency_ms / self.latency_budget_ms if self.latency_budget_ms else 0.0
+        return loads
+
+    def pressure(self):
+        """0 at or below ``low_load``, 1 at or above ``high_load``"""
+        load = max(self.loads().values(), default=0.0)
+        return _clamp((load - self.low_load) / (self.high_load - self.low_load))
+
+    def pacing(self, pressure=None, frame_interval=None, verify_interval=None):
+        """What a streaming client should send next.
+
+        ``frame_interval``/``verify_interval`` replace the configured base
+        intervals for one session; load pressure is applied on top.
+        """
+        if pressure is None:
+            pressure = self.pressure()
+        frame_interval = frame_interval or self.frame_interval
+        verify_interval = verify_interval or self.verify_interval
+        max_interval = max(self.max_interval, frame_interval)
+        interval = frame_interval + (max_interval - frame_interval) * pressure
+        return {
+            'interval_ms': int(round(interval * 1000)),
+            'verify_interval_ms': int(round(max(verify_interval, interval) * 1000)),
+            'max_width': int(round(self.max_width - (self.max_width - self.min_width) * pressure)),
+            'quality': round(self.quality - (self.quality - self.min_quality) * pressure, 2),
+            'pressure': round(pressure, 3),
+        }
+
+    def stats(self):
+        loads = self.loads()
+        with self._lock:
+            counters = dict(self.counters)
+            streams = self._streams
+        return dict(counters, active_streams=streams,
+                    loads={name: round(value, 3) for name, value in loads.items()},
+                    pacing=self.pacing())
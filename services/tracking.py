@@ -0,0 +1,203 @@
+"""Per-session face tracking between consecutive proctoring frames.
+
+During an exam the same face sits in roughly the same place for an hour, so
+each session keeps a ``FaceTrack``: the last face box, a small appearance
+signature of the face crop and the last verified identity. Between periodic
+full-frame detections the face is searched for only around the previous box,
+and while the crop still looks like the verified one the identity is reused
+instead of re-encoding and re-matching.
+
+So that a second person entering elsewhere in the frame is still reported,
+ROI frames also count faces on the whole frame downscaled by
+``count_check_scale``; more than one face forces a full detection. Faces
+smaller than about 40 / ``count_check_scale`` pixels (80 px by default)
+are only seen on full-detection frames, every ``full_detect_every``.
+"""
+import threading
+import time
+
+import cv2
+import face_recognition
+import numpy as np
+
+from services.frame_pipeline import scale_locations
+
+SIGNATURE_SIZE = 32
+
+
+def face_signature(gray, location):
+    """Zero-mean, unit-norm thumbnail of a face crop for cheap similarity checks"""
+    top, right, bottom, left = location
+    crop = gray[top:bottom, left:right]
+    if crop.size == 0:
+        return None
+    thumb = cv2.resize(crop, (SIGNATURE_SIZE, SIGNATURE_SIZE), interpolation=cv2.INTER_AREA)
+    thumb = thumb.astype(np.float32).ravel()
+    thumb -= thumb.mean()
+    norm = np.linalg.norm(thumb)
+    return thumb / norm if norm else None
+
+
+class FaceTrack:
+    """Tracking state for one session"""
+
+    def __init__(self):
+        self.location = None
+        self.signature = None
+        self.match = None
+        self.frames_since_detect = 0
+        self.frames_since_verify = 0
+        self.verified_at = 0.0
+        self.updated_at = time.monotonic()
+
+
+class FaceTracker:
+    """Registry of FaceTracks keyed by session id"""
+
+    def __init__(self, roi_margin=0.5, full_detect_every=5, count_check_scale=0.5, reverify_every=10,
+                 reverify_seconds=30, similarity_threshold=0.9, session_ttl_seconds=900):
+        self.roi_margin = roi_margin
+        self.full_detect_every = full_detect_every
+        self.count_check_scale = count_check_scale
+        self.reverify_every = reverify_every
+        self.reverify_seconds = reverify_seconds
+        self.similarity_threshold = similarity_threshold
+        self.session_ttl_seconds = session_ttl_seconds
+        self._tracks = {}
+        self._lock = threading.Lock()
+        self._next_purge = time.monotonic() + session_ttl_seconds
+        self.counters = {
+            'roi_detections': 0,
+            'full_detections': 0,
+            'identity_reused': 0,
+            'full_verifications': 0,
+            'tracks_lost': 0,
+            'extra_faces': 0,
+        }
+
+    @classmethod
+    def from_config(cls, options):
+        options = dict(options or {})
+        options.pop('enabled', None)
+        return cls(**options)
+
+    def get(self, session_id):
+        """Track for a session, created on first use"""
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_purge:
+                self._purge(now)
+            track = self._tracks.get(session_id)
+            if track is None:
+                track = self._tracks[session_id] = FaceTrack()
+            track.updated_at = now
+            return track
+
+    def adopt(self, session_id, track, counters=None):
+        """Store a track updated elsewhere (a pool worker) and add its counters"""
+        track.updated_at = time.monotonic()
+        with self._lock:
+            self._tracks[session_id] = track
+            for key, value in (counters or {}).items():
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def drop(self, session_id):
+        with self._lock:
+            self._tracks.pop(session_id, None)
+
+    def _count(self, key):
+        # Request threads share the tracker; += on a dict entry isn't atomic
+        with self._lock:
+            self.counters[key] += 1
+
+    def _purge(self, now):
+        expired = [sid for sid, track in self._tracks.items()
+                   if now - track.updated_at > self.session_ttl_seconds]
+        for sid in expired:
+            del self._tracks[sid]
+        self._next_purge = now + self.session_ttl_seconds
+
+    def locate(self, track, frame):
+        """Face locations for this frame, searching near the last box when possible.
+
+        A single face found in the region of interest, with no other face in
+        the downscaled frame, is provided to the frame as its
+        ``face_locations``; otherwise the whole frame is searched.
+        """
+        # At or below the detection scale the face count would cost as much as a full detection
+        if (track.location is not None and track.frames_since_detect < self.full_detect_every
+                and self.count_check_scale < frame.options.get('detection_scale', 1.0)):
+            locations = self._detect_in_roi(frame, track.location)
+            if len(locations) == 1:
+                if self._count_faces(frame) <= 1:
+                    track.frames_since_detect += 1
+                    self._count('roi_detections')
+                    frame.provide('face_locations', locations)
+                    return locations
+                self._count('extra_faces')
+            else:
+                self._count('tracks_lost')
+
+        track.frames_since_detect = 0
+        self._count('full_detections')
+        return frame.face_locations
+
+    def _count_faces(self, frame):
+        """Faces on the whole frame at ``count_check_scale``, catching anyone outside the ROI"""
+        small = cv2.resize(frame.rgb, None, fx=self.count_check_scale, fy=self.count_check_scale,
+                           interpolation=cv2.INTER_AREA)
+        return len(face_recognition.face_locations(small))
+
+    def _detect_in_roi(self, frame, location):
+        rgb = frame.rgb
+        height, width = rgb.shape[:2]
+        top, right, bottom, left = location
+        pad_y = int((bottom - top) * self.roi_margin)
+        pad_x = int((right - left) * self.roi_margin)
+        y0, y1 = max(top - pad_y, 0), min(bottom + pad_y, height)
+        x0, x1 = max(left - pad_x, 0), min(right + pad_x, width)
+        roi = rgb[y0:y1, x0:x1]
+        if roi.size == 0:
+            return []
+
+        scale = frame.options.get('detection_scale', 1.0)
+        if scale < 1.0:
+            small = cv2.resize(roi, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            locations = scale_locations(face_recognition.face_locations(small),
+                                        roi.shape[1] / small.shape[1], roi.shape)
+        else:
+            locations = face_recognition.face_locations(roi)
+        return [(t + y0, r + x0, b + y0, l + x0) for t, r, b, l in locations]
+
+    def reusable_match(self, track, frame, location):
+        """Last verified identity if the face still looks the same, else None"""
+        signature = face_signature(frame.gray, location)
+        frame.provide('face_signature', signature)
+        if (track.match is None or signature is None or track.signature is None
+                or track.frames_since_verify >= self.reverify_every
+                or time.monotonic() - track.verified_at >= self.reverify_seconds):
+            return None
+        if float(np.dot(signature, track.signature)) < self.similarity_threshold:
+            return None
+        track.frames_since_verify += 1
+        track.location = location
+        self._count('identity_reused')
+        return track.match
+
+    def update(self, track, frame, locations, match=None):
+        """Record the outcome of a frame that went through full verification"""
+        if len(locations) != 1:
+            track.location = None
+            track.match = None
+            return
+        track.location = locations[0]
+        track.signature = frame.get('face_signature') if frame.has('face_signature') \
+            else face_signature(frame.gray, locations[0])
+        track.match = match
+        track.frames_since_verify = 0
+        track.verified_at = time.monotonic()
+        self._count('full_verifications')
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, sessions=len(self._tracks))
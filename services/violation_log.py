@@ -0,0 +1,115 @@
+"""Append-only JSON Lines log of client-reported violations.
+
+Each event is one line appended to ``violations.jsonl``; nothing is ever
+re-read or rewritten on the write path. The file rotates by size and age to
+``violations.jsonl.1``, ``.2``, ... (``.1`` being the newest), and
+``entries()`` streams every file from oldest to newest.
+"""
+import json
+import os
+import threading
+import time
+
+
+class ViolationLog:
+    """Thread-safe JSONL log with size and time based rotation"""
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, rotate_hours=24, backup_count=10):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_hours * 3600 if rotate_hours else None
+        self.backup_count = backup_count
+        self._lock = threading.Lock()
+        self._file = None
+        self._opened_at = None
+
+    @classmethod
+    def from_config(cls, path, options):
+        return cls(path, **dict(options or {}))
+
+    def append(self, entry):
+        """Write one entry as a single line"""
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+        with self._lock:
+            if self._file is None:
+                self._open()
+            elif self._should_rotate(len(line)):
+                self._rotate()
+            self._file.write(line)
+            self._file.flush()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        try:
+            self._opened_at = os.path.getmtime(self.path) if self._file.tell() else time.time()
+        except OSError:
+            self._opened_at = time.time()
+
+    def _should_rotate(self, incoming):
+        size = self._file.tell()
+        if size == 0:
+            return False
+        if self.max_bytes and size + incoming > self.max_bytes:
+            return True
+        return bool(self.rotate_seconds) and time.time() - self._opened_at >= self.rotate_seconds
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        if self.backup_count:
+            oldest = f"{self.path}.{self.backup_count}"
+            if os.path.exists(oldest):
+                os.remove(oldest)
+            for i in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{i}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def files(self):
+        """Log files from oldest to newest"""
+        rotated = [f"{self.path}.{i}" for i in range(self.backup_count, 0, -1)]
+        return [path for path in rotated + [self.path] if os.path.exists(path)]
+
+    def entries(self):
+        """Stream every logged entry, oldest first, skipping damaged lines"""
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            paths = self.files()
+        for path in paths:
+            try:
+                f = open(path, 'r', encoding='utf-8')
+            except FileNotFoundError:
+                continue  # rotated away while we were reading
+            with f:
+                for line in f:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+    def import_legacy(self, legacy_path):
+        """Append the entries of an old JSON array file once, then rename it aside"""
+        if not os.path.exists(legacy_path):
+            return 0
+        try:
+            with open(legacy_path, 'r') as f:
+                logs = json.load(f)
+        except ValueError:
+            logs = []
+        for log in logs:
+            self.append(log)
+        os.replace(legacy_path, legacy_path + '.migrated')
+        print(f"Imported {len(logs)} entries from {legacy_path} into {self.path}")
+        return len(logs)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,254 @@
+"""Write-behind sink for violation rows.
+
+Request threads enqueue rows and return immediately. One writer thread owns
+a single SQLite connection in WAL mode and commits whatever has queued up as
+one transaction, so bursts of violations cost one fsync instead of one each.
+Evidence images are encoded and written to the evidence store on the same
+thread, so requests never wait on JPEG encoding.
+
+A batch that fails (e.g. "database is locked" past the busy timeout) is
+retried with exponential backoff, then written row by row so one bad row
+can't take the rest with it. A row whose evidence can't be stored is kept
+without evidence. Rows that still can't be written are logged in full.
+"""
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from services.metrics import stage_metrics
+
+INSERT_VIOLATION = '''
+    INSERT INTO violations (session_id, timestamp, violation_type, details, severity, evidence_ref)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'sync')
+
+_STOP = object()
+
+
+class _Flush:
+    """Queue marker: set once every row queued before it is committed"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+def connect(database_path, timeout=30):
+    """Connection tuned for a single writer alongside concurrent readers"""
+    conn = sqlite3.connect(database_path, timeout=timeout)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+class ViolationWriter:
+    """Queue violation rows and insert them in batches from one thread.
+
+    ``overflow`` decides what happens when ``max_queue`` rows are waiting:
+    ``block`` waits for room, ``drop_oldest`` discards the oldest queued row
+    and ``sync`` writes the row on the calling thread instead.
+    """
+
+    def __init__(self, database_path, evidence_store=None, max_queue=10000, batch_size=500,
+                 overflow='block', retry_attempts=4, retry_backoff_seconds=0.5, logger=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {', '.join(OVERFLOW_POLICIES)}")
+        self.database_path = database_path
+        self.evidence_store = evidence_store
+        self.batch_size = batch_size
+        self.overflow = overflow
+        self.retry_attempts = retry_attempts
+        self.retry_backoff = retry_backoff_seconds
+        self.logger = logger or logging.getLogger(__name__)
+        self._queue = queue.Queue(max_queue)
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'written': 0, 'batches': 0, 'dropped': 0, 'sync_writes': 0, 'errors': 0,
+                       'retries': 0, 'row_fallbacks': 0, 'failed': 0, 'evidence_errors': 0,
+                       'largest_batch': 0, 'commit_ms_total': 0.0}
+
+    @classmethod
+    def from_config(cls, database_path, options, evidence_store=None, logger=None):
+        options = dict(options or {})
+        options.pop('enabled', None)
+        return cls(database_path, evidence_store, logger=logger, **options)
+
+    def write(self, session_id, timestamp, violation_type, details, severity=1, image=None):
+        """Queue one violation row; ``image`` is optional JPEG bytes or PendingEvidence"""
+        self._ensure_started()
+        row = (session_id, timestamp, violation_type, details, severity, image)
+        if self.overflow == 'block':
+            self._queue.put(row)
+            return
+        while True:
+            try:
+                self._queue.put_nowait(row)
+                return
+            except queue.Full:
+                if self.overflow == 'sync':
+                    self._write_sync(row)
+                    return
+            try:
+                dropped = self._queue.get_nowait()
+            except queue.Empty:
+                continue
+            if not isinstance(dropped, tuple):
+                # Never discard flush or stop markers
+                self._queue.put(dropped)
+                continue
+            with self._stats_lock:
+                self._stats['dropped'] += 1
+
+    def _store_evidence(self, row):
+        """Swap a row's image bytes for an evidence reference"""
+        image = row[5]
+        if image is None or self.evidence_store is None:
+            return row[:5] + (None,)
+        try:
+            return row[:5] + (self.evidence_store.put(image),)
+        except Exception:
+            # The violation matters more than its picture
+            self.logger.exception("Could not store evidence for a %s violation", row[2])
+            with self._stats_lock:
+                self._stats['evidence_errors'] += 1
+            return row[:5] + (None,)
+
+    def _write_sync(self, row):
+        with stage_metrics.timer('db_write'):
+            row = self._store_evidence(row)
+            conn = connect(self.database_path)
+            try:
+                with conn:
+                    conn.execute(INSERT_VIOLATION, row)
+            finally:
+                conn.close()
+        with self._stats_lock:
+            self._stats['sync_writes'] += 1
+
+    def flush(self, timeout=10):
+        """Block until every row queued so far is committed"""
+        if self._thread is None:
+            return True
+        marker = _Flush()
+        self._queue.put(marker)
+        return marker.done.wait(timeout)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name='violation-writer', daemon=True)
+                self._thread.start()
+
+    def _worker(self):
+        conn = connect(self.database_path)
+        try:
+            while True:
+                rows, markers, stop = [], [], False
+                entry = self._queue.get()
+                while True:
+                    if entry is _STOP:
+                        stop = True
+                    elif isinstance(entry, _Flush):
+                        markers.append(entry)
+                    else:
+                        rows.append(entry)
+                    if stop or len(rows) >= self.batch_size:
+                        break
+                    try:
+                        entry = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+
+                try:
+                    if rows:
+                        self._commit(conn, rows)
+                except Exception:
+                    # Keep the thread alive: a dead writer would hang every later write
+                    self.logger.exception("Violation writer failed on a batch of %d rows", len(rows))
+                    with self._stats_lock:
+                        self._stats['errors'] += 1
+                finally:
+                    for marker in markers:
+                        marker.done.set()
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def _commit(self, conn, rows):
+        started = time.perf_counter()
+        rows = [self._store_evidence(row) for row in rows]
+        written = self._insert_batch(conn, rows)
+        if written is None:
+            written = self._insert_rows(conn, rows)
+        commit_ms = (time.perf_counter() - started) * 1000
+        if stage_metrics.enabled:
+            stage_metrics.observe('db_write', commit_ms / 1000)
+
+        with self._stats_lock:
+            stats = self._stats
+            stats['written'] += written
+            stats['batches'] += 1
+            stats['largest_batch'] = max(stats['largest_batch'], len(rows))
+            stats['commit_ms_total'] += commit_ms
+
+    def _insert_batch(self, conn, rows):
+        """Insert rows in one transaction, retrying with backoff; None if it keeps failing"""
+        delay = self.retry_backoff
+        for attempt in range(self.retry_attempts + 1):
+            try:
+                with conn:
+                    conn.executemany(INSERT_VIOLATION, rows)
+                return len(rows)
+            except (sqlite3.Error, OSError) as e:
+                retryable = isinstance(e, (sqlite3.OperationalError, OSError))
+                if not retryable or attempt == self.retry_attempts:
+                    self.logger.warning("Batch of %d violations failed (%s), writing rows one by one",
+                                        len(rows), e)
+                    with self._stats_lock:
+                        self._stats['errors'] += 1
+                    return None
+                self.logger.warning("Batch of %d violations failed (%s), retrying in %.1fs",
+                                    len(rows), e, delay)
+                with self._stats_lock:
+                    self._stats['retries'] += 1
+                time.sleep(delay)
+                delay *= 2
+
+    def _insert_rows(self, conn, rows):
+        """Insert rows one at a time so the good ones survive a bad one"""
+        written = 0
+        with self._stats_lock:
+            self._stats['row_fallbacks'] += 1
+        for row in rows:
+            try:
+                with conn:
+                    conn.execute(INSERT_VIOLATION, row)
+                written += 1
+            except (sqlite3.Error, OSError) as e:
+                self.logger.error("Could not write violation %r: %s", row, e)
+                with self._stats_lock:
+                    self._stats['failed'] += 1
+        return written
+
+    def close(self, timeout=10):
+        """Commit everything still queued and stop the writer thread"""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        batches = stats.pop('batches')
+        commit_ms_total = stats.pop('commit_ms_total')
+        return dict(stats, queue_depth=self._queue.qsize(), batches=batches,
+                    mean_batch_size=round(stats['written'] / batches, 2) if batches else 0,
+                    mean_commit_ms=round(commit_ms_total / batches, 2) if batches else 0)
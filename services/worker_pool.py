@@ -0,0 +1,349 @@
+"""Process pool for CPU-bound frame analysis.
+
+Frames are decoded and analysed in pre-warmed worker processes so request
+threads only wait on a future. Each worker loads the cascades once and reads
+the face gallery from shared memory published by the parent, re-attaching
+only when the gallery version changes. A bounded number of in-flight tasks
+gives backpressure, and every task has a timeout. Stage timings measured in
+a worker travel back with the result and land in the parent's metrics.
+"""
+import json
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from services import analysis
+from services.frame_pipeline import FrameContext, decode_frame
+from services.metrics import stage_metrics
+from services.gallery import ENCODING_DIM, GallerySnapshot
+from services.matching import create_matcher
+from services.tracking import FaceTracker
+
+
+def pool_context(start_method=None):
+    """Multiprocessing context for worker pools started from the main thread.
+
+    fork shares already-loaded detectors and skips re-importing app.py;
+    platforms without it (Windows) fall back to spawn.
+    """
+    if not start_method:
+        start_method = 'fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn'
+    return multiprocessing.get_context(start_method)
+
+
+class PoolSaturated(Exception):
+    """Raised when the pool already has its maximum number of pending tasks"""
+
+
+class TaskTimeout(Exception):
+    """Raised when a worker doesn't return a result within the task timeout"""
+
+
+def _attach(name):
+    """Attach to a shared memory block published by the parent.
+
+    Workers share the parent's resource tracker (it is running before they
+    start), where the block is already registered; attaching registers it
+    again as a no-op and the parent's unlink unregisters it once.
+    """
+    return shared_memory.SharedMemory(name=name)
+
+
+class SharedGallery:
+    """Read-only gallery view over blocks published by ``GalleryPublisher``"""
+
+    def __init__(self, descriptor):
+        self._blocks = [_attach(descriptor['encodings']), _attach(descriptor['names'])]
+        count = descriptor['count']
+        encodings = np.ndarray((count, ENCODING_DIM), dtype=np.float32, buffer=self._blocks[0].buf)
+        names = bytes(self._blocks[1].buf[:descriptor['names_bytes']]).decode('utf-8')
+        self.version = descriptor['version']
+        self.generation = descriptor['generation']
+        self._snapshot = GallerySnapshot(encodings, tuple(json.loads(names)),
+                                         self.version, self.generation)
+
+    def snapshot(self):
+        return self._snapshot
+
+    def __len__(self):
+        return len(self._snapshot.names)
+
+    def close(self):
+        self._snapshot = None
+        for block in self._blocks:
+            block.close()
+
+
+class GalleryPublisher:
+    """Copies the parent's gallery into shared memory whenever it changes.
+
+    A publication is unlinked once a newer one exists and no submitted task
+    still refers to it (``acquire``/``release``), so a worker never attaches
+    to a block that is already gone.
+    """
+
+    def __init__(self, gallery):
+        self.gallery = gallery
+        self._lock = threading.Lock()
+        self._published = []  # {'descriptor', 'blocks', 'users'}, oldest first
+
+    def acquire(self):
+        """Descriptor of the current gallery, kept alive until ``release``"""
+        with self._lock:
+            entry = self._publish()
+            entry['users'] += 1
+            return entry['descriptor']
+
+    def release(self, descriptor):
+        with self._lock:
+            for entry in self._published:
+                if entry['descriptor'] is descriptor:
+                    entry['users'] -= 1
+                    break
+            self._collect()
+
+    def descriptor(self):
+        """Publish the current gallery if it changed, without holding a reference"""
+        with self._lock:
+            return self._publish()['descriptor']
+
+    def _publish(self):
+        snapshot = self.gallery.snapshot()
+        if self._published and self._published[-1]['descriptor']['version'] == snapshot.version:
+            return self._published[-1]
+
+        names = json.dumps(list(snapshot.names)).encode('utf-8')
+        encodings = np.ascontiguousarray(snapshot.encodings, dtype=np.float32)
+        enc_block = shared_memory.SharedMemory(create=True, size=max(encodings.nbytes, 1))
+        names_block = shared_memory.SharedMemory(create=True, size=max(len(names), 1))
+        np.ndarray(encodings.shape, dtype=np.float32, buffer=enc_block.buf)[:] = encodings
+        names_block.buf[:len(names)] = names
+
+        descriptor = {
+            'encodings': enc_block.name,
+            'names': names_block.name,
+            'count': len(encodings),
+            'names_bytes': len(names),
+            'version': snapshot.version,
+            'generation': snapshot.generation,
+        }
+        self._published.append({'descriptor': descriptor, 'blocks': [enc_block, names_block], 'users': 0})
+        self._collect()
+        return self._published[-1]
+
+    def _collect(self):
+        """Unlink superseded publications no task refers to any more"""
+        keep = []
+        for entry in self._published[:-1]:
+            if entry['users'] > 0:
+                keep.append(entry)
+            else:
+                self._unlink(entry['blocks'])
+        self._published = keep + self._published[-1:]
+
+    @staticmethod
+    def _unlink(blocks):
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    def close(self):
+        with self._lock:
+            for entry in self._published:
+                self._unlink(entry['blocks'])
+            self._published = []
+
+
+# Worker process state
+
+_worker = {}
+
+
+def _init_worker(settings):
+    """Pool initializer: load detectors once per worker process"""
+    analysis.model_registry.config_path = settings.get('config_path')
+    analysis.model_registry.configure(settings.get('models'))
+    analysis.model_registry.warm_up()
+    analysis.configure_object_detection(settings.get('object_detection'))
+    analysis.configure_gaze(settings.get('gaze'))
+    analysis.configure_quality(settings.get('image_quality'))
+    stage_metrics.configure(settings.get('metrics'))
+    _worker.update({
+        'settings': settings,
+        'gallery': None,
+        'matcher': None,
+        'tracker': FaceTracker.from_config(settings.get('tracking')),
+    })
+
+
+def _worker_matcher(descriptor):
+    gallery = _worker['gallery']
+    if gallery is None or gallery.version != descriptor['version']:
+        if gallery is not None:
+            _worker['matcher'] = None
+            gallery.close()
+        gallery = _worker['gallery'] = SharedGallery(descriptor)
+        _worker['matcher'] = create_matcher(gallery, _worker['settings'].get('matcher'))
+    return _worker['matcher']
+
+
+def _run_timed(fn, *args):
+    """Run a task and return its stage timings with the outcome, for the parent's metrics"""
+    with stage_metrics.capture() as timings:
+        outcome = fn(*args)
+    outcome['timings'] = timings
+    return outcome
+
+
+def _verify_task(image_bytes, descriptor, student_name, track):
+    outcome = _frame_task(image_bytes, descriptor, student_name, track, ('verify',))
+    if 'results' in outcome:
+        outcome['result'] = outcome.pop('results')['verify']
+    return outcome
+
+
+def _frame_task(image_bytes, descriptor, student_name, track, analyses):
+    img = decode_frame(image_bytes)
+    if img is None:
+        return {'result': {"status": "error", "message": "Invalid image"}, 'track': track}
+
+    settings = _worker['settings']
+    matcher = _worker_matcher(descriptor)
+    tracker = _worker['tracker']
+    tolerance = settings.get('tolerance', 0.6)
+
+    def identify(frame, location, name):
+        return analysis.match_faces(matcher, [frame.face_encodings[0]], [name], tolerance)[0]
+
+    before = dict(tracker.counters)
+    frame = FrameContext(img, detection_scale=settings.get('detection_scale', 1.0))
+    results = analysis.analyze_frame(frame, analyses, identify, tracker if track else None, track, student_name)
+    counters = {key: value - before[key] for key, value in tracker.counters.items()}
+    return {'results': results, 'track': track, 'tracking': counters}
+
+
+def _attention_task(image_bytes):
+    img = decode_frame(image_bytes)
+    if img is None:
+        return {'result': {"status": "error", "message": "Invalid image"}}
+    frame = FrameContext(img, detection_scale=_worker['settings'].get('detection_scale', 1.0))
+    return {'result': analysis.analyze_attention_frame(frame)}
+
+
+def _ping():
+    return os.getpid()
+
+
+# Parent side
+
+class VisionWorkerPool:
+    """Dispatch frame analysis to worker processes with backpressure and timeouts"""
+
+    def __init__(self, gallery, settings, size=None, max_pending=None,
+                 task_timeout_seconds=10, start_method=None):
+        self.size = size or max(os.cpu_count() - 1, 1)
+        self.max_pending = max_pending or self.size * 2
+        self.task_timeout = task_timeout_seconds
+        self.settings = settings
+        self.start_method = start_method
+        self.publisher = GalleryPublisher(gallery)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+        self.counters = {'submitted': 0, 'completed': 0, 'rejected': 0, 'timeouts': 0, 'errors': 0,
+                         'cancelled': 0}
+
+    @classmethod
+    def from_config(cls, gallery, settings, options):
+        options = dict(options or {})
+        options.pop('enabled', None)
+        return cls(gallery, settings, **options)
+
+    def start(self):
+        """Start and warm every worker before serving requests"""
+        # Publishing first starts the resource tracker, which the workers then inherit
+        self.publisher.descriptor()
+        self._executor = ProcessPoolExecutor(max_workers=self.size, mp_context=pool_context(self.start_method),
+                                             initializer=_init_worker, initargs=(self.settings,))
+        pids = {self._executor.submit(_ping).result() for _ in range(self.size * 2)}
+        return sorted(pids)
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.counters['rejected'] += 1
+            raise PoolSaturated(f"{self.max_pending} frames already pending")
+
+        with self._lock:
+            self.counters['submitted'] += 1
+        try:
+            future = self._executor.submit(_run_timed, fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # The slot stays taken until the worker actually finishes, even after a timeout
+        future.add_done_callback(self._task_done)
+        return future
+
+    def _task_done(self, future):
+        self._slots.release()
+        # A task that timed out while still queued is cancelled; exception() would raise
+        if future.cancelled():
+            outcome = 'cancelled'
+        else:
+            outcome = 'completed' if future.exception() is None else 'errors'
+        with self._lock:
+            self.counters[outcome] += 1
+
+    def _wait(self, future):
+        try:
+            outcome = future.result(timeout=self.task_timeout)
+        except FutureTimeout:
+            future.cancel()
+            with self._lock:
+                self.counters['timeouts'] += 1
+            raise TaskTimeout(f"Frame analysis exceeded {self.task_timeout}s")
+        stage_metrics.record(outcome.pop('timings', None))
+        return outcome
+
+    def _submit_matching(self, fn, image_bytes, *args):
+        """Submit a task that matches against the gallery publication current now"""
+        descriptor = self.publisher.acquire()
+        try:
+            future = self._submit(fn, image_bytes, descriptor, *args)
+        except Exception:
+            self.publisher.release(descriptor)
+            raise
+        # Released when the worker finishes, not when the request stops waiting
+        future.add_done_callback(lambda _: self.publisher.release(descriptor))
+        return future
+
+    def verify(self, image_bytes, student_name=None, track=None):
+        """Run /verify-face analysis in a worker; returns result, track and tracking counters"""
+        return self._wait(self._submit_matching(_verify_task, image_bytes, student_name, track))
+
+    def analyze(self, image_bytes, analyses, student_name=None, track=None):
+        """Run /analyze-frame analyses in a worker; returns results (or an error result) and track"""
+        return self._wait(self._submit_matching(_frame_task, image_bytes, student_name, track,
+                                                tuple(analyses)))
+
+    def attention(self, image_bytes):
+        """Run /analyze-attention analysis in a worker"""
+        return self._wait(self._submit(_attention_task, image_bytes))
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        pending = counters['submitted'] - counters['completed'] - counters['errors'] - counters['cancelled']
+        return dict(counters, size=self.size, max_pending=self.max_pending, pending=pending)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self.publisher.close()
@@ -6,7 +6,15 @@ class ProctoringSystem {
         this.sessionId = null;
         this.isExamActive = false;
         this.monitoringInterval = null;
-        this.attentionInterval = null;
+        this.frameStream = null;
+        this.lastFaceCheck = 0;
+        // Replaced by the server's pacing with every result
+        this.pacing = {
+            interval_ms: 3000,
+            verify_interval_ms: 5000,
+            max_width: 640,
+            quality: 0.8
+        };
         this.violationCount = 0;
         this.lastFaceStatus = null;
         this.consecutiveNoFace = 0;
@@ -172,12 +180,8 @@ class ProctoringSystem {
 
                 // Start monitoring
                 this.startMonitoring();
-                this.startAttentionTracking();
                 
                 this.showNotification(`Exam started successfully! Session: ${this.sessionId}`, 'success');
-                
-                // Initial face verification
-                setTimeout(() => this.verifyFace(), 2000);
             }
         } catch (error) {
             console.error('Error starting exam:', error);
@@ -186,88 +190,142 @@ class ProctoringSystem {
     }
 
     startMonitoring() {
-        this.monitoringInterval = setInterval(() => {
-            this.verifyFace();
-            this.updateViolationDisplay();
-        }, 5000); // Check every 5 seconds
+        // Frames go over a WebSocket when possible; the server paces them
+        if ('WebSocket' in window) {
+            this.openFrameStream();
+        } else {
+            this.scheduleNextFrame();
+        }
     }
 
-    startAttentionTracking() {
-        this.attentionInterval = setInterval(() => {
-            this.analyzeAttention();
-        }, 3000); // Check attention every 3 seconds
+    scheduleNextFrame(delay = this.pacing.interval_ms) {
+        if (!this.isExamActive) return;
+        clearTimeout(this.monitoringInterval);
+        this.monitoringInterval = setTimeout(() => {
+            if (this.frameStream) {
+                this.sendStreamFrame();
+            } else {
+                // HTTP fallback: one upload for every due analysis
+                const analyses = ['attention'];
+                if (Date.now() - this.lastFaceCheck >= this.pacing.verify_interval_ms) {
+                    analyses.push('verify');
+                }
+                this.analyzeFrame(analyses);
+            }
+        }, delay);
     }
 
-    async verifyFace() {
-        if (!this.video.videoWidth || !this.video.videoHeight) return;
+    updatePacing(pacing) {
+        if (pacing) this.pacing = { ...this.pacing, ...pacing };
+    }
 
-        try {
-            const canvas = document.createElement('canvas');
-            canvas.width = this.video.videoWidth;
-            canvas.height = this.video.videoHeight;
-            const ctx = canvas.getContext('2d');
-            ctx.drawImage(this.video, 0, 0);
+    openFrameStream() {
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const socket = new WebSocket(`${protocol}//${window.location.host}/ws/frames`);
+        socket.binaryType = 'arraybuffer';
 
-            canvas.toBlob(async (blob) => {
-                const formData = new FormData();
-                formData.append('image', blob);
+        socket.onopen = () => {
+            this.frameStream = socket;
+        };
+        socket.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+            this.updatePacing(data.pacing);
+            if (data.type === 'result') {
+                this.handleFrameResults(data);
+            } else if (data.type === 'busy') {
+                this.addSystemLog('Server busy, slowing down frame rate', 'warning');
+            } else if (data.type === 'error') {
+                this.addSystemLog(`Frame stream error: ${data.message}`, 'error');
+            }
+            this.scheduleNextFrame();
+        };
+        socket.onclose = () => {
+            this.frameStream = null;
+            // Keep monitoring over plain HTTP uploads
+            this.scheduleNextFrame();
+        };
+    }
 
-                try {
-                    const response = await fetch('/verify-face', {
-                        method: 'POST',
-                        body: formData
-                    });
+    captureFrame(callback) {
+        if (!this.video.videoWidth || !this.video.videoHeight) return false;
+
+        // Width and JPEG quality follow the server's pacing
+        const scale = Math.min(1, this.pacing.max_width / this.video.videoWidth);
+        const canvas = document.createElement('canvas');
+        canvas.width = Math.round(this.video.videoWidth * scale);
+        canvas.height = Math.round(this.video.videoHeight * scale);
+        const ctx = canvas.getContext('2d');
+        ctx.drawImage(this.video, 0, 0, canvas.width, canvas.height);
+        canvas.toBlob(callback, 'image/jpeg', this.pacing.quality);
+        return true;
+    }
 
-                    const data = await response.json();
-                    this.analytics.faceVerifications++;
-                    this.handleFaceVerificationResult(data);
-                    this.updateAnalyticsDisplay();
-                } catch (error) {
-                    console.error('Face verification error:', error);
-                    this.updateStatus('faceStatus', 'Verification error', 'danger');
-                    this.addSystemLog('Face verification failed', 'error');
+    sendStreamFrame() {
+        try {
+            const captured = this.captureFrame(async (blob) => {
+                if (this.frameStream) {
+                    this.frameStream.send(await blob.arrayBuffer());
                 }
-            }, 'image/jpeg', 0.8);
+            });
+            if (!captured) this.scheduleNextFrame();
         } catch (error) {
-            console.error('Face capture error:', error);
-            this.addSystemLog('Face capture error', 'error');
+            console.error('Frame capture error:', error);
+            this.addSystemLog('Frame capture error', 'error');
+            this.scheduleNextFrame();
         }
     }
 
-    async analyzeAttention() {
-        if (!this.video.videoWidth || !this.video.videoHeight) return;
-
+    async analyzeFrame(analyses) {
         try {
-            const canvas = document.createElement('canvas');
-            canvas.width = this.video.videoWidth;
-            canvas.height = this.video.videoHeight;
-            const ctx = canvas.getContext('2d');
-            ctx.drawImage(this.video, 0, 0);
-
-            canvas.toBlob(async (blob) => {
+            const captured = this.captureFrame(async (blob) => {
                 const formData = new FormData();
                 formData.append('image', blob);
+                formData.append('analyses', analyses.join(','));
 
                 try {
-                    const response = await fetch('/analyze-attention', {
+                    const response = await fetch('/analyze-frame', {
                         method: 'POST',
                         body: formData
                     });
 
                     const data = await response.json();
-                    this.analytics.attentionChecks++;
-                    this.handleAttentionResult(data);
-                    this.updateAnalyticsDisplay();
+                    this.updatePacing(data.pacing);
+                    this.handleFrameResults(data);
                 } catch (error) {
-                    console.error('Attention analysis error:', error);
-                    this.addSystemLog('Attention analysis failed', 'error');
+                    console.error('Frame analysis error:', error);
+                    if (analyses.includes('verify')) {
+                        this.updateStatus('faceStatus', 'Verification error', 'danger');
+                    }
+                    this.addSystemLog('Frame analysis failed', 'error');
                 }
-            }, 'image/jpeg', 0.8);
+                this.scheduleNextFrame();
+            });
+            if (!captured) this.scheduleNextFrame();
         } catch (error) {
-            console.error('Attention capture error:', error);
+            console.error('Frame capture error:', error);
+            this.addSystemLog('Frame capture error', 'error');
+            this.scheduleNextFrame();
         }
     }
 
+    handleFrameResults(data) {
+        const results = data.results || {};
+        if (results.verify) {
+            this.lastFaceCheck = Date.now();
+            this.analytics.faceVerifications++;
+            this.handleFaceVerificationResult(results.verify);
+            this.updateViolationDisplay();
+        }
+        if (results.attention) {
+            this.analytics.attentionChecks++;
+            this.handleAttentionResult(results.attention);
+        }
+        if (data.status === 'error') {
+            this.addSystemLog(`Frame analysis failed: ${data.message}`, 'error');
+        }
+        this.updateAnalyticsDisplay();
+    }
+
     handleFaceVerificationResult(data) {
         const faceCard = document.getElementById('faceStatusCard');
         const faceStatus = document.getElementById('faceStatus');
@@ -538,9 +596,9 @@ class ProctoringSystem {
             if (data.status === 'success') {
                 this.isExamActive = false;
                 
-                // Clear intervals
-                if (this.monitoringInterval) clearInterval(this.monitoringInterval);
-                if (this.attentionInterval) clearInterval(this.attentionInterval);
+                // Stop sending frames
+                if (this.monitoringInterval) clearTimeout(this.monitoringInterval);
+                if (this.frameStream) this.frameStream.close();
 
                 // Update UI
                 document.getElementById('setupSection').style.display = 'block';
@@ -0,0 +1,36 @@
+"""FaceGallery snapshots and directory sync."""
+import numpy as np
+
+from services.gallery import ENCODING_DIM, FaceGallery
+
+
+def test_replacing_a_row_leaves_published_snapshots_untouched():
+    gallery = FaceGallery()
+    gallery.add_encoding('a.png', 'a', np.zeros(ENCODING_DIM))
+    gallery.add_encoding('b.png', 'b', np.ones(ENCODING_DIM))
+    before = gallery.snapshot()
+
+    gallery.add_encoding('a.png', 'a', np.full(ENCODING_DIM, 2.0))
+    after = gallery.snapshot()
+
+    assert not before.encodings[0].any()
+    assert (after.encodings[0] == 2.0).all()
+    assert after.generation == before.generation + 1
+
+
+def test_sync_counts_unreadable_images_as_errors(tmp_path):
+    def encoder(path):
+        if path.endswith('broken.png'):
+            raise OSError("cannot identify image file")
+        return np.ones(ENCODING_DIM)
+
+    for name in ('alice.png', 'broken.png'):
+        (tmp_path / name).write_bytes(name.encode())
+    gallery = FaceGallery(encoder=encoder)
+
+    summary = gallery.sync(str(tmp_path))
+    assert summary == {'encoded': 1, 'reused': 0, 'removed': 0, 'no_face': 0, 'errors': 1}
+    assert 'alice.png' in gallery and 'broken.png' not in gallery
+
+    summary = gallery.sync(str(tmp_path))
+    assert summary['reused'] == 1 and summary['errors'] == 1
@@ -0,0 +1,48 @@
+"""IVFMatcher builds its index off the request path."""
+import threading
+
+import numpy as np
+
+from services.gallery import GallerySnapshot
+from services.matching import IVFMatcher
+
+
+class FixedGallery:
+    def __init__(self, encodings):
+        self._snapshot = GallerySnapshot(encodings=encodings, names=tuple(f'face{i}' for i in range(len(encodings))),
+                                         version=1, generation=1)
+
+    def snapshot(self):
+        return self._snapshot
+
+
+class GatedMatcher(IVFMatcher):
+    """Holds the index build until ``release`` is set"""
+
+    def __init__(self, gallery, release, **kwargs):
+        super().__init__(gallery, **kwargs)
+        self.release = release
+
+    def _index(self, state, previous):
+        self.release.wait(5)
+        return super()._index(state, previous)
+
+
+def test_searches_exactly_until_the_background_index_is_ready():
+    encodings = np.random.default_rng(0).random((512, 128), dtype=np.float32)
+    release = threading.Event()
+    matcher = GatedMatcher(FixedGallery(encodings), release, nlist=16, nprobe=16, min_size=256)
+
+    stats = matcher.warm_up()
+    assert stats['exhaustive'] and stats['indexing']
+    # Requests are answered while the index is still building
+    assert matcher.match(encodings[7]).name == 'face7'
+    assert not matcher.wait_for_index(timeout=0.01)
+
+    release.set()
+    assert matcher.wait_for_index(timeout=5)
+    stats = matcher.stats()
+    assert not stats['exhaustive'] and not stats['indexing']
+    assert stats['nlist'] == 16
+    # Probing every partition gives the exact answer
+    assert matcher.match(encodings[7]).name == 'face7'
@@ -0,0 +1,42 @@
+"""Backpressure accounting of VisionWorkerPool."""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services.worker_pool import TaskTimeout, VisionWorkerPool
+
+
+def _blocked(release):
+    release.wait(5)
+    return {}
+
+
+@pytest.fixture
+def pool():
+    # A thread executor queues and cancels futures like the process pool, without workers
+    pool = VisionWorkerPool(gallery=None, settings={}, size=1, max_pending=4, task_timeout_seconds=0.05)
+    pool._executor = ThreadPoolExecutor(max_workers=1)
+    yield pool
+    pool._executor.shutdown(wait=True)
+
+
+def test_timed_out_queued_task_is_cancelled_and_not_pending(pool):
+    release = threading.Event()
+    running = pool._submit(_blocked, release)
+    queued = pool._submit(_blocked, release)
+
+    with pytest.raises(TaskTimeout):
+        pool._wait(queued)
+    assert queued.cancelled()
+
+    release.set()
+    running.result(timeout=5)
+    stats = pool.stats()
+    assert stats['cancelled'] == 1
+    assert stats['timeouts'] == 1
+    assert stats['completed'] == 1
+    assert stats['errors'] == 0
+    assert stats['pending'] == 0
+    # Both slots are free again
+    assert all(pool._slots.acquire(blocking=False) for _ in range(pool.max_pending))